@@ -1,16 +1,34 @@
-"""The emf package is a container for two subpackages, emf.fields and emf.subcalc. It imports libraries used by the subpackages like numpy, pandas, and matplotlib. It also contains some custom functions and classes that are used by both emf.fields and emf.subcalc, but they are all private. See the documentation for emf.fields and emf.subcalc."""
+"""The emf package is a container for two subpackages, emf.fields and emf.subcalc. It imports libraries used by the subpackages like numpy, pandas, and matplotlib. Matplotlib is slow to import and only needed for plotting, so it's imported the first time it's used rather than with the package. It also contains some custom functions and classes that are used by both emf.fields and emf.subcalc, but they are all private. See the documentation for emf.fields and emf.subcalc."""
 
+import io
 import os
+import re
+import csv
 import copy
 import glob
+import json
+import mmap
+import time
 import shutil
+import struct
+import hashlib
+import inspect
+import functools
+import tempfile
 import textwrap
+import zipfile
 import itertools
+import importlib
 import numpy as np
 import pandas as pd
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from scipy.interpolate import interpn as _interpn
+
+from emf_funks import _LazyModule
+
+#matplotlib is loaded with pyplot so that its submodules are available
+mpl = _LazyModule('matplotlib', extra=['matplotlib.pyplot'])
+plt = _LazyModule('matplotlib.pyplot', parent=mpl)
+#xlrd reads excel templates directly, skipping pandas
+xlrd = _LazyModule('xlrd')
 
 import fields
 import subcalc
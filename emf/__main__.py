@@ -0,0 +1,7 @@
+"""Entry point for 'python -m emf', see emf.emf_cli"""
+
+import sys
+
+from .emf_cli import main
+
+sys.exit(main())
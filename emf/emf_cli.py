@@ -0,0 +1,218 @@
+"""Command line interface for batch processing with emf, run with 'python -m emf'. Each subcommand accepts any number of files and directories, finds the relevant input files in the directories (recursively with -r), and processes them on a pool of worker processes. Timing and any failure are reported for each file, and the exit status is nonzero if any file failed, so that the command can be used in scheduled batch jobs.
+
+    python -m emf run templates/ -r -j 8       (emf.fields.run on templates)
+    python -m emf dat results/ -r              (convert FIELDS .DAT files to csv)
+    python -m emf ref models/ -f footprints.csv  (convert SUBCALC .REF files to excel)
+    python -m emf plot models/ --format pdf    (contour and color mesh plots of Models)
+
+Outputs are written next to each input file unless a directory is passed with -o/--path. Only files that the subcommand can process are picked up from directories, so the results that emf writes next to the inputs, like '-all_results' workbooks, aren't mistaken for inputs by later runs."""
+
+from . import os, time, fields, subcalc
+
+from .emf_funks import _find_files
+from .fields.fields_funks import _is_template
+from .subcalc.subcalc_funks import _is_model_file
+
+import sys
+import argparse
+import traceback
+import multiprocessing
+
+def _output_kw(file_path, args):
+    """Build the keywords directing a task's outputs to --path or to the input file's directory"""
+    if(args.path):
+        d = args.path
+    else:
+        d = os.path.dirname(os.path.abspath(file_path))
+    kw = {'path': os.path.join(d, '')}
+    if(args.format):
+        kw['format'] = args.format
+    return(kw)
+
+def _output_name(file_path, args):
+    """Identify the outputs of a task by their directory and the input's name without extensions, which outputs are named after"""
+    name = os.path.basename(file_path).split('.')[0]
+    return(os.path.join(_output_kw(file_path, args)['path'], name))
+
+#-------------------------------------------------------------------------------
+#TASKS, each one processes a single file
+
+def _task_run(file_path, args):
+    kw = _output_kw(file_path, args)
+    if(args.xmax is not None):
+        kw['xmax'] = args.xmax
+    if(args.incremental):
+        kw['incremental'] = True
+    if(args.profile):
+        kw['profile'] = True
+    fields.run(file_path, **kw)
+
+def _task_dat(file_path, args):
+    fields.convert_DAT(file_path, **_output_kw(file_path, args))
+
+def _task_ref(file_path, args):
+    if(args.footprints):
+        subcalc.convert_REF(file_path, args.footprints,
+                **_output_kw(file_path, args))
+    else:
+        subcalc.convert_REF(file_path, **_output_kw(file_path, args))
+
+def _task_plot(file_path, args):
+    if(args.footprints):
+        mod = subcalc.load_model(file_path, args.footprints)
+    else:
+        mod = subcalc.load_model(file_path)
+    kw = _output_kw(file_path, args)
+    kw['save'] = True
+    #name the plots after the model file so batches don't overwrite them
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    d = kw['path']
+    for f, suffix in [(subcalc.plot_contour, '-contour'),
+            (subcalc.plot_pcolormesh, '-pcolormesh')]:
+        kw['path'] = os.path.join(d, name + suffix)
+        r = f(mod, **kw)
+        subcalc.close(r[0])
+
+#subcommand name: (task function, input extensions, help string, function
+#checking that a file with one of the extensions is an input, or None)
+_tasks = {
+    'run': (_task_run, ['.xlsx', '.json', '.csv'],
+        'calculate fields and export results and plots for templates',
+        _is_template),
+    'dat': (_task_dat, ['.DAT'],
+        'convert FIELDS .DAT output files to csv', None),
+    'ref': (_task_ref, ['.REF'],
+        'convert SUBCALC .REF output files to excel', None),
+    'plot': (_task_plot, ['.REF', '.npz', '.xlsx'],
+        'plot contours and color meshes of SUBCALC results', _is_model_file)}
+
+def _init_worker(quiet):
+    """Prepare a worker process for plotting without a display and optionally silence printing"""
+    import matplotlib
+    matplotlib.use('Agg')
+    if(quiet):
+        sys.stdout = open(os.devnull, 'w')
+
+def _work(task):
+    """Process a single file in a worker
+    args:
+        task - tuple of (subcommand name, file path, parsed arguments)
+    returns:
+        file_path - string
+        seconds - float, wall time
+        error - string describing the failure, or None on success"""
+    name, file_path, args = task
+    t0 = time.time()
+    try:
+        _tasks[name][0](file_path, args)
+        error = None
+    except(Exception):
+        error = traceback.format_exc().strip().split('\n')[-1]
+        if(args.traceback):
+            error = traceback.format_exc()
+    return(file_path, time.time() - t0, error)
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='python -m emf',
+            description=__doc__.split('\n')[0])
+    sub = parser.add_subparsers(dest='command')
+    for name in ['run', 'dat', 'ref', 'plot']:
+        p = sub.add_parser(name, help=_tasks[name][2])
+        p.add_argument('paths', nargs='+',
+                help='input files and directories to search for them')
+        p.add_argument('-r', '--recursive', action='store_true',
+                help='search subdirectories')
+        p.add_argument('-j', '--jobs', type=int,
+                default=multiprocessing.cpu_count(),
+                help='number of worker processes, default is the CPU count')
+        p.add_argument('-o', '--path',
+                help='output directory, default is next to each input')
+        p.add_argument('-q', '--quiet', action='store_true',
+                help="silence the output of emf functions")
+        p.add_argument('--traceback', action='store_true',
+                help='report full tracebacks for failures')
+        if(name in ['run', 'plot']):
+            p.add_argument('--format',
+                    help="saved plot format, like 'png' or 'pdf'")
+        else:
+            p.set_defaults(format=None)
+        if(name == 'run'):
+            p.add_argument('--xmax', type=float,
+                    help='cutoff distance from ROW center in plots')
+            p.add_argument('--incremental', action='store_true',
+                    help='only recompute and replot sheets that changed')
+            p.add_argument('--profile', action='store_true',
+                    help='write stage timing and memory use for each run')
+        if(name in ['ref', 'plot']):
+            p.add_argument('-f', '--footprints',
+                    help='footprint csv file applied to every model')
+    return(parser)
+
+def main(argv=None):
+    """Parse command line arguments, process the files, and report
+    args:
+        argv - list of strings, arguments, default is sys.argv[1:]
+    returns:
+        status - int, 0 if all files were processed, 1 if any failed, and
+                 2 if no input files were found"""
+    args = _parser().parse_args(argv)
+    files = _find_files(args.paths, _tasks[args.command][1], args.recursive)
+    #leave out other files with the same extensions, like exported results,
+    #before any are processed
+    accept = _tasks[args.command][3]
+    if(accept is not None):
+        n = len(files)
+        files = [fn for fn in files if accept(fn)]
+        if(len(files) < n):
+            print('skipping %d file(s) that are not %s inputs' % (
+                n - len(files), args.command))
+    #inputs with the same name, like a template saved in several formats,
+    #write the same outputs, so only the first is processed
+    names = dict()
+    for fn in list(files):
+        k = _output_name(fn, args)
+        if(k in names):
+            print('skipping %s, which writes the same outputs as %s' % (
+                fn, names[k]))
+            files.remove(fn)
+        else:
+            names[k] = fn
+    if(not files):
+        print('no input files found')
+        return(2)
+    if(args.path and (not os.path.isdir(args.path))):
+        os.makedirs(args.path)
+    tasks = [(args.command, fn, args) for fn in files]
+    jobs = max(1, min(args.jobs, len(files)))
+    print('processing %d file(s) with %d worker(s)' % (len(files), jobs))
+    t0 = time.time()
+    failures = []
+    stdout = sys.stdout
+    if(jobs == 1):
+        _init_worker(args.quiet)
+        results = (_work(t) for t in tasks)
+    else:
+        pool = multiprocessing.Pool(jobs, _init_worker, (args.quiet,))
+        results = pool.imap_unordered(_work, tasks)
+    try:
+        for fn, seconds, error in results:
+            if(error is None):
+                stdout.write('ok      %8.2f s  %s\n' % (seconds, fn))
+            else:
+                stdout.write('FAILED  %8.2f s  %s\n    %s\n'
+                        % (seconds, fn, error))
+                failures.append(fn)
+            stdout.flush()
+    except(KeyboardInterrupt):
+        if(jobs > 1):
+            pool.terminate()
+        raise
+    finally:
+        sys.stdout = stdout
+    if(jobs > 1):
+        pool.close()
+        pool.join()
+    print('%d of %d file(s) processed in %.2f s, %d failed' % (
+        len(files) - len(failures), len(files), time.time() - t0,
+        len(failures)))
+    return(1 if failures else 0)
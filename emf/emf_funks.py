@@ -1,7 +1,253 @@
-from . import os, np
+from . import os, re, np, struct, hashlib, zipfile, importlib
+
+import multiprocessing
 
 import emf_class
 
+class _LazyModule(object):
+    """Stand in for a module that is only imported when one of its attributes is first used, so that heavy libraries like matplotlib aren't loaded by code that never needs them. Functions registered with on_import() are called with the module right after it's imported."""
+
+    def __init__(self, name, extra=(), parent=None):
+        """
+        args:
+            name - string, full name of the module
+        kw:
+            extra - iterable of module names imported along with the module,
+                    for submodules that aren't imported by the module itself
+            parent - _LazyModule loaded before this one"""
+        self._name = name
+        self._extra = extra
+        self._parent = parent
+        self._module = None
+        self._hooks = []
+
+    def _load(self):
+        """Import the module if it hasn't been imported yet and return it"""
+        if(self._module is None):
+            if(self._parent is not None):
+                self._parent._load()
+            module = importlib.import_module(self._name)
+            for name in self._extra:
+                importlib.import_module(name)
+            self._module = module
+            for f in self._hooks:
+                f(module)
+        return(self._module)
+
+    def __getattr__(self, attr):
+        return(getattr(self._load(), attr))
+
+    def on_import(self, f):
+        """Register a function to call with the module once it's imported, calling it right away if the module has already been imported
+        args:
+            f - function accepting the module"""
+        self._hooks.append(f)
+        if(self._module is not None):
+            f(self._module)
+
+#os.scandir is much faster than listing directories and stat-ing each entry,
+#but it only comes with Python 3.5 and later, otherwise the scandir backport
+#is used if it's installed, falling back to os.listdir
+try:
+    _scandir = os.scandir
+except(AttributeError):
+    try:
+        from scandir import scandir as _scandir
+    except(ImportError):
+        _scandir = None
+
+def _find_files(paths, extensions, recursive=False):
+    """Collect the files with certain extensions from a list of files and directories
+    args:
+        paths - list of strings, file and directory paths
+        extensions - list of strings, accepted file extensions (case
+                     insensitive, with leading periods)
+    kw:
+        recursive - bool, search subdirectories too
+    returns:
+        files - sorted list of file paths"""
+    extensions = tuple([e.lower() for e in extensions])
+    files = []
+    dirs = []
+    for p in paths:
+        if(os.path.isdir(p)):
+            dirs.append(p)
+        elif(p.lower().endswith(extensions)):
+            files.append(p)
+    while(dirs):
+        d = dirs.pop()
+        if(_scandir is not None):
+            entries = [(e.name, e.path, e.is_dir()) for e in _scandir(d)]
+        else:
+            entries = [(n, os.path.join(d, n), os.path.isdir(os.path.join(d, n)))
+                    for n in os.listdir(d)]
+        for name, path, is_dir in entries:
+            if(is_dir):
+                if(recursive):
+                    dirs.append(path)
+            #skip the lock files excel leaves next to open workbooks
+            elif(name.lower().endswith(extensions) and (name[:2] != '~$')):
+                files.append(path)
+    return(sorted(files))
+
+def _xlsx_contents(file_path):
+    """Read the sheet names and the shared strings of an xlsx workbook straight from its zip archive, without parsing any worksheets, to quickly tell kinds of workbooks apart
+    args:
+        file_path - string, path to the workbook
+    returns:
+        sheets - list of sheet names
+        strings - string, xml of the workbook's shared strings (the text of
+                  its cells), empty if it has none"""
+    with zipfile.ZipFile(file_path) as z:
+        wb = z.read('xl/workbook.xml').decode('utf-8')
+        if('xl/sharedStrings.xml' in z.namelist()):
+            strings = z.read('xl/sharedStrings.xml').decode('utf-8')
+        else:
+            strings = ''
+    sheets = re.findall(r'<sheet\b[^>]*\bname="([^"]*)"', wb)
+    return(sheets, strings)
+
+def _is_current(output_path, *input_paths):
+    """Check whether an output file exists and was modified after all of the files or directories it's generated from"""
+    try:
+        t = os.path.getmtime(output_path)
+    except(OSError):
+        return(False)
+    return(all([os.path.getmtime(p) <= t for p in input_paths]))
+
+def _file_sha1(file_path):
+    """Hash the contents of a file, reading it in chunks"""
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as ifile:
+        for chunk in iter(lambda: ifile.read(2**20), b''):
+            h.update(chunk)
+    return(h.hexdigest())
+
+def _pool_map(f, tasks, jobs=1):
+    """Apply a function to a list of tasks on a pool of worker processes, or in this process if there's only one worker or one task. Pools are only started when more than one worker is asked for, because starting worker processes on Windows re-imports the calling script, which must then guard its calls to emf with "if __name__ == '__main__':".
+    args:
+        f - module level function accepting a single task
+        tasks - list of task arguments
+    kw:
+        jobs - int, number of worker processes, default is 1 (no pool)
+    returns:
+        list of results, in the order of tasks"""
+    jobs = max(1, min(jobs, len(tasks)))
+    if(jobs == 1):
+        return([f(t) for t in tasks])
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.map(f, tasks)
+    except(KeyboardInterrupt):
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
+    return(results)
+
+def _npz_load(file_path, mmap=False):
+    """Load all the arrays in an .npz file written by numpy.savez, optionally memory-mapping them instead of reading them into memory. Memory-mapping works because savez stores the arrays uncompressed, so each one is a plain .npy file at some offset in the zip archive. Memory-mapped arrays are read-only.
+    args:
+        file_path - string, path to .npz file
+        mmap - bool, memory-map arrays instead of reading them, except for
+               object arrays and empty arrays, which are always read
+    returns:
+        arrays - dict mapping array names to arrays"""
+    if(not mmap):
+        with np.load(file_path) as npz:
+            return(dict([(k, npz[k]) for k in npz.files]))
+    arrays = dict()
+    with open(file_path, 'rb') as ifile:
+        for info in zipfile.ZipFile(ifile).infolist():
+            k = info.filename[:-4]
+            #skip the local file header, which has a 30 byte fixed part
+            #followed by the file name and extra fields
+            ifile.seek(info.header_offset)
+            name_len, extra_len = struct.unpack('<HH', ifile.read(30)[26:])
+            ifile.seek(name_len + extra_len, 1)
+            #read the .npy header
+            version = np.lib.format.read_magic(ifile)
+            if(version == (1, 0)):
+                header = np.lib.format.read_array_header_1_0(ifile)
+            else:
+                header = np.lib.format.read_array_header_2_0(ifile)
+            shape, fortran, dtype = header
+            if(dtype.hasobject or (np.prod(shape) == 0) or
+                    (info.compress_type != zipfile.ZIP_STORED)):
+                with np.load(file_path) as npz:
+                    arrays[k] = npz[k]
+            else:
+                arrays[k] = np.memmap(file_path, dtype=dtype, mode='r',
+                        offset=ifile.tell(), shape=shape,
+                        order='F' if fortran else 'C')
+    return(arrays)
+
+class _ExcelStream(object):
+    """Excel workbook writer that streams DataFrames to disk one row at a time, using xlsxwriter's constant memory mode, instead of holding every cell of the workbook in memory like pandas.ExcelWriter. Each DataFrame is written to its own sheet, in a layout like DataFrame.to_excel's. Rows are written in order, so memory use doesn't grow with the size of the workbook. Use it as a context manager or call close() to finish the file:
+
+        with _ExcelStream(fn) as xl:
+            xl.write(df, 'sheet name')"""
+
+    def __init__(self, file_path):
+        """
+        args:
+            file_path - string, path of the excel file to write"""
+        import xlsxwriter
+        self.path = file_path
+        self._book = xlsxwriter.Workbook(file_path, {'constant_memory': True})
+        self._bold = self._book.add_format({'bold': True, 'border': 1})
+
+    def write(self, df, sheet_name, index=True, index_label=None,
+            columns=None, header=None):
+        """Write a DataFrame to a new sheet
+        args:
+            df - DataFrame
+            sheet_name - string
+        kw:
+            index - bool, write the index in the first column
+            index_label - string, header of the index column, the index
+                          name by default
+            columns - list of columns to write, all by default
+            header - list of column headers, replacing the column names"""
+        ws = self._book.add_worksheet(sheet_name)
+        if(columns is not None):
+            df = df[columns]
+        if(header is None):
+            header = list(df.columns)
+        if(index_label is None):
+            index_label = df.index.name
+        c0 = 0
+        if(index):
+            c0 = 1
+            if(index_label is not None):
+                ws.write(0, 0, index_label, self._bold)
+        for j, h in enumerate(header):
+            ws.write(0, c0 + j, h, self._bold)
+        #blank out missing values like to_excel, which excel can't store
+        values = df.values
+        if(values.dtype.kind == 'f'):
+            fix = not np.isfinite(values).all()
+        else:
+            fix = (values.dtype == object)
+        idx = df.index.tolist()
+        for i, row in enumerate(values.tolist()):
+            if(fix):
+                row = [None if (isinstance(v, float) and not np.isfinite(v))
+                        else v for v in row]
+            if(index):
+                ws.write(i + 1, 0, idx[i], self._bold)
+            ws.write_row(i + 1, c0, row)
+
+    def close(self):
+        """Finish writing the workbook"""
+        self._book.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
+
 def _path_manage(filename_if_needed, extension, **kwargs):
     """This function takes a path string through the kwarg 'path' and
     returns a path string with a file name at it's end, to save a file
@@ -1,6 +1,8 @@
-"""The FIELDS_io module provides a handful of functions for streamlining the file management process required by the old modeling program called FIELDS. There are functions for reading the DAT files generated by FIELDS and converting them into standard csv files (targeting a single DAT file (convert_DAT) or all DAT files in a given directory and all its subdirectories (convert_DAT_crawl, which has an additional option to bundle all DAT files found in a given directory inside single xlsx files for easy access.)). There are also functions that write the data in existing CrossSection objects to formatted text files with FLD extensions, to be used as input files with FIELDS instead of using the program's troublesome and error-prone menus to input data. These functions are to_FLD, to_FLDs, and to_FLDs_crawl. CrossSection objects are generated by reading from a template excel file, using the load_template function. Converting all the sheets in a template excel file to FLD files is a one line process: fields.to_FLDs(template_file.xlsx)"""
+"""The FIELDS_io module provides a handful of functions for streamlining the file management process required by the old modeling program called FIELDS. There are functions for reading the DAT files generated by FIELDS and converting them into standard csv files (targeting a single DAT file (convert_DAT) or all DAT files in a given directory and all its subdirectories (convert_DAT_crawl, which has an additional option to bundle all DAT files found in a given directory inside single xlsx files for easy access.)). There are also functions that write the data in existing CrossSection objects to formatted text files with FLD extensions, to be used as input files with FIELDS instead of using the program's troublesome and error-prone menus to input data. These functions are to_FLD, to_FLDs, and to_FLDs_crawl. FLD files written that way can be read back into CrossSections with read_FLD, or crawled into SectionBooks with read_FLDs_crawl. CrossSection objects are generated by reading from a template excel file, using the load_template function. Converting all the sheets in a template excel file to FLD files is a one line process: fields.to_FLDs(template_file.xlsx)"""
 
-from .. import os, pd, glob
+from .. import os, re, np, pd, glob
+
+from ..emf_funks import _ExcelStream, _find_files, _is_current, _pool_map
 
 import fields_funks
 import fields_class
@@ -94,29 +96,166 @@ def to_FLDs(*args, **kw):
         to_FLD(xs, **kw)
 
 def to_FLDs_crawl(dir_name, **kw):
-    """crawl a directory and all of its subdirectories for excel workbooks that can be passed to create_FLDs(). The FLD files are generated in the same directory as the template book they come from."""
+    """crawl a directory and all of its subdirectories for excel workbooks that can be passed to create_FLDs(). The FLD files are generated in the same directory as the template book they come from. All the workbooks are found first and then converted, optionally on a pool of worker processes (see 'jobs'). FLD files modified more recently than their template are left alone.
+    args:
+        dir_name - Directory to initiate the crawl in. Glob patterns like
+                    'dir/*' are also accepted.
+    kw:
+        jobs - int, number of worker processes, default is 1, which
+               processes the files in this process. With more than one
+               worker, scripts calling this function on Windows must do
+               so under "if __name__ == '__main__':", because each worker
+               re-imports the calling script.
+        overwrite - bool, if True, write all FLD files even if they're
+                    newer than their templates, default is False"""
+    files = _find_files(_crawl_roots(dir_name), ['.xlsx'], recursive=True)
+    overwrite = ('overwrite' in kw) and kw['overwrite']
+    results = _pool_map(_to_FLDs_task, [(fn, overwrite) for fn in files],
+            kw.get('jobs', 1))
+    for fn, error in results:
+        if(error is not None):
+            print('failure to write FLD files from:\n\t%s' % fn)
+            print('\n\tBecause of: ' + error)
+
+def _to_FLDs_task(task):
+    """Write the FLD files of a template workbook that aren't current, for to_FLDs_crawl
+    args:
+        task - tuple of template path and overwrite option
+    returns:
+        file_path - string, template path
+        error - string describing a failure, or None"""
+    file_path, overwrite = task
+    d = os.path.dirname(file_path) or os.curdir
+    try:
+        sb = fields_funks.load_template(file_path)
+        for xs in sb:
+            fn = fields_funks._path_manage(xs.sheet, 'FLD', path=d)
+            if(overwrite or (not _is_current(fn, file_path))):
+                to_FLD(xs, path=d)
+    except(KeyError, ValueError, IOError, fields_class.EMFError) as e:
+        return(file_path, str(e))
+    return(file_path, None)
+
+def _crawl_roots(dir_name):
+    """Get the directories and files to start a crawl from, accepting a directory or a glob pattern like the original crawlers did"""
+    if(os.path.isdir(dir_name)):
+        return([dir_name])
+    return(glob.glob(dir_name))
+
+#------------------------------------------------------------------------------
+#FUNCTIONS FOR READING INPUT .FLD FILES
+
+#number of lines in the FLD entries written by to_FLD, for the whole cross
+#section, each conductor, and the second listing of each ground wire
+_FLD_misc_lines = 11
+_FLD_cond_lines = 10
+_FLD_gnd_lines = 6
+
+def read_FLD(file_path):
+    """Read an FLD input file written by to_FLD into a CrossSection. Numbers in FLD files are printed to the hundredths digit, so they may be rounded relative to the CrossSection the file was written from. Conductor tags that look like numbers are read as numbers.
+    args:
+        file_path - string, path to FLD file
+    returns:
+        xs - CrossSection object"""
+    fields_funks._check_extension(file_path, 'FLD', """Input file must have a '.FLD' extension.""")
+    with open(file_path, 'r') as ifile:
+        lines = [l.strip() for l in ifile.read().splitlines()]
+    #drop trailing blank lines
+    while(lines and (not lines[-1])):
+        lines.pop()
+    try:
+        nh, ng = int(lines[9]), int(lines[10])
+    except(IndexError, ValueError):
+        raise(fields_class.EMFError("""The FLD file "%s" doesn't list the numbers of conductors and ground wires where expected, so it can't be read.""" % file_path))
+    n = nh + ng
+    if(len(lines) != _FLD_misc_lines + n*_FLD_cond_lines + ng*_FLD_gnd_lines):
+        raise(fields_class.EMFError("""The FLD file "%s" has %d lines, but %d conductors and %d ground wires require %d lines, so it can't be read.""" % (file_path, len(lines), nh, ng, _FLD_misc_lines + n*_FLD_cond_lines + ng*_FLD_gnd_lines)))
+    #the conductor entries as a block with a row for each conductor
+    i = _FLD_misc_lines + n*_FLD_cond_lines
+    block = [lines[_FLD_misc_lines+j:i:_FLD_cond_lines]
+            for j in range(_FLD_cond_lines)]
+    if(any([v != 'ED!(I)' for v in block[6]])):
+        raise(fields_class.EMFError("""The conductor entries in FLD file "%s" are not formatted as expected, so it can't be read.""" % file_path))
+    tags = [_FLD_tag(t) for t in block[0]]
+    #the ground wires are listed again, which should match the first listing
+    if([_FLD_tag(t) for t in lines[i::_FLD_gnd_lines]] != tags[nh:]):
+        raise(fields_class.EMFError("""The second listing of ground wires in FLD file "%s" doesn't match the first, so it can't be read.""" % file_path))
+    #convert everything numeric at once
+    sheet = lines[0]
+    try:
+        misc = [float(v) for v in lines[3:9]]
+    except(ValueError):
+        raise(fields_class.EMFError("""The cross section entries in FLD file "%s" are not all numeric, so it can't be read.""" % file_path))
+    xs = fields_funks._template_section(sheet, None, lines[1], misc, set())
+    params = fields_funks._template_params(sheet, block[1:6] + block[7:], n,
+            ['x', 'y', 'subconds', 'd_cond', 'd_bund', 'I', 'V', 'phase'])
+    #reorder to x, y, subconds, d_cond, d_bund, V, I, phase
+    params[5], params[6] = params[6], params[5]
+    xs._add_new_conductors(fields_funks._template_conductors(sheet, tags,
+        params))
+    return(xs)
 
-    #get input directory's file and subdir names
-    dir_contents = glob.glob(dir_name)
+def _FLD_tag(s):
+    """Convert a tag from an FLD file back to a number if it was written as one"""
+    if(fields_funks._is_number(s)):
+        v = float(s)
+        if(_is_int(v)):
+            return(int(v))
+        return(v)
+    return(s)
 
-    #loop over the dir_contents
-    for dir_element in dir_contents:
-        if(dir_element[-5:] == '.xlsx'):
-            #operate on the file
+def read_FLDs_crawl(dir_name, **kw):
+    """crawl a directory and all of its subdirectories for FLD files written by to_FLD and read them into SectionBooks, one for each directory containing FLD files. All the FLD files are found first and then read, optionally on a pool of worker processes (see 'jobs'). Files that can't be read are reported and skipped. The CrossSections are named after their FLD files rather than the sheet names inside them, so that copied or renamed files don't collide.
+    args:
+        dir_name - Directory to initiate the crawl in. Glob patterns like
+                    'dir/*' are also accepted.
+    kw:
+        jobs - int, number of worker processes, default is 1, which
+               processes the files in this process. With more than one
+               worker, scripts calling this function on Windows must do
+               so under "if __name__ == '__main__':", because each worker
+               re-imports the calling script.
+    returns:
+        books - dict mapping directory paths to SectionBooks named after
+                the directories"""
+    files = _find_files(_crawl_roots(dir_name), ['.FLD'], recursive=True)
+    groups = dict()
+    for fn, xs, error in _pool_map(_read_FLD_task, files, kw.get('jobs', 1)):
+        if(error is not None):
+            print('failure to read FLD file:\n\t%s\n\tBecause of: %s' % (fn, error))
+            continue
+        #name CrossSections after their files, which are unique in each
+        #directory and match the sheets of files written by to_FLD
+        xs.sheet = os.path.splitext(os.path.basename(fn))[0]
+        groups.setdefault(os.path.dirname(fn), []).append(xs)
+    books = dict()
+    for d in groups:
+        sb = fields_class.SectionBook(os.path.basename(os.path.abspath(d)))
+        for xs in groups[d]:
             try:
-                to_FLDs(dir_element, path = os.path.dirname(dir_element))
-            except(KeyError, ValueError, IOError, fields_class.EMFError) as e:
-                print('failure to write FLD files from:\n\t%s' % dir_element)
-                if(type(e) is fields_class.EMFError):
-                    print('\n\tBecause of EMFError:' + str(e))
-        else:
-            #if the element is a subdirecory, crawl it
-            if(os.path.isdir(dir_element)):
-                to_FLDs_crawl(os.path.join(dir_element, '*'))
+                sb._add_new_sections([xs])
+            except(fields_class.EMFError) as e:
+                print('failure to add FLD cross section "%s" from:\n\t%s\n\tBecause of: %s' % (xs.sheet, d, str(e)))
+        books[d] = sb
+    return(books)
+
+def _read_FLD_task(file_path):
+    """Read an FLD file for read_FLDs_crawl, returning the path, CrossSection (or None), and an error string (or None)"""
+    try:
+        return(file_path, read_FLD(file_path), None)
+    except(ValueError, IndexError, IOError, fields_class.EMFError) as e:
+        return(file_path, None, str(e))
 
 #------------------------------------------------------------------------------
 #FUNCTIONS FOR CONVERTING OUTPUT .DAT FILES TO CSV/excel FILES
 
+#a line made only of characters found in numbers, with at least one digit,
+#which is a row of results (checked further when converted)
+_DAT_row = re.compile(r'^[-+.\deE \t\r]*\d[-+.\deE \t\r]*$', re.M)
+#FIELDS prints a line starting with a percent sign when a number is too large
+#for its column, and the rest of the row continues on the next line
+_DAT_continued = re.compile(r'^%([^\n]*)\n', re.M)
+
 def read_DAT(file_path):
     """Read a DAT file, which can have some funky extra characters if the numbers are too large (percent signs)
     args:
@@ -127,38 +266,49 @@ def read_DAT(file_path):
 
     #check that the target file is a DAT
     fields_funks._check_extension(file_path, 'DAT', """Input file must have a '.DAT' extension.""")
-    #load data
-    und_message = 'Electric Field cannot be computed for underground circuit'
-    und_only = False
     with open(file_path,'r') as ifile:
-        #read through the header
-        line = ifile.readline()
-        while(not ('----' in line)):
-            line = ifile.readline()
-            if(und_message in line):
-                und_only = True
-        #get the data
-        data = [[] for i in range(9)]
-        line = ifile.readline()
-        while(line):
-            if(line):
-                #check strange % signs printed with large numbers
-                if(line[0][0] == '%'):
-                    line += ifile.readline()
-            l = [i.replace('%','') for i in line.split()]
-            if(l and all([fields_funks._is_number(i) for i in l])):
-                for i in range(5):
-                    data[i].append(float(l[i]))
-                if(not (und_only)):
-                    for i in range(5,9):
-                        data[i].append(float(l[i]))
-                else:
-                    for i in range(5,9):
-                        data[i].append(0.)
-            line = ifile.readline()
-    return(pd.DataFrame(data=
-        dict(zip(['Bx','By','Bprod','Bmax','Ex','Ey','Eprod','Emax'],data[1:])),
-        index = data[0]))
+        text = ifile.read()
+    #split the header off at the line of dashes under the column names
+    i = text.find('----')
+    if(i == -1):
+        raise(fields_class.EMFError("""The DAT file "%s" has no line of dashes ('----') marking the start of the results, so it can't be read.""" % file_path))
+    und_only = ('Electric Field cannot be computed for underground circuit'
+            in text[:i])
+    i = text.find('\n', i)
+    text = text[i+1:] if(i != -1) else ''
+    #join continued lines and remove the percent signs in one pass each
+    if('%' in text):
+        text = _DAT_continued.sub(r'\1 ', text).replace('%', '')
+    #convert all the rows of numbers at once, keeping the distance and
+    #magnetic field columns and the electric field columns if present
+    n = 5 if und_only else 9
+    rows = _DAT_row.findall(text)
+    try:
+        data = _DAT_array(rows, n)
+    except(ValueError):
+        #some rows have characters of numbers that don't form numbers, so
+        #check every entry
+        rows = [r for r in rows
+                if all([fields_funks._is_number(i) for i in r.split()])]
+        data = _DAT_array(rows, n)
+    if(und_only):
+        data = np.hstack((data, np.zeros((len(data), 4))))
+    #columns are in alphabetical order, as if built from a dict
+    columns = ['Bmax','Bprod','Bx','By','Emax','Eprod','Ex','Ey']
+    order = [4, 3, 1, 2, 8, 7, 5, 6]
+    return(pd.DataFrame(data[:,order], index=pd.Float64Index(data[:,0]),
+        columns=columns))
+
+def _DAT_array(rows, n):
+    """Convert rows of numbers from a DAT file to a 2D array, keeping the first n columns, raising a ValueError if any entry isn't a number"""
+    if(not rows):
+        return(np.zeros((0, n)))
+    counts = set([len(r.split()) for r in rows])
+    if(len(counts) == 1):
+        #all rows are the same length, so they're converted in one shot
+        return(np.array(' '.join(rows).split(), dtype=float).reshape(
+                len(rows), -1)[:,:n])
+    return(np.array([r.split()[:n] for r in rows], dtype=float))
 
 def convert_DAT(file_path, **kw):
     """read a DAT file and write it to a csv
@@ -169,59 +319,78 @@ def convert_DAT(file_path, **kw):
     #get the DAT data
     df = read_DAT(file_path)
     #write it to a csv
-    fn = fields_funks._path_manage(os.path.basename(file_path)[:file_path.index('.')],
-        'csv', **kw)
+    fn = fields_funks._path_manage(
+            os.path.splitext(os.path.basename(file_path))[0], 'csv', **kw)
     with open(fn, 'w') as ofile:
         df.to_csv(ofile, index_label = 'Distance (ft)')
         print('DAT converted to csv: "%s"' % fn)
 
 def convert_DAT_crawl(dir_name, **kw):
-    """crawl a directory and all of its subdirectories for .DAT files that can be passed to DAT_to_csv() for output re-formatting and optional plotting.
+    """crawl a directory and all of its subdirectories for .DAT files that can be passed to DAT_to_csv() for output re-formatting and optional plotting. All the DAT files are found first and then read or converted, optionally on a pool of worker processes (see 'jobs'). Outputs modified more recently than the DAT files they come from are left alone.
     args:
-        dir_name - Directory to initiate the crawl in.
+        dir_name - Directory to initiate the crawl in. Glob patterns like
+                    'dir/*' are also accepted.
                     To designate the current directory, use '*'
     kw:
         bundle - bool, if True, all DAT files found in the same directory
                 are written to a common excel workbook. If False or absent,
-                the DAT files are simply written to individual csv files."""
+                the DAT files are simply written to individual csv files.
+        jobs - int, number of worker processes, default is 1, which
+               processes the files in this process. With more than one
+               worker, scripts calling this function on Windows must do
+               so under "if __name__ == '__main__':", because each worker
+               re-imports the calling script.
+        overwrite - bool, if True, rewrite all outputs even if they're newer
+                    than the DAT files, default is False"""
+    files = _find_files(_crawl_roots(dir_name), ['.DAT'], recursive=True)
+    overwrite = ('overwrite' in kw) and kw['overwrite']
+    jobs = kw.get('jobs', 1)
+    if(('bundle' in kw) and kw['bundle']):
+        #group the DAT files by directory, skipping directories whose
+        #workbook is newer than their DATs and the directory itself, which
+        #changes when files are added or removed
+        groups = dict()
+        for fn in files:
+            groups.setdefault(os.path.dirname(fn), []).append(fn)
+        for d in groups.keys():
+            xl_fn = os.path.join(d, 'converted_DATs.xlsx')
+            if((not overwrite) and _is_current(xl_fn, d, *groups[d])):
+                del(groups[d])
+        #read all the DATs in parallel, then write each bundle
+        files = [fn for d in sorted(groups) for fn in groups[d]]
+        results = dict([(r[0], r[1:]) for r in
+                _pool_map(_read_DAT_task, files, jobs)])
+        for d in sorted(groups):
+            fn = os.path.join(d, 'converted_DATs.xlsx')
+            with _ExcelStream(fn) as xl:
+                for DAT in groups[d]:
+                    df, error = results[DAT]
+                    if(error is not None):
+                        print('failure to read DAT file:\n\t%s\n\tBecause of: %s' % (DAT, error))
+                        continue
+                    #use the DAT's filename as the sheet name
+                    sn = os.path.splitext(os.path.basename(DAT))[0]
+                    xl.write(df, sn, index_label = 'Distance (ft)')
+            print('Converted DAT files written to "%s"' % fn)
+    else:
+        #without bundling, write individual csv files next to the DATs
+        tasks = [fn for fn in files if(overwrite or
+                (not _is_current(os.path.splitext(fn)[0] + '.csv', fn)))]
+        for fn, error in _pool_map(_convert_DAT_task, tasks, jobs):
+            if(error is not None):
+                print('failure to convert DAT file:\n\t%s\n\tBecause of: %s' % (fn, error))
 
-    #get input directory's file and subdir names
-    dir_contents = glob.glob(dir_name)
+def _read_DAT_task(file_path):
+    """Read a DAT file for convert_DAT_crawl, returning the path, DataFrame (or None), and an error string (or None)"""
+    try:
+        return(file_path, read_DAT(file_path), None)
+    except(ValueError, IndexError, IOError, fields_class.EMFError) as e:
+        return(file_path, None, str(e))
 
-    #get the bundling option
-    if('bundle' in kw):
-        bundle = kw['bundle']
-    else:
-        bundle = False
-    #if bundle is True, set a flag for the existence of an ExcelWriter object
-    if(bundle):
-        xl_flag = False
-
-    #loop over the dir_contents
-    for dir_element in dir_contents:
-        #if the file is a .DAT, convert it
-        if(dir_element[-4:] == '.DAT'):
-            #if bundling is on, read the DAT and write it to the excel book
-            if(bundle):
-                #if an ExcelWriter doesn't exist, initialize one and set flag
-                if(not xl_flag):
-                    xl_flag = True
-                    fn = os.path.join(os.path.dirname(dir_element),
-                            'converted_DATs.xlsx')
-                    xl = pd.ExcelWriter(fn, engine = 'xlsxwriter')
-                #use the DAT's filename as the sheet name, without extension
-                sn = os.path.basename(dir_element).replace('.DAT','')
-                #read the DAT into a DataFrame and send it to the ExcelWriter
-                read_DAT(dir_element).to_excel(xl, sheet_name = sn,
-                    index_label = 'Distance (ft)')
-            else:
-                #without bundling, write an individual csv file
-                convert_DAT(dir_element, path = os.path.dirname(dir_name))
-        else:
-            #if there's a period in the dir_element, it's not a directory
-            if(os.path.isdir(dir_element)):
-                convert_DAT_crawl(os.path.join(dir_element, '*'), **kw)
-    #close/save the excel bundles DAT results
-    if(bundle and xl_flag):
-        xl.save()
-        print('Converted DAT files written to "%s"' % fn)
+def _convert_DAT_task(file_path):
+    """Convert a DAT file to a csv for convert_DAT_crawl, returning the path and an error string (or None)"""
+    try:
+        convert_DAT(file_path, path=os.path.dirname(file_path) or os.curdir)
+    except(ValueError, IndexError, IOError, fields_class.EMFError) as e:
+        return(file_path, str(e))
+    return(file_path, None)
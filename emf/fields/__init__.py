@@ -8,6 +8,8 @@ from fields_class import (Conductor,
 
 from fields_funks import (drop_template,
 						load_template,
+                        load_book,
+                        compare_DATs,
                         optimize_phasing,
                         target_fields,
                         run)
@@ -30,9 +32,21 @@ from fields_plots import (plot_Bmax,
                         show,
                         close)
 
+from fields_cache import (enable_cache,
+                        disable_cache,
+                        clear_cache)
+
+from fields_profile import (Profiler,
+                        stats,
+                        reset_stats,
+                        enable_stats,
+                        disable_stats)
+
 from FIELDS_io import (to_FLD,
                         to_FLDs,
                         to_FLDs_crawl,
+                        read_FLD,
+                        read_FLDs_crawl,
                         read_DAT,
                         convert_DAT,
                         convert_DAT_crawl)
@@ -41,5 +55,7 @@ del(fields_class,
     fields_funks,
     fields_calcs,
     fields_plots,
+    fields_cache,
+    fields_profile,
     FIELDS_io,
     fields_print)
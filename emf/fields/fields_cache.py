@@ -0,0 +1,257 @@
+"""The fields_cache module stores CrossSection results on disk so that they survive between Python sessions. Results are content-addressed, meaning each one is filed under a hash of every input that affects it (Conductor parameters, max_dist, step, sample_height, and the ROW edges), so a CrossSection that hasn't changed finds its old results no matter which template or SectionBook it comes from. Results are saved in numpy's binary .npy format and the cache directory is kept under a size limit by deleting the least recently used results first. The cache is off until enable_cache() is called.
+
+The module also caches parsed templates, independently of the results cache. load_template() stores each SectionBook it reads from an excel workbook in a '.emf_cache' directory next to the workbook, stamped with the workbook's size, modification time, and a hash of its contents. The SectionBook is stored in the json template format (see SectionBook.template_export) rather than pickled, so reading a cache file can't run code planted by anyone else with access to the workbook's directory, and it doesn't depend on the layout of the classes. The cached template is loaded instead of the workbook until the workbook changes."""
+
+from .. import os, np, pd, json, hashlib, tempfile
+
+from ..emf_funks import _file_sha1
+
+#bump this to orphan old cache entries if the calculations or storage change
+_CACHE_VERSION = 1
+#column order of the arrays stored in cache files, after the sample points
+_CACHE_COLUMNS = ['Ex', 'Ey', 'Eprod', 'Emax', 'Bx', 'By', 'Bprod', 'Bmax']
+#bump this to orphan cached templates if the template format or the
+#SectionBook storage changes
+_TEMPLATE_CACHE_VERSION = 2
+#default location and size limit
+_default_cache_dir = os.path.join(os.path.expanduser('~'), '.emf_cache',
+        'fields')
+_default_max_bytes = 200*2**20
+
+#cache state, _cache_dir is None when caching is disabled
+_cache_dir = None
+_max_bytes = _default_max_bytes
+
+def enable_cache(*args, **kw):
+    """Turn on the persistent on-disk cache of CrossSection results. Once enabled, CrossSection fields are looked up in the cache before being calculated and saved to it afterward.
+    args:
+        cache_dir - string, optional, directory to store cached results in,
+                    default is '.emf_cache/fields' in the user's home
+                    directory
+    kw:
+        max_bytes - int, maximum total size of cached results, after which
+                    the least recently used results are deleted, default
+                    is 200 MB"""
+    global _cache_dir, _max_bytes
+    if(args):
+        cache_dir = args[0]
+    else:
+        cache_dir = _default_cache_dir
+    if('max_bytes' in kw):
+        _max_bytes = int(kw['max_bytes'])
+    if(not os.path.isdir(cache_dir)):
+        os.makedirs(cache_dir)
+    _cache_dir = cache_dir
+
+def disable_cache():
+    """Turn off the persistent cache of CrossSection results. Cached files are left in place, use clear_cache() to delete them."""
+    global _cache_dir
+    _cache_dir = None
+
+def clear_cache():
+    """Delete all cached CrossSection results in the active cache directory"""
+    for fn, size, mtime in _list_entries():
+        _remove(fn)
+
+class _cache_at(object):
+    """Context manager that temporarily points the cache at another directory, restoring the previous cache state on exit. Used by run() to keep results next to its outputs for incremental reruns when no cache has been enabled."""
+
+    def __init__(self, cache_dir):
+        self._dir = cache_dir
+
+    def __enter__(self):
+        global _cache_dir
+        self._prev = _cache_dir
+        if(not os.path.isdir(self._dir)):
+            os.makedirs(self._dir)
+        _cache_dir = self._dir
+
+    def __exit__(self, *args):
+        global _cache_dir
+        _cache_dir = self._prev
+
+def _key(xs):
+    """Generate a stable hash of all the inputs determining a CrossSection's results
+    args:
+        xs - CrossSection object
+    returns:
+        string, hex digest identifying the CrossSection's results"""
+    s = ['v%d' % _CACHE_VERSION]
+    for v in [xs.max_dist, xs.step, xs.sample_height, xs.lROW, xs.rROW]:
+        s.append(_key_value(v))
+    for c in xs.conds:
+        s.append('|'.join([_key_value(v) for v in [c.x, c.y, c.subconds,
+                c.d_cond, c.d_bund, c.V, c.I, c.phase]]))
+    return(hashlib.sha1(';'.join(s).encode('ascii')).hexdigest())
+
+def _key_value(v):
+    """Represent a CrossSection or Conductor input in a cache key, where unset inputs (like ROW edges, which are None by default) are written as 'None'"""
+    if(v is None):
+        return('None')
+    #repr of floats is exact and stable across sessions and platforms
+    return(repr(float(v)))
+
+def _entry_path(key):
+    return(os.path.join(_cache_dir, key + '.npy'))
+
+def _load(xs):
+    """Look up a CrossSection's results in the cache
+    args:
+        xs - CrossSection object
+    returns:
+        DataFrame of results in the same format as CrossSection.fields, or
+        None if caching is disabled or the results aren't cached"""
+    if(_cache_dir is None):
+        return(None)
+    fn = _entry_path(_key(xs))
+    try:
+        a = np.load(fn)
+    except(IOError, ValueError):
+        return(None)
+    #mark the entry as recently used
+    try:
+        os.utime(fn, None)
+    except(OSError):
+        pass
+    return(pd.DataFrame(dict(zip(_CACHE_COLUMNS, a[1:])), index=a[0]))
+
+def _store(xs, fields):
+    """Save a CrossSection's results to the cache, then enforce the cache size limit
+    args:
+        xs - CrossSection object
+        fields - DataFrame of the CrossSection's results"""
+    if(_cache_dir is None):
+        return
+    a = np.vstack([fields.index.values] +
+            [fields[c].values for c in _CACHE_COLUMNS]).astype(float)
+    fn = _entry_path(_key(xs))
+    #write to a temporary file and rename it so that partially written
+    #files are never read
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=_cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as ofile:
+            np.save(ofile, a)
+        if(os.path.isfile(fn)):
+            _remove(fn)
+        os.rename(tmp, fn)
+    except(IOError, OSError):
+        _remove(tmp)
+        return
+    _evict()
+
+def _list_entries():
+    """List the cache files with their sizes and modification times
+    returns:
+        list of (path, size, mtime) tuples"""
+    if((_cache_dir is None) or (not os.path.isdir(_cache_dir))):
+        return([])
+    entries = []
+    for n in os.listdir(_cache_dir):
+        if(n[-4:] == '.npy'):
+            fn = os.path.join(_cache_dir, n)
+            try:
+                st = os.stat(fn)
+            except(OSError):
+                continue
+            entries.append((fn, st.st_size, st.st_mtime))
+    return(entries)
+
+def _evict():
+    """Delete the least recently used cache files until the total size of the cache is below the limit"""
+    entries = _list_entries()
+    total = sum([e[1] for e in entries])
+    if(total <= _max_bytes):
+        return
+    for fn, size, mtime in sorted(entries, key=lambda e: e[2]):
+        _remove(fn)
+        total -= size
+        if(total <= _max_bytes):
+            break
+
+def _remove(fn):
+    try:
+        os.remove(fn)
+    except(OSError):
+        pass
+
+#-------------------------------------------------------------------------------
+#PARSED TEMPLATES
+
+def _template_path(file_path):
+    """Path of the cached SectionBook for a template file"""
+    d, fn = os.path.split(os.path.abspath(file_path))
+    return(os.path.join(d, '.emf_cache', fn + '.json'))
+
+def _template_stamp(file_path, sheets):
+    """Describe the state of a template file before it's parsed, for storing with its SectionBook
+    args:
+        file_path - string, path to the template file
+        sheets - the 'sheets' keyword passed to load_template, or None
+    returns:
+        stamp - dict with the cache version, loaded sheets, and the file's
+                size and modification time, with its hash ('sha1') left
+                as None until it's needed"""
+    st = os.stat(file_path)
+    return({'version': _TEMPLATE_CACHE_VERSION, 'sheets': repr(sheets),
+        'size': st.st_size, 'mtime': st.st_mtime, 'sha1': None})
+
+def _load_template(file_path, stamp):
+    """Look up the cached SectionBook of a template file. The cache is valid if the file has the same size and modification time as when it was cached, or the same contents if it's been touched since.
+    args:
+        file_path - string, path to the template file
+        stamp - dict from _template_stamp, which receives the file's hash
+                if it's computed
+    returns:
+        sections - list of section dicts in the json template format (see
+                   fields_funks._text_sections), or None if the template
+                   isn't cached or it changed"""
+    fn = _template_path(file_path)
+    if(not os.path.isfile(fn)):
+        return(None)
+    try:
+        with open(fn, 'r') as ifile:
+            cached = json.load(ifile)
+        old = cached['stamp']
+        if(any([old[k] != stamp[k] for k in ['version', 'sheets', 'size']])):
+            return(None)
+        touched = (old['mtime'] != stamp['mtime'])
+        if(touched):
+            stamp['sha1'] = _file_sha1(file_path)
+            if(old['sha1'] != stamp['sha1']):
+                return(None)
+        sections = cached['sections']
+    #a corrupt or outdated cache file is treated like a missing one
+    except(Exception):
+        return(None)
+    #restamp a touched but unchanged file so it isn't hashed every time
+    if(touched):
+        _store_template(file_path, stamp, sections)
+    return(sections)
+
+def _store_template(file_path, stamp, sections):
+    """Cache the SectionBook parsed from a template file, in the json template format. Nothing is stored if the file changed while it was parsed or the cache directory isn't writable.
+    args:
+        file_path - string, path to the template file
+        stamp - dict from _template_stamp, taken before parsing
+        sections - list of section dicts of the SectionBook parsed from the
+                   template (see fields_funks._text_template)"""
+    try:
+        if(_template_stamp(file_path, None)['mtime'] != stamp['mtime']):
+            return
+        if(stamp['sha1'] is None):
+            stamp['sha1'] = _file_sha1(file_path)
+        fn = _template_path(file_path)
+        d = os.path.dirname(fn)
+        if(not os.path.isdir(d)):
+            os.makedirs(d)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=d)
+    except(IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, 'w') as ofile:
+            json.dump({'stamp': stamp, 'sections': sections}, ofile)
+        if(os.path.isfile(fn)):
+            _remove(fn)
+        os.rename(tmp, fn)
+    except(IOError, OSError, TypeError, ValueError):
+        _remove(tmp)
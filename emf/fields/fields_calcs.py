@@ -1,11 +1,15 @@
 from .. import np
 
+import fields_profile
+
 EPSILON = 8.854e-12   #electric permeability constant, in SI units
 electric_prefactor = 1./(2.*np.pi*EPSILON)  #convenient constant
 
 MU = 4*np.pi*1e-7     #magnetic permeability constant, in SI units
 magnetic_prefactor = 1.0e7*MU/(2.*np.pi)   #convenient constant, converted for mG
 
+@fields_profile._counted('E_field',
+        lambda a: (len(a['x']), len(a['x_cond'])))
 def E_field(x_cond, y_cond, subconds, d_cond, d_bund, V_cond, p_cond, x, y):
     """Calculate the approximate electric field generated by a group of conductors. Each of the inputs with '_cond' in their name should be an numpy array of parameters, where each index in those arrays describes a unique conductor, i.e. the 0th value in each variable is attributed to one power line.
     args:
@@ -24,6 +28,21 @@ def E_field(x_cond, y_cond, subconds, d_cond, d_bund, V_cond, p_cond, x, y):
         Ey - 1D numpy array of complex numbers, electric field phasors in
                 the vertical direction (kV/m)"""
 
+    #compute the geometry dependent coefficients then apply the voltages
+    kern = _E_kernels(x_cond, y_cond, subconds, d_cond, d_bund, x, y)
+    return(_E_from_kernels(kern, V_cond, p_cond))
+
+def _E_kernels(x_cond, y_cond, subconds, d_cond, d_bund, x, y):
+    """Compute the parts of the electric field calculation that depend only on conductor geometry and sample point locations, not on voltages or phases. The returned kernels can be passed to _E_from_kernels repeatedly for different loading scenarios. See E_field for argument descriptions.
+    returns:
+        ohd - 1D boolean array, True for overhead conductors (y_cond > 0)
+        P_inv - 2D array, inverse of the matrix of potential coefficients
+                for the overhead conductors
+        Cx - 2D array, horizontal field coefficients for each overhead
+                conductor (rows) at each sample point (columns)
+        Cy - 2D array, vertical field coefficients for each overhead
+                conductor (rows) at each sample point (columns)"""
+
     #conversions and screening out underground lines
     ohd = y_cond > 0.
     x_cond = x_cond[ohd]*0.3048         #convert to meters
@@ -31,72 +50,83 @@ def E_field(x_cond, y_cond, subconds, d_cond, d_bund, V_cond, p_cond, x, y):
     subconds = subconds[ohd]
     d_cond = d_cond[ohd]*0.0254         #convert to meters
     d_bund = d_bund[ohd]*0.0254         #convert to meters
-    V_cond = V_cond[ohd]/np.sqrt(3.0)   #convert to ground reference from
-                                            #line-line reference, leave in kV
-    p_cond = p_cond[ohd]*2*np.pi/360.   #convert to radians
-    x = x*0.3048                        #convert to meters
-    y = y*0.3048                        #convert to meters
+    x = np.asarray(x, dtype=float)*0.3048   #convert to meters
+    y = np.asarray(y, dtype=float)*0.3048   #convert to meters
 
-    #array length variables
-    N = len(p_cond)     #number of conductors
-    Z = len(x)          #number of sample points or x,y pairs
+    #number of conductors
+    N = len(x_cond)
 
     #calculate the effective conductor diameters
     d_cond  = d_bund*((subconds*d_cond/d_bund)**(1./subconds))
 
-    #compute the matrix of potential coefficients
+    #compute the matrix of potential coefficients, with the squared distances
+    #between each conductor and the images of the others in the numerator and
+    #the squared distances between the conductors in the denominator
     range_N = range(N)
-    P = np.empty((N,N))
+    dx = x_cond[:,None] - x_cond[None,:]
+    n = dx**2 + (y_cond[:,None] + y_cond[None,:])**2
+    d = dx**2 + (y_cond[:,None] - y_cond[None,:])**2
+    d[range_N, range_N] = 1.0   #avoid dividing by zero on the diagonal
+    P = electric_prefactor*np.log(np.sqrt(n/d))
     #diagonals
     P[range_N, range_N] = electric_prefactor*np.log(4*y_cond/d_cond)
-    #other elements
-    for a in range_N:
-        for b in range_N:
-            if(a != b):
-                n = (x_cond[a] - x_cond[b])**2 + (y_cond[a] + y_cond[b])**2
-                d = (x_cond[a] - x_cond[b])**2 + (y_cond[a] - y_cond[b])**2
-                P[a,b] = electric_prefactor*np.log(np.sqrt(n/d))
+
+    #invert the potential coefficients once so that charges for any set of
+    #voltages are a single matrix-vector product
+    P_inv = np.linalg.inv(P)
+
+    #compute the field coefficients without the charges, with each row
+    #corresponding to a conductor and each column to a sample point
+    dx = x[None,:] - x_cond[:,None]
+    #denominators, squared distance between the points and the conductors
+    d1 = dx**2 + (y[None,:] - y_cond[:,None])**2
+    d2 = dx**2 + (y[None,:] + y_cond[:,None])**2
+    #x component numerator, the same for the conductor and its image
+    nx = electric_prefactor*dx
+    #y component numerators, different for the conductor and its image
+    ny1 = electric_prefactor*(y[None,:] - y_cond[:,None])
+    ny2 = electric_prefactor*(y[None,:] + y_cond[:,None])
+    #evaluate
+    Cx = nx/d1 - nx/d2
+    Cy = ny1/d1 - ny2/d2
+
+    return(ohd, P_inv, Cx, Cy)
+
+def _E_from_kernels(kern, V_cond, p_cond):
+    """Compute electric field phasors from the geometry kernels generated by _E_kernels and a set of conductor voltages and phases
+    args:
+        kern - tuple returned by _E_kernels
+        V_cond - 1D numpy array, voltages of conductors (kilovolts, kV)
+        p_cond - 1D numpy array, phases of conductors (degrees)
+    returns:
+        Ex - 1D numpy array of complex numbers, electric field phasors in
+                the horizontal direction (kV/m)
+        Ey - 1D numpy array of complex numbers, electric field phasors in
+                the vertical direction (kV/m)"""
+
+    ohd, P_inv, Cx, Cy = kern
+    V_cond = V_cond[ohd]/np.sqrt(3.0)   #convert to ground reference from
+                                            #line-line reference, leave in kV
+    p_cond = p_cond[ohd]*2*np.pi/360.   #convert to radians
 
     #initialize complex voltage phasors
     V = V_cond*(np.cos(p_cond) + complex(0,1)*np.sin(p_cond))
 
     #compute real and imaginary charge phasors
-    Q = np.linalg.solve(P, V)
-
-    #compute components of the electric field phasors at each point, with each
-    #column of E_x and E_y storing components due to each conductor, so that the
-    #rows represent a spatial point across the ROW or an x,y pair
-    Ex = np.empty((N,Z))
-    Ey = np.empty((N,Z))
-    #first compute the coefficients without the charges
-    for a in range(Z):
-        #denominators, squared distance between the point and the conductors
-        d1 = (x[a] - x_cond)**2 + (y[a] - y_cond)**2
-        d2 = (x[a] - x_cond)**2 + (y[a] + y_cond)**2
-        #x component numerator, the same for the conductor and its image
-        nx = electric_prefactor*(x[a] - x_cond)
-        #y component numerators, different for the conductor and its image
-        ny1 = electric_prefactor*(y[a] - y_cond)
-        ny2 = electric_prefactor*(y[a] + y_cond)
-        #evaluate
-        Ex[:,a] = nx/d1 - nx/d2
-        Ey[:,a] = ny1/d1 - ny2/d2
-
-    #MUltiply the charges by the field coefficients calculated above
-    Q = np.tile(np.reshape(Q, (N,1)), (1,Z))
-    Ex = Ex*Q
-    Ey = Ey*Q
-
-    #sum the phasors for each sample point, yielding the sum of phasors for each
-    #conductor, which are the final phasors for each point
-    Ex = np.sum(Ex, axis = 0)
-    Ey = np.sum(Ey, axis = 0)
+    Q = P_inv.dot(V)
+
+    #multiply the charges by the field coefficients and sum the contributions
+    #of each conductor at each sample point
+    Ex = Q.dot(Cx)
+    Ey = Q.dot(Cy)
 
     #return phasors, complex numbers, for the x and y components
     #   - these complex phasors are converted to real valued outputs by the
     #   - phasors_to_magnitudes() function
     return(Ex, Ey)
 
+@fields_profile._counted('B_field',
+        lambda a: (len(a['x']), len(a['x_cond'])))
 def B_field(x_cond, y_cond, I_cond, p_cond, x, y):
     """Calculate the approximate magnetic field generated by a group of conductors. Each of the variables with '_cond' should be an numpy array of parameters, where each index in those arrays describes a unique conductor, i.e. the 0th value in each variable is attributed to one power line.
     args:
@@ -112,43 +142,67 @@ def B_field(x_cond, y_cond, I_cond, p_cond, x, y):
         By - 1D numpy array of complex numbers, magnitic field phasors in
                 the vertical direction (mG)"""
 
-    #array length variables
-    N = len(p_cond)         #number of conductors
-    Z = len(x)              #number of sample points or x,y pairs
+    #compute the geometry dependent coefficients then apply the currents
+    kern = _B_kernels(x_cond, y_cond, x, y)
+    return(_B_from_kernels(kern, I_cond, p_cond))
+
+def _B_kernels(x_cond, y_cond, x, y):
+    """Compute the parts of the magnetic field calculation that depend only on conductor and sample point locations, not on currents or phases. See B_field for argument descriptions.
+    returns:
+        Kx - 2D array, horizontal field coefficients for each conductor
+                (rows) at each sample point (columns)
+        Ky - 2D array, vertical field coefficients for each conductor
+                (rows) at each sample point (columns)"""
 
     #conversions
     x_cond = x_cond*0.3048          #convert to meters
     y_cond = y_cond*0.3048          #convert to meters
+    x = np.asarray(x, dtype=float)*0.3048   #convert to meters
+    y = np.asarray(y, dtype=float)*0.3048   #convert to meters
+
+    #distances between each conductor (rows) and sample point (columns)
+    dx = x[None,:] - x_cond[:,None]
+    dy = y[None,:] - y_cond[:,None]
+    r_sq = dx**2 + dy**2
+    #the field magnitude falls off with 1/r and is perpendicular to the line
+    #connecting the point and the conductor, so the x component goes with
+    #-dy/r and the y component goes with dx/r, potentially contrary to one's
+    #first instinct that sine goes with y components and cosine with x
+    #components, but it's right
+    Kx = -magnetic_prefactor*dy/r_sq
+    Ky = magnetic_prefactor*dx/r_sq
+
+    return(Kx, Ky)
+
+def _B_from_kernels(kern, I_cond, p_cond):
+    """Compute magnetic field phasors from the geometry kernels generated by _B_kernels and a set of conductor currents and phases
+    args:
+        kern - tuple returned by _B_kernels
+        I_cond - 1D numpy array, currents of conductors (Amps)
+        p_cond - 1D numpy array, phases of conductors (degrees)
+    returns:
+        Bx - 1D numpy array of complex numbers, magnitic field phasors in
+                the horizontal direction (mG)
+        By - 1D numpy array of complex numbers, magnitic field phasors in
+                the vertical direction (mG)"""
+
+    Kx, Ky = kern
     p_cond = p_cond*2*np.pi/360.    #convert to radians
-    x = x*0.3048                    #convert to meters
-    y = y*0.3048                    #convert to meters
 
     #initialize complex current phasors
     I = I_cond*(np.cos(p_cond) + complex(0,1)*np.sin(p_cond))
 
-    #compute magnetic field component phasors for each x,y point
-    Bx = np.zeros((Z,), dtype = complex)
-    By = np.zeros((Z,), dtype = complex)
-    for a in range(Z): #x,y pairs
-        for b in range(N): #conductors
-            dx = x[a] - x_cond[b]
-            dy = y[a] - y_cond[b]
-            #magnitude phasor
-            B = magnetic_prefactor*I[b]/np.sqrt(dx**2 + dy**2)
-            #break it up into components
-            theta = np.arctan(abs(dy/dx))
-            #x component calculated with sine and y component with cosine
-            #because the field is perpendicular to the line to the conductor,
-            #potentially contrary to one's first instinct that sine goes
-            #with y components and cosine with x components, but it's right
-            Bx[a] -= np.sign(dy)*np.sin(theta)*B
-            By[a] += np.sign(dx)*np.cos(theta)*B
+    #sum the contributions of each conductor at each x,y point
+    Bx = I.dot(Kx)
+    By = I.dot(Ky)
 
     #return phasors, complex numbers, for the x and y components
     #   - these complex phasors are converted to real valued outputs by the
     #   - phasors_to_magnitudes() function
     return(Bx, By)
 
+@fields_profile._counted('phasors_to_magnitudes',
+        lambda a: (len(a['Ph_x']), None))
 def phasors_to_magnitudes(Ph_x, Ph_y):
     """Convert vectors of complex x and y phasors into real quantities, namely the amplitude of the field in the x and y directions, the product (the hypotenuse of the amplitudes), and the maxiMUm field. Results of E_field and B_field can be passed directly to this function for conversion from phasor form into usable form.
     args:
@@ -182,6 +236,6 @@ def phasors_to_magnitudes(Ph_x, Ph_y):
     term2 = mag_y_sq*(np.cos(t2 + phase_y))**2
     ax_mag2 = np.sqrt(term1 + term2)
     #pick out the semi-major axis magnitude from the two semi-axis results
-    maxiMUm = np.maxiMUm(ax_mag1, ax_mag2)
+    maxiMUm = np.maximum(ax_mag1, ax_mag2)
     #return the 4 output columns
     return(mag_x, mag_y, prod, maxiMUm)
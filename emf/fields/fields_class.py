@@ -1,11 +1,14 @@
-from .. import np, pd, copy
+from .. import np, pd, copy, time
 
 from ..emf_class import EMFError
+from ..emf_funks import _ExcelStream
 
 import fields_funks
 import fields_plots
 import fields_calcs
 import fields_print
+import fields_cache
+import fields_profile
 import FIELDS_io
 
 class Conductor(object):
@@ -370,6 +373,13 @@ class CrossSection(object):
         return(self.fields.loc[[self.lROW, self.rROW]])
     ROW_edge_fields = property(_get_ROW_edge_fields, None, None, """Slice the 'fields' DataFrame and return another DataFrame with only the results at the left and right right-of-way (ROW) edges, the locations of which are set in 'lROW' and 'rROW'.""")
 
+    def _get_fingerprint(self):
+        conds = tuple([(c.x, c.y, c.subconds, c.d_cond, c.d_bund)
+                        for c in self.conds])
+        return((conds, self.max_dist, self.step, self.sample_height,
+                self.lROW, self.rROW))
+    fingerprint = property(_get_fingerprint, None, None, """A hashable tuple identifying the geometry of the CrossSection, meaning the positions and sizes of its Conductors (in the order they were added) and the parameters defining the sample points. CrossSections with equal fingerprints differ only in their loading (voltages, currents, and phases), so the geometry-dependent parts of their EMF calculations are identical and can be shared.""")
+
     def _check_complete(self):
         """Check that all variables in each conductor in the CrossSection are set, and not left with the initial None values.
         returns:
@@ -412,6 +422,15 @@ class CrossSection(object):
         if(not b):
             raise(EMFError("""Cannot add Conductor "%s" to the CrossSection because it is not complete. The parameter "%s" is not set."""
             % (cond.tag, v[1:])))
+        self._check_new_conductor(cond)
+        #add to self.conds and indexing dict
+        self._tag2idx[cond.tag] = len(self.conds)
+        self.conds.append(copy.deepcopy(cond))
+        #associate xs with the conductor
+        self.conds[-1]._xs = self
+
+    def _check_new_conductor(self, cond):
+        """Check that a Conductor's tag isn't already used in the CrossSection and warn about grounded Conductors with current"""
         #check if the tag has already been used
         if(cond.tag in self._tag2idx):
             raise(EMFError("""A Conductor with tag "%s" is already in CrossSection "%s". Another Conductor with the same tag cannot be added"""
@@ -423,11 +442,17 @@ class CrossSection(object):
                 print cond.I
                 print("""Conductor with tag "%s" in CrossSection "%s" is grounded (V = 0) but has nonzero current?"""
                 % (cond.tag, self.sheet))
-        #add to self.conds and indexing dict
-        self._tag2idx[cond.tag] = len(self.conds)
-        self.conds.append(copy.deepcopy(cond))
-        #associate xs with the conductor
-        self.conds[-1]._xs = self
+
+    def _add_new_conductors(self, conds):
+        """Add newly created Conductor objects in bulk, without the copying done by add_conductor. The Conductors themselves become part of the CrossSection, so they must be complete and not belong to any other CrossSection. Used by load_template.
+        args:
+            conds - list of Conductor objects"""
+        for cond in conds:
+            self._check_new_conductor(cond)
+            self._tag2idx[cond.tag] = len(self.conds)
+            self.conds.append(cond)
+            cond._xs = self
+        self._fields = None
 
     def remove_conductor(self, key):
         """Remove a Conductor object from the CrossSection
@@ -449,63 +474,88 @@ class CrossSection(object):
     def _update_tag2idx(self):
         self._tag2idx = dict(zip(self.tags, range(len(self.conds))))
 
+    @fields_profile._counted('_calculate_fields',
+            lambda a: (len(a['self'].x_sample), len(a['self'].conds)))
     def _calculate_fields(self):
         """Calculate electric and magnetic fields across the ROW and store the results in the self.fields DataFrame"""
-        #pull arrays with conductor and sampling information
-        x_sample, y_sample = self.x_sample, self.y_sample
-        x, y, I, V, phase = self.x, self.y, self.I, self.V, self.phase
-        subconds, d_cond, d_bund = self.subconds, self.d_cond, self.d_bund
-        #calculate magnetic field
-        Bx, By = fields_calcs.B_field(x, y, I, phase, x_sample, y_sample)
+        #check the on-disk cache first, if it's enabled
+        cached = fields_cache._load(self)
+        if(fields_cache._cache_dir is not None):
+            fields_profile._tally('_calculate_fields', cached is not None)
+        if(cached is not None):
+            self._fields = cached
+            return
+        #get the geometry-dependent kernels, shared through the parent
+        #SectionBook with any other CrossSections of identical geometry
+        if(self._sb is not None):
+            E_kern, B_kern = self._sb._fetch_kernels(self)
+        else:
+            E_kern, B_kern = self._calculate_kernels()
+        #pull arrays with conductor loading information
+        I, V, phase = self.I, self.V, self.phase
+        x_sample = self.x_sample
+        n, m = len(x_sample), len(I)
+        #calculate magnetic field, crediting the B_field counter because the
+        #kernels are applied without calling B_field
+        t0 = time.time()
+        Bx, By = fields_calcs._B_from_kernels(B_kern, I, phase)
+        fields_profile._credit('B_field', time.time() - t0, n, m)
         Bx, By, Bprod, Bmax = fields_calcs.phasors_to_magnitudes(Bx, By)
-        #calculate electric field
-        Ex, Ey = fields_calcs.E_field(x, y, subconds, d_cond, d_bund, V, phase,
-                                        x_sample, y_sample)
+        #calculate electric field, crediting the E_field counter
+        t0 = time.time()
+        Ex, Ey = fields_calcs._E_from_kernels(E_kern, V, phase)
+        fields_profile._credit('E_field', time.time() - t0, n, m)
         Ex, Ey, Eprod, Emax = fields_calcs.phasors_to_magnitudes(Ex, Ey)
         #store the values
         self._fields = pd.DataFrame({'Ex':Ex,'Ey':Ey,'Eprod':Eprod,'Emax':Emax,
                                     'Bx':Bx,'By':By,'Bprod':Bprod,'Bmax':Bmax},
                                     index=x_sample)
+        #save the results to the on-disk cache, if it's enabled
+        fields_cache._store(self, self._fields)
+
+    @fields_profile._counted('kernels',
+            lambda a: (len(a['self'].x_sample), len(a['self'].conds)))
+    def _calculate_kernels(self):
+        """Compute the geometry-dependent parts of the electric and magnetic field calculations, which don't depend on Conductor voltages, currents, or phases
+        returns:
+            E_kern - tuple of electric field kernels (see fields_calcs._E_kernels)
+            B_kern - tuple of magnetic field kernels (see fields_calcs._B_kernels)"""
+        x_sample, y_sample = self.x_sample, self.y_sample
+        x, y = self.x, self.y
+        E_kern = fields_calcs._E_kernels(x, y, self.subconds, self.d_cond,
+                self.d_bund, x_sample, y_sample)
+        B_kern = fields_calcs._B_kernels(x, y, x_sample, y_sample)
+        return(E_kern, B_kern)
 
     def compare_DAT(self, DAT_path, **kw):
-        """Load a FIELDS output file (.DAT) to calculate absolute and percentage differences between it and the CrossSection object's results. The results in the DAT file must be sampled at the same x coordinates as those in the CrossSection. A panel of comparison results is returned. If the 'save' or 'path' keywords are used, the comparison results will be saved with plots demonstrating the comparisons.
+        """Load a FIELDS output file (.DAT) to calculate absolute and percentage differences between it and the CrossSection object's results. Results are compared at the x coordinates shared by the DAT file and the CrossSection, matched to the hundredths digit printed by FIELDS. A dict of comparison DataFrames is returned. If the 'save' or 'path' keywords are used, the comparison results will be saved with plots demonstrating the comparisons. Use emf.fields.compare_DATs to compare a whole SectionBook.
         args:
             DAT_path - path of FIELDS results file
         kw:
-            save - bool, toggle whether output Panel and figures are saved,
+            save - bool, toggle whether output frames and figures are saved,
                     also saves figures with error and comparison plots
             path - string, destination of saved files, will force save == True
             round - int, round the results in self.fields to a certain number
                     of digits in an attempt to exactly match the FIELDS results, which are printed only to the
                     thousandths digit
-            truncate - bool, truncate results after the thousandths digit
+            truncate - bool, round results to the thousandths digit, as
+                    printed by FIELDS
         returns:
-            pan - pandas Panel with DAT results, results of this code,
-                the absolute error between, and the relative error between"""
+            comp - dict of DataFrames with DAT results, results of this code,
+                the absolute error between, and the relative error between,
+                under the keys 'FIELDS_DAT_results', 'python_results',
+                'Absolute Difference', and 'Percent Difference'"""
         #load the .DAT file into a dataframe
         df = FIELDS_io.read_DAT(DAT_path)
-        #check dataframe shape compatibility
-        if(df.shape != self.fields.shape):
-            raise(EMFError("""self.fields in CrossSection named "%s" and the imported .DAT DataFrame have different shapes. Be sure to target the correct .DAT file and that it has compatible DIST values.""" % self.sheet))
-        #prepare a dictionary to create a Panel
-        if(('round' in kw) and ('truncate' in kw)):
-            raise(FLDError("""Cannot both round and truncate for DAT comparison. Choose either rounding or truncation."""))
-        elif('round' in kw):
-            f = self.fields.round(kw['round'])
-        elif('truncate' in kw):
-            if(kw['truncate']):
-                f = self.fields.copy(deep=True)
-                for c in f.columns:
-                    for i in f.index:
-                        f[c].loc[i] = float('%.3f' % f[c].loc[i])
-        else:
-            f = self.fields
-        frames = ['FIELDS_DAT_results', 'python_results',
-                'Absolute Difference', 'Percent Difference']
-        pan = pd.Panel(data={frames[0] : df,
-                frames[1]: f,
-                frames[2]: f - df,
-                frames[3]: 100*(f - df)/f})
+        #match the results at shared sample distances
+        f = self.fields
+        index, calc, DAT = fields_funks._DAT_align(f, df)
+        if(not len(index)):
+            raise(EMFError("""self.fields in CrossSection named "%s" and the imported .DAT DataFrame share no sample distances. Be sure to target the correct .DAT file and that it has compatible DIST values.""" % self.sheet))
+        #compare whole arrays, rounding the results if called for
+        arrays = fields_funks._DAT_differences(DAT,
+                fields_funks._DAT_rounding(calc, **kw))
+        comp = fields_funks._DAT_comparison(index, f.columns, arrays)
         #write data and save figures if called for
         if('path' in kw):
             kw['save'] = True
@@ -513,15 +563,14 @@ class CrossSection(object):
             if(kw['save']):
                 fn = fields_funks._path_manage(self.sheet + '-DAT_comparison',
                     '.xlsx', **kw)
-                xl = pd.ExcelWriter(fn, engine='xlsxwriter')
-                for f in frames:
-                    pan[f].to_excel(xl, index_label='x', sheet_name=f)
-                xl.save()
+                with _ExcelStream(fn) as xl:
+                    for k in fields_funks._DAT_comparison_names:
+                        xl.write(comp[k], k, index_label='x')
                 print('DAT comparison book saved to: "%s"' % fn)
                 #make plots of the absolute and percent error
-                figs = fields_plots._plot_DAT_comparison(self, pan, **kw)
-        #return the Panel
-        return(pan)
+                figs = fields_plots._plot_DAT_comparison(self, comp, **kw)
+        #return the comparison frames
+        return(comp)
 
     def sample(self, *args):
         """Get a random Conductor  or a list of random Conductors from the CrossSection
@@ -562,6 +611,8 @@ class SectionBook(object):
         self._xss = [] #list of cross section objects
         self._sheet2idx = dict() #for CrossSection retrieval
         self._i = _IntegerIndexer(self.xss)
+        #geometry-dependent field kernels keyed by CrossSection fingerprints
+        self._kernels = dict()
         #add CrossSections if they're passed in
         if(len(args) == 1):
             for xs in args[0]:
@@ -612,6 +663,10 @@ class SectionBook(object):
         return(df)
     ROW_edge_max = property(_get_ROW_edge_max, None, None, """DataFrame with maximum field magnitudes at the right-of-way (ROW) edges of each CrossSection in the SectionBook. The DataFrame is indexed by the CrossSection sheet strings, and has columns 'Bmaxl', 'Bmaxr', 'Emaxl', 'Emaxr'.""")
 
+    def _get_unique_geometries(self):
+        return(len(set([xs.fingerprint for xs in self.xss])))
+    unique_geometries = property(_get_unique_geometries, None, None, """The number of unique CrossSection geometries (see CrossSection.fingerprint) in the SectionBook. The geometry-dependent parts of the EMF calculations are evaluated once for each unique geometry and shared among all CrossSections with the same fingerprint, so this is the number of geometries evaluated when all fields are calculated.""")
+
     def _check_complete(self):
         """Check that all CrossSections in the SectionBook are complete
         returns:
@@ -673,15 +728,27 @@ class SectionBook(object):
         #get sheet
         if('sheet' in kw):
             xs.sheet = kw['sheet']
-        #Prevent adding CrossSections with the same sheets
-        if(xs.sheet in self._sheet2idx):
-            raise(EMFError("""CrossSection name "%s" already exists in the SectionBook. Duplicate names would cause collisions in the lookup dictionary (self._sheet2idx). Use a different name.""" % xs.sheet))
-        else:
-            #add the CrossSection and update indexing dict
+        self._check_new_sheet(xs.sheet)
+        #add the CrossSection and update indexing dict
+        self._sheet2idx[xs.sheet] = len(self.xss)
+        self.xss.append(xs)
+        #associate self with the copied CrossSection
+        self.xss[-1]._sb = self
+
+    def _check_new_sheet(self, sheet):
+        """Prevent adding CrossSections with the same sheets"""
+        if(sheet in self._sheet2idx):
+            raise(EMFError("""CrossSection name "%s" already exists in the SectionBook. Duplicate names would cause collisions in the lookup dictionary (self._sheet2idx). Use a different name.""" % sheet))
+
+    def _add_new_sections(self, xss):
+        """Add newly created CrossSection objects in bulk, without the copying done by add_section. The CrossSections themselves become part of the SectionBook, so they must not belong to any other SectionBook. Used by load_template.
+        args:
+            xss - list of CrossSection objects"""
+        for xs in xss:
+            self._check_new_sheet(xs.sheet)
             self._sheet2idx[xs.sheet] = len(self.xss)
             self.xss.append(xs)
-            #associate self with the copied CrossSection
-            self.xss[-1]._sb = self
+            xs._sb = self
 
     def remove_section(self, sheet):
         """Remove a CrossSection from the SectionBook by providing its sheet string
@@ -699,6 +766,26 @@ class SectionBook(object):
     def _update_sheet2idx(self):
         self._sheet2idx = dict(zip(self.sheets, range(len(self.xss))))
 
+    def _fetch_kernels(self, xs):
+        """Retrieve the geometry-dependent field kernels for a CrossSection, computing and storing them only if no other CrossSection with the same fingerprint has already done so
+        args:
+            xs - CrossSection object in the SectionBook
+        returns:
+            E_kern, B_kern - see CrossSection._calculate_kernels"""
+        fp = xs.fingerprint
+        fields_profile._tally('kernels', fp in self._kernels)
+        if(fp not in self._kernels):
+            #discard kernels no longer used by any CrossSection in the book,
+            #which can only have accumulated if there are more stored kernels
+            #than CrossSections
+            if(len(self._kernels) >= len(self.xss)):
+                fps = set([i.fingerprint for i in self.xss])
+                for k in self._kernels.keys():
+                    if(k not in fps):
+                        del(self._kernels[k])
+            self._kernels[fp] = xs._calculate_kernels()
+        return(self._kernels[fp])
+
     def export(self, **kw):
         """Write complete sets of model results to an excel workbook with each CrossSection's 'fields' DataFrame in a separate sheet. Also write the ROW_edge_max DataFrame to a csv.
         kw:
@@ -707,24 +794,68 @@ class SectionBook(object):
         self.ROW_edge_export(**kw)
 
     def results_export(self, **kw):
-        """Write all of the cross section results to an excel workbook with each CrossSection's 'fields' DataFrame in a separate sheet.
+        """Write all of the cross section results to an excel workbook with each CrossSection's 'fields' DataFrame in a separate sheet, or to a single csv file with a 'Sheet' column identifying each CrossSection's rows. Default is excel. Results are streamed to the file one CrossSection at a time, so memory use doesn't grow with the size of the SectionBook, and the csv is much faster to write than the workbook.
         kw:
+            file_type - string, accepts 'excel' or 'csv' (default excel)
             path - string, destination/filename for saved file"""
-        #path management
-        fn = fields_funks._path_manage(self.name + '-all_results','.xlsx',**kw)
-        #write results
-        xlwriter = pd.ExcelWriter(fn, engine='xlsxwriter')
-        for xs in self:
-            xs.fields.to_excel(xlwriter, sheet_name=xs.sheet,
-                    index_label='Distance (ft)')
+        file_type = 'excel'
+        if('file_type' in kw):
+            file_type = kw['file_type']
+            if(file_type[0] == '.'):
+                file_type = file_type[1:]
+        if(file_type == 'csv'):
+            fn = fields_funks._path_manage(self.name + '-all_results', '.csv',
+                    **kw)
+            with open(fn, 'w') as ofile:
+                for i, xs in enumerate(self):
+                    #a shallow copy takes the extra column without copying
+                    #or altering the results
+                    df = xs.fields.copy(deep=False)
+                    df.insert(0, 'Sheet', xs.sheet)
+                    df.to_csv(ofile, header=(i == 0),
+                            index_label='Distance (ft)')
+        else:
+            fn = fields_funks._path_manage(self.name + '-all_results', '.xlsx',
+                    **kw)
+            with _ExcelStream(fn) as xl:
+                for xs in self:
+                    xl.write(xs.fields, xs.sheet, index_label='Distance (ft)')
         print('Full SectionBook results written to: %s' % fn)
 
+    def save(self, **kw):
+        """Save the SectionBook to a binary .npz file, including any results that have been calculated, so that it can be reloaded with emf.fields.load_book() without recomputing anything. Conductor parameters and results are stored in a few large arrays, which load quickly and can be memory-mapped.
+        kw:
+            path - string, destination/filename for saved file"""
+        fn = fields_funks._path_manage(self.name, '.npz', **kw)
+        fields_funks._save_book(self, fn)
+        print('SectionBook saved to: %s' % fn)
+
+    def template_export(self, **kw):
+        """Write the CrossSections and Conductors in the SectionBook to a json or csv template, which load_template() reads much faster than excel templates. The text templates are also easy to edit and compare in version control. Default is json.
+        kw:
+            file_type - string, accepts 'json' or 'csv' (default json)
+            path - string, destination/filename for saved file"""
+        file_type = 'json'
+        if('file_type' in kw):
+            file_type = kw['file_type']
+            if(file_type[0] == '.'):
+                file_type = file_type[1:]
+        if(file_type not in ['json', 'csv']):
+            raise(EMFError("""file_type must be 'json' or 'csv', not '%s'""" % str(file_type)))
+        fn = fields_funks._path_manage(self.name, '.' + file_type, **kw)
+        if(file_type == 'json'):
+            fields_funks._write_template_json(self, fn)
+        else:
+            fields_funks._write_template_csv(self, fn)
+        print('SectionBook template written to: %s' % fn)
+
     def ROW_edge_export(self, **kw):
         """Write max field results at ROW edges for each cross section to an excel or csv file. Default is csv.
         kw:
             file_type - string, accepts 'csv' or 'excel' (default csv)
             path - string, destination/filename for saved file
-            xl - pandas ExcelWriter object, takes precedence over 'path'"""
+            xl - pandas ExcelWriter object or open workbook from
+                 emf_funks._ExcelStream, takes precedence over 'path'"""
         #be sure ROW_edge_results are current
         #self.compile_ROW_edge_results()
         #export
@@ -741,7 +872,10 @@ class SectionBook(object):
             if(file_type == 'excel'):
                 wo = fields_funks._path_manage(self.name + '-ROW_edge_results',
                         '.xlsx', **kw)
-        if(wo):
+        if(isinstance(wo, _ExcelStream)):
+            wo.write(self.ROW_edge_max, 'ROW_edge_max', index_label='Sheet',
+                    columns=c, header=h)
+        elif(wo):
             self.ROW_edge_max.to_excel(wo, index_label='Sheet', columns=c,
                                     header=h, sheet_name='ROW_edge_max')
         else:
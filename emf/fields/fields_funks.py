@@ -1,12 +1,17 @@
-from .. import os, np, pd, shutil, itertools
+from .. import (os, np, pd, csv, json, time, shutil, hashlib, zipfile,
+        itertools, xlrd)
 
 from ..emf_funks import (_path_manage, _check_extension, _is_number,
                         _check_intable, _flatten, _sig_figs,
-                        _path_str_condition)
+                        _path_str_condition, _npz_load, _ExcelStream,
+                        _xlsx_contents)
 
 import fields_class
 import fields_calcs
 import fields_plots
+import fields_cache
+import fields_profile
+import FIELDS_io
 
 def drop_template(*args, **kw):
     """Copy the emf.fields template in the current directory or a directory specified by an input string
@@ -35,140 +40,850 @@ def run(template_path, **kw):
         sheets - a list of sheet names to load, default is all sheets
         path - string, destination/filename for saved files
         format - string, saved plot format (usually 'png' or 'pdf')
-        xmax - cutoff distance from ROW center in plots"""
+        xmax - cutoff distance from ROW center in plots
+        incremental - bool, if True, a manifest of hashes for each sheet
+                      and each tag group is saved next to the outputs and
+                      results are cached there, so that a rerun only
+                      recomputes and re-plots sheets whose inputs changed
+                      (along with the group plots they belong to),
+                      default is False
+        watch - bool, if True, keep running and rerun incrementally
+                every time the template file is saved, until interrupted
+                with Ctrl-C, default is False
+        interval - float, seconds between checks of the template file in
+                   watch mode, default is 1
+        profile - bool or Profiler object, if True or a Profiler, the wall
+                  time and memory use of each stage of the run (and of each
+                  sheet's calculations and plot) are recorded and written to
+                  a csv next to the other outputs. Pass a Profiler to access
+                  the records afterward through Profiler.frame."""
     #force saving for the plotting functions if there is no 'path' keyword
     if(not ('path' in kw)):
         kw['save'] = True
         #also direct output files to the same directory as the template
         kw['path'] = os.path.dirname(template_path)
+    #watch mode reruns incrementally whenever the template changes
+    if(('watch' in kw) and kw['watch']):
+        return(_watch(template_path, **kw))
+    #set up stage profiling if called for
+    prof = _get_profiler(template_path, **kw)
     #import templates
-    sb = load_template(template_path)
-    #export the full results workbook
-    sb.results_export(**kw)
-    #export ROW edge results
-    sb.ROW_edge_export(**kw)
-    #export single CrossSection plots
+    with prof.stage('load_template'):
+        sb = load_template(template_path, **kw)
+    if(('incremental' in kw) and kw['incremental']):
+        sb = _run_incremental(sb, prof, **kw)
+    else:
+        #calculate fields
+        for xs in sb:
+            with prof.stage('fields', xs.sheet):
+                xs.fields
+        #export the full results workbook
+        with prof.stage('results_export'):
+            sb.results_export(**kw)
+        #export ROW edge results
+        with prof.stage('ROW_edge_export'):
+            sb.ROW_edge_export(**kw)
+        #export single CrossSection plots
+        for xs in sb:
+            with prof.stage('plot_max_fields', xs.sheet):
+                fig, ax_E, ax_B = fields_plots.plot_max_fields(xs, **kw)
+                fields_plots.close(fig)
+        #export group comparison line plots
+        with prof.stage('plot_groups'):
+            fields_plots.plot_groups(sb, **kw)
+        #export group ROW comparison bar plots
+        with prof.stage('plot_groups_at_ROW'):
+            fields_plots.plot_groups_at_ROW(sb, **kw)
+    if(isinstance(prof, fields_profile.Profiler)):
+        prof.export(**kw)
+    return(sb)
+
+def _get_profiler(template_path, **kw):
+    """Pull a Profiler out of the 'profile' keyword of run(), creating one if profile=True or returning a do-nothing stand in if profiling is off"""
+    if('profile' in kw):
+        if(isinstance(kw['profile'], fields_profile.Profiler)):
+            return(kw['profile'])
+        elif(kw['profile']):
+            name = os.path.basename(template_path)
+            if('.' in name):
+                name = name[:name.index('.')]
+            return(fields_profile.Profiler(name))
+    return(fields_profile._NullProfiler())
+
+def _run_incremental(sb, prof, **kw):
+    """Perform the exporting and plotting of run() only for the parts of a SectionBook that changed since the last run, as recorded in a manifest file next to the outputs. Results are cached next to the outputs (unless a cache is already enabled) so unchanged sheets don't need to be recomputed when the results workbook is rewritten.
+    args:
+        sb - SectionBook loaded from the template
+        prof - Profiler recording the stages of the run
+    kw:
+        see run()
+    returns:
+        sb - the SectionBook"""
+    #manifest and result cache locations
+    manifest_path = _path_manage(sb.name + '-manifest', 'json', **kw)
+    cache_dir = os.path.join(os.path.dirname(manifest_path), '.emf_cache')
+    #hash everything affecting the outputs
+    manifest = _run_manifest(sb, **kw)
+    old = _read_manifest(manifest_path)
+    if(old['options'] != manifest['options']):
+        old = {'sheets': {}, 'groups': {}}
+    changed_sheets = [sh for sh in manifest['sheets']
+            if(old['sheets'].get(sh) != manifest['sheets'][sh])]
+    changed_groups = [g for g in manifest['groups']
+            if(old['groups'].get(g) != manifest['groups'][g])]
+    #the results workbook and ROW edge table cover all sheets, so they're
+    #rewritten if anything changed, including removed sheets
+    if(changed_sheets or (set(old['sheets']) != set(manifest['sheets']))):
+        if(fields_cache._cache_dir is None):
+            with fields_cache._cache_at(cache_dir):
+                for xs in sb:
+                    with prof.stage('fields', xs.sheet):
+                        xs.fields
+        with prof.stage('results_export'):
+            sb.results_export(**kw)
+        with prof.stage('ROW_edge_export'):
+            sb.ROW_edge_export(**kw)
+    #plot only the sheets and groups that changed
+    for sh in changed_sheets:
+        with prof.stage('plot_max_fields', sh):
+            fig, ax_E, ax_B = fields_plots.plot_max_fields(sb[sh], **kw)
+            fields_plots.close(fig)
+    if(changed_groups):
+        #group names are stored as strings in the manifest
+        groups = [t for t in sb.tags if(str(t) in changed_groups)]
+        kw['groups'] = groups
+        with prof.stage('plot_groups'):
+            fields_plots.plot_groups(sb, **kw)
+        with prof.stage('plot_groups_at_ROW'):
+            fields_plots.plot_groups_at_ROW(sb, **kw)
+    print('%d of %d sheets and %d of %d groups changed since the last run'
+            % (len(changed_sheets), len(sb), len(changed_groups),
+                len(manifest['groups'])))
+    #save the manifest
+    with open(manifest_path, 'w') as ofile:
+        json.dump(manifest, ofile, indent=1, sort_keys=True)
+    return(sb)
+
+def _run_manifest(sb, **kw):
+    """Generate a dictionary of hashes identifying the outputs of run() for each sheet and each tag group in a SectionBook
+    args:
+        sb - SectionBook
+    kw:
+        see run()
+    returns:
+        manifest - dict with 'options', 'sheets', and 'groups' keys"""
+    #options that change the appearance of every plot
+    options = dict([(k, repr(kw[k])) for k in ['format', 'xmax', 'xs_order']
+            if(k in kw)])
+    #sheet hashes cover the results and everything written on their plots
+    sheets = {}
     for xs in sb:
-        fig, ax_E, ax_B = fields_plots.plot_max_fields(xs, **kw)
-        fields_plots.close(fig)
-    #export group comparison line plots
-    fields_plots.plot_groups(sb, **kw)
-    #export group ROW comparison bar plots
-    fields_plots.plot_groups_at_ROW(sb, **kw)
+        h = hashlib.sha1(fields_cache._key(xs))
+        for v in [xs.sheet, xs.title, xs.tag]:
+            h.update(repr(v))
+        sheets[xs.sheet] = h.hexdigest()
+    #group hashes cover the hashes of their sheets, in order
+    groups = {}
+    for xss in sb.tag_groups:
+        h = hashlib.sha1(repr(xss[0].tag))
+        for xs in xss:
+            h.update(sheets[xs.sheet])
+        groups[str(xss[0].tag)] = h.hexdigest()
+    return({'options': options, 'sheets': sheets, 'groups': groups})
+
+def _read_manifest(manifest_path):
+    """Read a manifest written by a previous incremental run, returning an empty manifest if there isn't one or it can't be read"""
+    empty = {'options': None, 'sheets': {}, 'groups': {}}
+    if(not os.path.isfile(manifest_path)):
+        return(empty)
+    try:
+        with open(manifest_path, 'r') as ifile:
+            manifest = json.load(ifile)
+    except(IOError, ValueError):
+        return(empty)
+    if(set(manifest) != set(empty)):
+        return(empty)
+    return(manifest)
+
+def _watch(template_path, **kw):
+    """Run a template incrementally, then rerun it every time the template file is modified until interrupted with Ctrl-C. Errors in a rerun (like a half-edited template) are printed without ending the watch.
+    args:
+        template_path - path to cross section template excel workbook
+    kw:
+        see run()
+    returns:
+        sb - the SectionBook from the latest successful run"""
+    kw['watch'] = False
+    kw['incremental'] = True
+    interval = 1.
+    if('interval' in kw):
+        interval = float(kw['interval'])
+    sb, mtime = None, None
+    print('watching "%s" for changes, press Ctrl-C to stop' % template_path)
+    try:
+        while(True):
+            try:
+                new_mtime = os.path.getmtime(template_path)
+            except(OSError):
+                new_mtime = mtime
+            if(new_mtime != mtime):
+                mtime = new_mtime
+                try:
+                    sb = run(template_path, **kw)
+                except(KeyError, ValueError, IOError,
+                        fields_class.EMFError) as e:
+                    print('run failed: %s' % str(e))
+            time.sleep(interval)
+    except(KeyboardInterrupt):
+        pass
     return(sb)
 
 def load_template(file_path, **kw):
-    """Import conductor data from an excel template, loading each conductor into a Conductor object, each Conductor into a CrossSection object, and each CrossSection object into a SectionBook object. The SectionBook object is returned.
+    """Import conductor data from a template, loading each conductor into a Conductor object, each Conductor into a CrossSection object, and each CrossSection object into a SectionBook object. The SectionBook object is returned.
+
+    Templates are usually excel workbooks, but the equivalent text formats written by SectionBook.template_export() are also accepted, based on the file extension. JSON (.json) and CSV (.csv) templates are much faster to load and are easy to compare in version control.
+
+    Parsed excel workbooks are cached in a '.emf_cache' directory next to the workbook, in the json template format. The cached template is loaded instead of the workbook until the workbook's size and modification time change, or its contents change if it's only been touched.
     args:
         template_path - string, path to cross section template excel
-                        workbook
+                        workbook, or to a .json or .csv template
     kw:
         sheets - list of strings, a list of sheet names to load, default is
-                all sheets"""
-    #import the cross sections as a dictionary of pandas DataFrames, also
-    #getting a list of the ordered sheets
-    file_path = _check_extension(file_path, 'xlsx', """Templates must be excel workbooks. The input target path "%s" is not recognized as an excel file""" % file_path)
-    xl = pd.ExcelFile(file_path)
-    sheets = xl.sheet_names
-    frames = xl.parse(sheetname = None, skiprows = [0,1,2,3],
-            parse_cols = 16, header = None)
-    #remove necessary sheets if the 'sheets' keyword is passed in
+                all sheets
+        cache - bool, if False, excel workbooks are always parsed and no
+                cache file is written, default is True"""
+    #text templates
+    ext = os.path.splitext(file_path)[1].lower()
+    if(ext in ['.json', '.csv']):
+        if(not os.path.isfile(file_path)):
+            raise(fields_class.EMFError("""The file path "%s" is not recognized as an existing file.""" % file_path))
+        if(ext == '.json'):
+            return(_load_template_json(file_path, **kw))
+        return(_load_template_csv(file_path, **kw))
+    #excel templates, which are cached
+    file_path = _check_extension(file_path, 'xlsx', """Templates must be excel workbooks, .json files, or .csv files. The input target path "%s" is not recognized as any of them""" % file_path)
+    if(('cache' in kw) and (not kw['cache'])):
+        return(_load_template_xlsx(file_path, **kw))
+    stamp = fields_cache._template_stamp(file_path, kw.get('sheets'))
+    sections = fields_cache._load_template(file_path, stamp)
+    if(sections is not None):
+        #the cached sections were already filtered by the 'sheets' keyword
+        return(_text_sections(file_path, sections))
+    sb = _load_template_xlsx(file_path, **kw)
+    fields_cache._store_template(file_path, stamp, _text_template(sb))
+    return(sb)
+
+def _is_template(file_path):
+    """Check whether a file looks like a template that load_template reads, without loading it, so that batch processing can skip the other workbooks and text files in a directory, like the results exported by emf. Excel templates are recognized by the column headers of template sheets, json templates by their "sections" list, and csv templates by their columns.
+    args:
+        file_path - string, path to the file
+    returns:
+        bool, True if the file is a template"""
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if(ext == '.xlsx'):
+            sheets, strings = _xlsx_contents(file_path)
+            return(('Hot Wire Tag' in strings) and ('Ground Wire Tag' in strings))
+        elif(ext == '.json'):
+            with open(file_path, 'r') as ifile:
+                d = json.load(ifile)
+            return(isinstance(d, dict) and ('sections' in d))
+        elif(ext == '.csv'):
+            with open(file_path, 'r') as ifile:
+                header = next(csv.reader(ifile), [])
+            return(all([c in header for c in _text_csv_columns]))
+    #unreadable files, like workbooks that are being written, aren't
+    #templates
+    except(IOError, OSError, ValueError, KeyError, zipfile.BadZipfile):
+        pass
+    return(False)
+
+def _template_name(file_path):
+    """Name a SectionBook after its template file, without extensions"""
+    name = os.path.basename(file_path)
+    if('.' in name):
+        name = name[:name.index('.')]
+    return(name)
+
+def _template_sheets(names, **kw):
+    """Filter a list of sheet names with the 'sheets' keyword of load_template, if passed"""
     if('sheets' in kw):
         include = kw['sheets']
-        sheets = [sh for sh in sheets if sh in include]
-    #create a SectionBook object to store the CrossSection objects
-    basename = os.path.basename(file_path)
-    if('.' in basename):
-        name = basename[:basename.index('.')]
+        names = [sh for sh in names if sh in include]
+    return(names)
+
+def _template_section(sheet, tag, title, misc, titles):
+    """Create a CrossSection with the information applicable to the whole cross section, checking for duplicate titles
+    args:
+        sheet - string, sheet name of the new CrossSection
+        tag - CrossSection tag
+        title - CrossSection title
+        misc - list of soil_resistivity, max_dist, step, sample_height,
+               lROW, and rROW
+        titles - set of titles already used, which receives the new one
+    returns:
+        xs - CrossSection object"""
+    xs = fields_class.CrossSection(sheet)
+    xs.tag = tag
+    xs.title = str(title)
+    #check for duplicate title inputs
+    if(xs.title in titles):
+        raise(fields_class.EMFError("""Cross-sections should have unique title entries. title: "%s" in sheet: "%s" is used by at least one other sheet.""" % (xs.title, sheet)))
     else:
-        name = basename
-    sb = fields_class.SectionBook(name)
-    #convert the dataframes into a list of CrossSection objects
-    titles = []
+        titles.add(xs.title)
+    (xs.soil_resistivity, xs.max_dist, xs.step, xs.sample_height, xs.lROW,
+            xs.rROW) = misc
+    return(xs)
+
+def _load_template_xlsx(file_path, **kw):
+    """Read a SectionBook from an excel template workbook, see load_template"""
+    #open the workbook, getting a list of the ordered sheets
+    book = xlrd.open_workbook(file_path)
+    #remove necessary sheets if the 'sheets' keyword is passed in
+    sheets = _template_sheets(book.sheet_names(), **kw)
+    #create a SectionBook object to store the CrossSection objects
+    sb = fields_class.SectionBook(_template_name(file_path))
+    #convert the template sheets into a list of CrossSection objects, only
+    #reading the sheets that are loaded
+    titles = set()
+    xss = []
     for k in sheets:
+        cols = _template_columns(book.sheet_by_name(k))
         #load miscellaneous information applicable to the whole CrossSection
-        df = frames[k]
-        xs = fields_class.CrossSection(k)
-        misc = df[1].values
-        xs.tag = misc[0]
-        xs.title = str(misc[1])
-        #check for duplicate title inputs
-        if(xs.title in titles):
-            raise(fields_class.EMFError("""Cross-sections should have unique title entries. title: "%s" in sheet: "%s" is used by at least one other sheet.""" % (xs.title, k)))
-        else:
-            titles.append(xs.title)
-        xs.soil_resistivity = misc[3]
-        xs.max_dist = misc[4]
-        xs.step = misc[5]
-        xs.sample_height = misc[6]
-        xs.lROW = misc[7]
-        xs.rROW = misc[8]
+        misc = cols[1]
+        xs = _template_section(k, misc[0], misc[1], misc[3:9], titles)
         #load hot conductors
-        tags, x, y = [], [], []
-        for i in range(df[3].dropna().shape[0]):
-            #initialize a Conductor
-            cond = fields_class.Conductor(df[2].iat[i])
-            #check for conductors with identical tags (names/labels)
-            if(cond.tag in tags):
-                raise(fields_class.EMFError("""Conductors in a Cross Section must have unique tags. The conductor tag "%s" in sheet:     "%s" is used at least twice."""
-                % (cond.tag, k)))
-            else:
-                tags.append(cond.tag)
-            #cond.freq = misc[2]
-            cond.x = df[3].iat[i]
-            cond.y = df[4].iat[i]
-            #check for conductors with identical x,y coordinates
-            if(cond.x in x):
-                idx = x.index(cond.x)
-                if(cond.y == y[idx]):
-                    raise(fields_class.EMFError("""Conductors cannot have identical x,y coordinates. Conductor "%s" is in the exact same place as conductor "%s"."""
-                % (cond.tag, tags[idx])))
-            else:
-                x.append(cond.x)
-                y.append(cond.y)
-            cond.subconds = df.iat[i,5]
-            cond.d_cond = df.iat[i,6]
-            cond.d_bund = df.iat[i,7]
-            cond.V = df.iat[i,8]
-            cond.I = df.iat[i,9]
-            cond.phase = df.iat[i,10]
-            xs.add_conductor(cond)
-        #load grounded conductors
-        tags, x, y = [], [], []
-        for i in range(df[12].dropna().shape[0]):
-            #initialize a Conductor
-            cond = fields_class.Conductor(df.iat[i,11])
-            #check for conductors with identical tags (names/labels)
-            if(cond.tag in tags):
-                raise(fields_class.EMFError("""Conductors in a Cross Section must have unique tags. The conductor tag "%s" in sheet: "%s" is used at least twice."""
-                % (cond.tag, k)))
-            else:
-                tags.append(cond.tag)
-            #cond.freq = misc[2]
-            cond.x = df.iat[i,12]
-            cond.y = df.iat[i,13]
-            #check for conductors with identical x,y coordinates
-            if(cond.x in x):
-                idx = x.index(cond.x)
-                if(cond.y == y[idx]):
-                    raise(fields_class.EMFError("""Conductors cannot have identical x,y coordinates. Conductor "%s" is in the exact same place as conductor "%s"."""
-                % (cond.tag, tags[idx])))
-            else:
-                x.append(cond.x)
-                y.append(cond.y)
-            cond.subconds = 1.
-            cond.d_cond = df.iat[i,14]
-            cond.d_bund = df.iat[i,14]
-            cond.V = 0.
-            cond.I = df.iat[i,15]
-            cond.phase = df.iat[i,16]
-            xs.add_conductor(cond)
-        #add the CrossSection object to the SectionBook
-        #fields automatically updated upon addition to SectionBook
-        sb.add_section(xs)
+        n = _count_entries(cols[3])
+        params = _template_params(k, cols[3:11], n, ['x', 'y', 'subconds',
+            'd_cond', 'd_bund', 'V', 'I', 'phase'])
+        hot = _template_conductors(k, cols[2][:n], params)
+        #load grounded conductors, which have a single diameter and no
+        #subconductors or voltage
+        n = _count_entries(cols[12])
+        x, y, d, I, phase = _template_params(k, cols[12:17], n, ['x', 'y',
+            'd_cond', 'I', 'phase'])
+        params = [x, y, [1]*n, d, d, [0.]*n, I, phase]
+        gnd = _template_conductors(k, cols[11][:n], params)
+        #add all the conductors at once
+        xs._add_new_conductors(hot + gnd)
+        xss.append(xs)
+    #add the CrossSection objects to the SectionBook
+    sb._add_new_sections(xss)
     #return the SectionBook object
     return(sb)
 
+#CrossSection information in text templates, in the order of _template_section
+_text_section_keys = ['soil_resistivity', 'max_dist', 'step', 'sample_height',
+        'lROW', 'rROW']
+#Conductor parameters in text templates, in the order of _template_params
+_text_conductor_keys = ['x', 'y', 'subconds', 'd_cond', 'd_bund', 'V', 'I',
+        'phase']
+#columns of csv templates, with a row for each Conductor
+_text_csv_columns = (['sheet', 'tag', 'title'] + _text_section_keys +
+        ['conductor'] + _text_conductor_keys)
+
+def _text_conductor_params(sheet, conds):
+    """Convert the Conductor parameters of a text template section to lists, filling in the values that are optional for grounded conductors (1 subconductor, a bundle diameter equal to the conductor diameter, and no voltage) and checking them in bulk
+    args:
+        sheet - string, sheet name for error messages
+        conds - list of dicts of Conductor parameters, with missing values
+                absent or nan
+    returns:
+        params - see _template_params"""
+    cols = []
+    for k in _text_conductor_keys:
+        col = [c.get(k, np.nan) for c in conds]
+        cols.append(col)
+    for i, c in enumerate(conds):
+        for k, default in [('subconds', 1), ('d_bund', cols[3][i]),
+                ('V', 0.)]:
+            j = _text_conductor_keys.index(k)
+            if(_is_blank(cols[j][i])):
+                cols[j][i] = default
+    params = _template_params(sheet, cols, len(conds), _text_conductor_keys)
+    for p, k in zip(params, _text_conductor_keys):
+        if(np.any(np.isnan(p))):
+            raise(fields_class.EMFError("""Conductor property '%s' is missing for at least one conductor in sheet: \"%s\"""" % (k, sheet)))
+    return(params)
+
+def _text_sections(file_path, sections, **kw):
+    """Build a SectionBook from the cross sections of a text template
+    args:
+        file_path - string, path of the template file
+        sections - list of dicts with 'sheet', 'tag', and 'title' keys, the
+                   keys in _text_section_keys, and a 'conductors' key
+                   storing a list of dicts with a 'tag' key and the keys in
+                   _text_conductor_keys
+    returns:
+        sb - SectionBook"""
+    sb = fields_class.SectionBook(_template_name(file_path))
+    include = set(_template_sheets([s['sheet'] for s in sections], **kw))
+    titles = set()
+    xss = []
+    for s in sections:
+        k = s['sheet']
+        if(k not in include):
+            continue
+        xs = _template_section(k, s.get('tag'), s.get('title', ''),
+                [s.get(i, np.nan) for i in _text_section_keys], titles)
+        conds = s.get('conductors', [])
+        params = _text_conductor_params(k, conds)
+        xs._add_new_conductors(_template_conductors(k,
+                [c.get('tag') for c in conds], params))
+        xss.append(xs)
+    sb._add_new_sections(xss)
+    return(sb)
+
+def _load_template_json(file_path, **kw):
+    """Read a SectionBook from a json template, see load_template and SectionBook.template_export"""
+    with open(file_path, 'r') as ifile:
+        try:
+            d = json.load(ifile)
+        except(ValueError) as e:
+            raise(fields_class.EMFError("""The json template "%s" could not be read: %s""" % (file_path, str(e))))
+    if((not isinstance(d, dict)) or ('sections' not in d)):
+        raise(fields_class.EMFError("""json templates must contain an object with a "sections" list. "%s" does not.""" % file_path))
+    return(_text_sections(file_path, d['sections'], **kw))
+
+def _load_template_csv(file_path, **kw):
+    """Read a SectionBook from a csv template, see load_template and SectionBook.template_export"""
+    #read floats exactly, as they were written, and read the text columns
+    #as strings so that a column of mixed tags doesn't change them
+    text = ['sheet', 'tag', 'title', 'conductor']
+    df = pd.read_csv(file_path, float_precision='round_trip',
+            dtype=dict([(c, str) for c in text]))
+    missing = [c for c in _text_csv_columns if c not in df.columns]
+    if(missing):
+        raise(fields_class.EMFError("""csv templates must have the columns: %s. "%s" is missing: %s""" % (', '.join(_text_csv_columns), file_path, ', '.join(missing))))
+    #numeric tags are numbers, like they are in excel templates
+    for c in ['tag', 'conductor']:
+        df[c] = [_csv_number(v) for v in df[c]]
+    #rows with the same sheet are conductors of the same cross section, in
+    #order of appearance, and the cross section information is taken from
+    #their first row
+    sections = []
+    idx = dict()
+    cols = [df[c].tolist() for c in _text_csv_columns]
+    for row in zip(*cols):
+        row = dict(zip(_text_csv_columns, row))
+        sheet = row['sheet']
+        if(sheet not in idx):
+            idx[sheet] = len(sections)
+            s = dict([(k, row[k]) for k in ['sheet', 'tag', 'title'] +
+                _text_section_keys])
+            s['conductors'] = []
+            sections.append(s)
+        s = sections[idx[sheet]]
+        #a row without a conductor tag is a cross section without conductors
+        tag = row['conductor']
+        if(not _is_blank(tag)):
+            c = dict([(k, row[k]) for k in _text_conductor_keys])
+            c['tag'] = tag
+            s['conductors'].append(c)
+    return(_text_sections(file_path, sections, **kw))
+
+def _template_columns(sheet):
+    """Read the 17 template columns of an xlrd sheet below the four header rows, converting cells the same way pandas.read_excel does (blank cells to nan, whole numbers to int unless they share a column with other floats) and skipping blank rows
+    args:
+        sheet - xlrd Sheet object
+    returns:
+        cols - list of 17 lists, one for each column"""
+    ncols = min(17, sheet.ncols)
+    rows = []
+    for i in range(4, sheet.nrows):
+        types = sheet.row_types(i, 0, ncols)
+        values = sheet.row_values(i, 0, ncols)
+        row = [np.nan]*17
+        blank = True
+        for j in range(ncols):
+            t = types[j]
+            if(t == xlrd.XL_CELL_NUMBER):
+                v = values[j]
+                row[j] = int(v) if(v == int(v)) else v
+            elif(t == xlrd.XL_CELL_TEXT):
+                row[j] = values[j]
+            elif(t == xlrd.XL_CELL_BOOLEAN):
+                row[j] = bool(values[j])
+            else:
+                continue
+            blank = False
+        if(not blank):
+            rows.append(row)
+    if(not rows):
+        return([[] for i in range(17)])
+    cols = [list(c) for c in zip(*rows)]
+    #like pandas, columns of only numbers (and blanks) are all floats unless
+    #they're all whole numbers
+    for j in range(17):
+        c = cols[j]
+        if(all([type(v) in (int, float) for v in c]) and
+                any([type(v) is float for v in c])):
+            cols[j] = [float(v) for v in c]
+    return(cols)
+
+def _text_template(sb):
+    """Convert a SectionBook to the list of section dicts stored in text templates, see _text_sections"""
+    sections = []
+    for xs in sb:
+        s = {'sheet': xs.sheet, 'tag': xs.tag, 'title': xs.title}
+        for k in _text_section_keys:
+            s[k] = getattr(xs, k)
+        s['conductors'] = []
+        for c in xs:
+            d = dict([(k, getattr(c, k)) for k in _text_conductor_keys])
+            d['tag'] = c.tag
+            s['conductors'].append(d)
+        sections.append(s)
+    return(sections)
+
+def _write_template_json(sb, file_path):
+    """Write a SectionBook to a json template, see SectionBook.template_export"""
+    with open(file_path, 'w') as ofile:
+        json.dump({'sections': _text_template(sb)}, ofile, indent=1,
+                sort_keys=True)
+
+def _write_template_csv(sb, file_path):
+    """Write a SectionBook to a csv template, see SectionBook.template_export"""
+    rows = []
+    for s in _text_template(sb):
+        conds = s.pop('conductors')
+        if(not conds):
+            conds = [{}]
+        for c in conds:
+            row = dict(s)
+            row.update(c)
+            if('tag' in c):
+                row['conductor'] = c['tag']
+                row['tag'] = s['tag']
+            rows.append([_csv_str(row.get(k)) for k in _text_csv_columns])
+    with open(file_path, 'wb') as ofile:
+        w = csv.writer(ofile, lineterminator='\n')
+        w.writerow(_text_csv_columns)
+        w.writerows(rows)
+
+def _csv_number(v):
+    """Convert a numeric string from a csv template to an int or float, leaving other strings alone"""
+    if(isinstance(v, str) and _is_number(v)):
+        v = float(v)
+        if(v == int(v)):
+            v = int(v)
+    return(v)
+
+def _csv_str(v):
+    """Format a csv template entry, writing floats exactly and blanks as empty strings"""
+    if((v is None) or _is_blank(v)):
+        return('')
+    if(isinstance(v, float)):
+        return(repr(v))
+    return(v)
+
+def _is_blank(v):
+    """Check whether a template entry is blank (nan)"""
+    return(isinstance(v, float) and np.isnan(v))
+
+def _count_entries(col):
+    """Count the cells in a template column that aren't blank"""
+    return(sum([1 for v in col if not _is_blank(v)]))
+
+def _template_params(sheet, cols, n, props):
+    """Convert the first n entries of template columns of Conductor parameters to lists of floats, checking them all at once
+    args:
+        sheet - string, sheet name for error messages
+        cols - list of template columns
+        n - int, number of Conductors
+        props - list of Conductor property names for each column
+    returns:
+        params - list of lists of floats, one for each column"""
+    params = []
+    for col, prop in zip(cols, props):
+        v = col[:n]
+        try:
+            a = np.array(v, dtype=float)
+        except(ValueError, TypeError):
+            bad = [i for i in v if not _is_number(i)][0]
+            raise(fields_class.EMFError("""Conductor property '%s' must be numeric. It cannot be set to: %s (sheet: "%s")""" % (prop, repr(bad), sheet)))
+        if(any([(i is True) or (i is False) for i in v])):
+            raise(fields_class.EMFError("""Conductor property '%s' must be numeric. It cannot be set to a boolean (sheet: "%s")""" % (prop, sheet)))
+        if((prop == 'subconds') and np.any(a != np.floor(a))):
+            bad = v[np.flatnonzero(a != np.floor(a))[0]]
+            raise(fields_class.EMFError("""Conductor property 'subconds' must be an integer. It cannot be set to: %s (sheet: "%s")""" % (repr(bad), sheet)))
+        params.append(a.tolist())
+    return(params)
+
+def _template_conductors(sheet, tags, params):
+    """Create Conductor objects from a block of template entries, checking for duplicate tags and coordinates with hashing
+    args:
+        sheet - string, sheet name for error messages
+        tags - list of Conductor tags
+        params - list of lists of Conductor parameters, in the order x, y,
+                 subconds, d_cond, d_bund, V, I, phase (see _template_params)
+    returns:
+        conds - list of Conductor objects"""
+    conds = []
+    seen_tags = set()
+    seen_xy = dict()
+    for tag, x, y, subconds, d_cond, d_bund, V, I, phase in zip(tags, *params):
+        #initialize a Conductor
+        cond = fields_class.Conductor(tag)
+        #check for conductors with identical tags (names/labels)
+        if(tag in seen_tags):
+            raise(fields_class.EMFError("""Conductors in a Cross Section must have unique tags. The conductor tag "%s" in sheet: "%s" is used at least twice."""
+            % (tag, sheet)))
+        seen_tags.add(tag)
+        #check for conductors with identical x,y coordinates
+        if((x, y) in seen_xy):
+            raise(fields_class.EMFError("""Conductors cannot have identical x,y coordinates. Conductor "%s" is in the exact same place as conductor "%s"."""
+            % (tag, seen_xy[(x, y)])))
+        seen_xy[(x, y)] = tag
+        #parameters were checked in bulk, so skip the property setters
+        cond._x, cond._y = x, y
+        cond._subconds = int(subconds)
+        cond._d_cond, cond._d_bund = d_cond, d_bund
+        cond._V, cond._I, cond._phase = V, I, phase
+        conds.append(cond)
+    return(conds)
+
+#bump this when the layout of saved SectionBooks changes
+_BOOK_VERSION = 1
+
+def _save_book(sb, file_path):
+    """Write a SectionBook to an .npz file, see SectionBook.save. The file contains:
+        meta - json (as bytes) with the SectionBook name, the CrossSection
+               information and Conductor tags for each CrossSection, and
+               the results columns
+        conductors - 2D array of Conductor parameters for all CrossSections,
+                     with a row for each Conductor and columns in the order
+                     of _text_conductor_keys
+        n_conductors - number of Conductors in each CrossSection
+        x - sample points of all CrossSections with results
+        results - 2D array of results for all CrossSections, with a row for
+                  each sample point
+        n_results - number of sample points in each CrossSection, zero for
+                    CrossSections without results"""
+    sections, conds, n_conds, x, results, n_results = [], [], [], [], [], []
+    columns = None
+    for xs in sb:
+        s = {'sheet': xs.sheet, 'tag': xs.tag, 'title': xs.title,
+                'conductors': [c.tag for c in xs]}
+        for k in _text_section_keys:
+            s[k] = getattr(xs, k)
+        sections.append(s)
+        conds += [[getattr(c, k) for k in _text_conductor_keys] for c in xs]
+        n_conds.append(len(xs.conds))
+        #only store results that have already been calculated
+        if(xs._fields is None):
+            n_results.append(0)
+        else:
+            df = xs._fields
+            if(columns is None):
+                columns = [str(c) for c in df.columns]
+            x.append(df.index.values.astype(float))
+            results.append(df[columns].values.astype(float))
+            n_results.append(len(df))
+    meta = json.dumps({'version': _BOOK_VERSION, 'name': sb.name,
+        'sections': sections, 'columns': columns})
+    ncols = len(columns) if columns else 0
+    np.savez(file_path,
+            meta=np.frombuffer(meta.encode('utf-8'), dtype=np.uint8),
+            conductors=np.array(conds, dtype=float).reshape(-1,
+                len(_text_conductor_keys)),
+            n_conductors=np.array(n_conds, dtype=np.int64),
+            x=np.concatenate(x) if x else np.zeros((0,)),
+            results=np.vstack(results) if results else np.zeros((0, ncols)),
+            n_results=np.array(n_results, dtype=np.int64))
+
+def load_book(file_path, **kw):
+    """Load a SectionBook saved with SectionBook.save(), along with any results it was saved with
+    args:
+        file_path - string, path to the saved .npz file
+    kw:
+        mmap - bool, if True, results are memory-mapped from the file
+               instead of read into memory, so that they're only read from
+               disk when they're used. Memory-mapped results are read-only.
+               Default is False.
+    returns:
+        sb - SectionBook"""
+    file_path = _check_extension(file_path, 'npz', """SectionBooks are saved to .npz files. The input target path "%s" is not recognized as an .npz file""" % file_path)
+    a = _npz_load(file_path, ('mmap' in kw) and kw['mmap'])
+    meta = json.loads(np.asarray(a['meta']).tostring().decode('utf-8'))
+    if(meta.get('version') != _BOOK_VERSION):
+        raise(fields_class.EMFError("""The SectionBook in "%s" was saved in an unsupported format""" % file_path))
+    #cumulative row counts locating each CrossSection's rows
+    ic = np.concatenate(([0], np.cumsum(a['n_conductors']))).tolist()
+    ir = np.concatenate(([0], np.cumsum(a['n_results']))).tolist()
+    #all the Conductor parameters, as columns of lists
+    params = np.asarray(a['conductors']).T.tolist()
+    if(meta['columns'] is not None):
+        columns = pd.Index(meta['columns'])
+    results, x = a['results'], a['x']
+    sb = fields_class.SectionBook(meta['name'])
+    xss = []
+    for i, s in enumerate(meta['sections']):
+        xs = fields_class.CrossSection(s['sheet'])
+        xs._tag, xs._title = s['tag'], s['title']
+        xs.soil_resistivity = s['soil_resistivity']
+        for k in _text_section_keys[1:]:
+            setattr(xs, '_' + k, s[k])
+        #the Conductors were checked when the SectionBook was built, so
+        #they're added without any checks
+        for j, tag in enumerate(s['conductors']):
+            cond = fields_class.Conductor(tag)
+            (cond._x, cond._y, cond._subconds, cond._d_cond, cond._d_bund,
+                    cond._V, cond._I, cond._phase) = [p[ic[i] + j]
+                            for p in params]
+            cond._subconds = int(cond._subconds)
+            cond._xs = xs
+            xs._tag2idx[tag] = j
+            xs._conds.append(cond)
+        #results are views of the loaded or memory-mapped arrays
+        if(ir[i+1] > ir[i]):
+            xs._fields = pd.DataFrame(results[ir[i]:ir[i+1]],
+                    index=pd.Float64Index(x[ir[i]:ir[i+1]], copy=False),
+                    columns=columns, copy=False)
+        xss.append(xs)
+    sb._add_new_sections(xss)
+    return(sb)
+
+#names of the comparison frames in the order they're returned and saved
+_DAT_comparison_names = ['FIELDS_DAT_results', 'python_results',
+        'Absolute Difference', 'Percent Difference']
+
+def _DAT_rounding(a, **kw):
+    """Round an array of results like FIELDS does for DAT comparisons, with the 'round' or 'truncate' keywords of CrossSection.compare_DAT
+    args:
+        a - array of results
+    returns:
+        a - the input array or a rounded copy of it"""
+    if(('round' in kw) and ('truncate' in kw)):
+        raise(fields_class.EMFError("""Cannot both round and truncate for DAT comparison. Choose either rounding or truncation."""))
+    elif('round' in kw):
+        return(np.round(a, kw['round']))
+    elif(('truncate' in kw) and kw['truncate']):
+        #FIELDS prints results to the thousandths digit
+        return(np.round(a, 3))
+    return(a)
+
+def _DAT_align(f, df):
+    """Match a CrossSection's results to DAT results at the sample distances they share, which FIELDS prints to the hundredths, instead of relying on both being sampled identically (CrossSections also sample at their ROW edges, which may be missing in a DAT)
+    args:
+        f - DataFrame of CrossSection results (CrossSection.fields)
+        df - DataFrame of DAT results, from FIELDS_io.read_DAT
+    returns:
+        index - shared sample distances, from f's index
+        calc - 2D array of f's results at the shared distances
+        DAT - 2D array of df's results at the shared distances, in the
+              column order of f"""
+    xf = np.round(f.index.values.astype(float), 2)
+    xd = np.round(df.index.values.astype(float), 2)
+    common, i, j = np.intersect1d(xf, xd, return_indices=True)
+    return(f.index[i], f.values[i], df[f.columns].values[j])
+
+def _DAT_differences(DAT, calc):
+    """Compute the absolute and percent differences between DAT results and a CrossSection's results
+    args:
+        DAT - 2D array of DAT results
+        calc - 2D array of CrossSection results, in the same layout
+    returns:
+        arrays - list of DAT, calc, and their absolute and percent
+                 differences, in the order of _DAT_comparison_names"""
+    diff = calc - DAT
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = 100*diff/calc
+    return([DAT, calc, diff, pct])
+
+def _DAT_comparison(index, columns, arrays):
+    """Build the comparison frames returned by CrossSection.compare_DAT
+    args:
+        index - sample distances
+        columns - field columns
+        arrays - list of 2D arrays from _DAT_differences
+    returns:
+        comp - dict mapping the names in _DAT_comparison_names to
+               DataFrames"""
+    return(dict([(k, pd.DataFrame(a, index=index, columns=columns,
+        copy=False)) for k, a in zip(_DAT_comparison_names, arrays)]))
+
+def compare_DATs(sb, DAT_dir, **kw):
+    """Compare the results of every CrossSection in a SectionBook to the FIELDS output file (.DAT) with the same name in a directory, like CrossSection.compare_DAT, but stacking all the results into single arrays so that the differences are computed in one pass. DAT files are matched to CrossSection sheets without regard to case, because FIELDS capitalizes them. Results are compared at the sample distances shared by each CrossSection and its DAT file. CrossSections without a DAT file, or without any sample distances in common with it, are reported and skipped.
+    args:
+        sb - SectionBook object
+        DAT_dir - string, directory of FIELDS output files
+    kw:
+        round - int, round results to a certain number of digits, see
+                CrossSection.compare_DAT
+        truncate - bool, round results to the thousandths digit like FIELDS
+        save - bool, toggle saving a summary of the comparisons to excel
+        path - string, destination of the saved summary, forces saving
+    returns:
+        comps - dict mapping CrossSection sheets to dicts of comparison
+                DataFrames, like the ones returned by
+                CrossSection.compare_DAT
+        summary - DataFrame indexed by sheet with the largest absolute and
+                  percent differences of each field"""
+    if(not os.path.isdir(DAT_dir)):
+        raise(fields_class.EMFError("""The DAT directory "%s" is not recognized as an existing directory.""" % DAT_dir))
+    DATs = dict([(os.path.splitext(fn)[0].upper(), os.path.join(DAT_dir, fn))
+        for fn in os.listdir(DAT_dir) if(fn[-4:].upper() == '.DAT')])
+    #read the DATs and pair their results with the CrossSections'
+    xss, indices, DAT, calc = [], [], [], []
+    for xs in sb:
+        k = str(xs.sheet).upper()
+        if(k not in DATs):
+            print('No DAT file for CrossSection "%s" in: %s' % (xs.sheet, DAT_dir))
+            continue
+        f = xs.fields
+        columns = f.columns
+        index, c, d = _DAT_align(f, FIELDS_io.read_DAT(DATs[k]))
+        if(not len(index)):
+            print('The DAT file "%s" and CrossSection "%s" share no sample distances, skipping it' % (DATs[k], xs.sheet))
+            continue
+        xss.append(xs)
+        indices.append(index)
+        DAT.append(d)
+        calc.append(c)
+    if(not xss):
+        raise(fields_class.EMFError("""No CrossSections in SectionBook "%s" could be matched to DAT files in: %s""" % (sb.name, DAT_dir)))
+    #compare everything at once
+    n = np.array([len(index) for index in indices])
+    DAT, calc = np.vstack(DAT), _DAT_rounding(np.vstack(calc), **kw)
+    arrays = _DAT_differences(DAT, calc)
+    #split the stacked comparisons into views for each CrossSection
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    comps = dict()
+    for xs, index, i, m in zip(xss, indices, starts, n):
+        comps[xs.sheet] = _DAT_comparison(index, columns,
+                [a[i:i+m] for a in arrays])
+    #largest differences of each CrossSection
+    summary = []
+    for a, label in [(arrays[2], 'max abs diff'), (arrays[3], 'max pct diff')]:
+        a = np.abs(a)
+        a[~np.isfinite(a)] = np.nan
+        summary.append(pd.DataFrame(_reduce_max(a, starts),
+            index=[xs.sheet for xs in xss],
+            columns=['%s %s' % (c, label) for c in columns]))
+    summary = pd.concat(summary, axis=1)
+    #write the summary
+    if('path' in kw):
+        kw['save'] = True
+    if(('save' in kw) and kw['save']):
+        fn = _path_manage(sb.name + '-DAT_comparisons', 'xlsx', **kw)
+        with _ExcelStream(fn) as xl:
+            xl.write(summary, 'summary', index_label='sheet')
+        print('DAT comparison summary saved to: "%s"' % fn)
+    return(comps, summary)
+
+def _reduce_max(a, starts):
+    """Find the largest entries in blocks of rows of a 2D array, ignoring nans
+    args:
+        a - 2D array
+        starts - 1D int array, index of the first row of each block
+    returns:
+        m - 2D array with a row for each block"""
+    a = np.where(np.isnan(a), -np.inf, a)
+    m = np.maximum.reduceat(a, starts, axis=0)
+    m[np.isneginf(m)] = np.nan
+    return(m)
+
 def optimize_phasing(xs, circuits, **kw):
     """Permute the phasing of non-grounded conductors and find the arrangement that results in the lowest fields at the left and right edge of the ROW. The number of hot conductors must be a multiple of three. The phases of consecutive groups of three conductors are swapped around, assuming that those groups represent a single three-phase transfer circuit.
     args:
@@ -292,16 +1007,15 @@ def optimize_phasing(xs, circuits, **kw):
     if('save' in kw):
         if(kw['save']):
             fn = _path_manage(fn + '_phase_optimization', 'xlsx', **kw)
-            xl = pd.ExcelWriter(fn, engine='xlsxwriter')
-            results.to_excel(xl, index_label='Conductor Tag',
-                sheet_name='phase_assignments')
-            opt.ROW_edge_export(xl=xl)
-            df, c, h = _xs_sb_diff(xs, opt)
-            df.to_excel(xl, sheet_name='ROW_edge_diff', index=False,
-                    columns=c, header=h)
-            for xs in opt:
-                xs.fields.to_excel(xl, sheet_name=xs.sheet)
-            xl.save()
+            with _ExcelStream(fn) as xl:
+                xl.write(results, 'phase_assignments',
+                        index_label='Conductor Tag')
+                opt.ROW_edge_export(xl=xl)
+                df, c, h = _xs_sb_diff(xs, opt)
+                xl.write(df, 'ROW_edge_diff', index=False, columns=c,
+                        header=h)
+                for xs in opt:
+                    xl.write(xs.fields, xs.sheet)
             print('Phase optimization results written to: %s' % fn)
 
     return(results, opt)
@@ -400,22 +1114,20 @@ def target_fields(xs, tags, B_l, B_r, E_l, E_r, **kw):
     if('save' in kw):
         if(kw['save']):
             fn = _path_manage(fn + '_height_adjustments', 'xlsx', **kw)
-            xl = pd.ExcelWriter(fn, engine='xlsxwriter')
-            pd.DataFrame(data={'Height Addition (ft)': list(h)},
-                    index=sheets).to_excel(xl, sheet_name='Adjustments')
-            pd.DataFrame(dict(zip(['Height - '+s+' (ft)' for s in adj.sheets],
-                    [[adj[s][j].y for j in tags] for s in adj.sheets])),
-                    index=tags).to_excel(xl,
-                            sheet_name='Adjusted Conductor Heights',
-                            index_label='Conductor Tag')
-            adj.ROW_edge_export(xl = xl)
-            df, c, h = _xs_sb_diff(xs, adj)
-            df.to_excel(xl, sheet_name='ROW_edge_diff', index=False,
-                    columns=c, header=h)
-            for xs in adj:
-                xs.fields.to_excel(xl, sheet_name=xs.sheet,
-                        index_label='Distance (ft)')
-            xl.save()
+            with _ExcelStream(fn) as xl:
+                xl.write(pd.DataFrame(data={'Height Addition (ft)': list(h)},
+                        index=sheets), 'Adjustments')
+                xl.write(pd.DataFrame(dict(zip(
+                        ['Height - '+s+' (ft)' for s in adj.sheets],
+                        [[adj[s][j].y for j in tags] for s in adj.sheets])),
+                        index=tags), 'Adjusted Conductor Heights',
+                        index_label='Conductor Tag')
+                adj.ROW_edge_export(xl = xl)
+                df, c, h = _xs_sb_diff(xs, adj)
+                xl.write(df, 'ROW_edge_diff', index=False, columns=c,
+                        header=h)
+                for xs in adj:
+                    xl.write(xs.fields, xs.sheet, index_label='Distance (ft)')
             print('Optimal phasing results written to: %s' % fn)
 
     return(h, adj)
@@ -423,7 +1135,7 @@ def target_fields(xs, tags, B_l, B_r, E_l, E_r, **kw):
 def _bisect(xs, conds, x_sample, funk, target, hlow, hhigh, max_iter, rel_err):
     #get sample x and y arrays with a single element in each
     x_sample = np.array([x_sample], dtype=float)
-    y_sample = xs.sample_height*np.ones((2,), dtype=float)
+    y_sample = xs.sample_height*np.ones((1,), dtype=float)
     #evaluate at the bracketing values
     flow = funk(hlow, target, xs, conds, x_sample, y_sample)
     fhigh = funk(hhigh, target, xs, conds, x_sample, y_sample)
@@ -4,18 +4,21 @@ from ..emf_plots import _save_fig, _prepare_fig
 
 import fields_funks
 
-#rcparams for more static global formatting changes
-mpl.rcParams['figure.facecolor'] = 'white'
-mpl.rcParams['figure.figsize'] = (14, 6)
-mpl.rcParams['font.family'] = 'Times New Roman'
-mpl.rcParams['text.color'] = (.2, .2, .2)
-mpl.rcParams['axes.labelcolor'] = (.2, .2, .2)
-mpl.rcParams['axes.titlesize'] = 16
-mpl.rcParams['axes.labelsize'] = 14
-mpl.rcParams['legend.fontsize'] = 6
-mpl.rcParams['legend.borderaxespad'] = 0 #mpl default is None
-mpl.rcParams['xtick.color'] = (.2, .2, .2)
-mpl.rcParams['ytick.color'] = (.2, .2, .2)
+#rcparams for more static global formatting changes, applied when matplotlib
+#is first imported
+_rcParams = {
+    'figure.facecolor': 'white',
+    'figure.figsize': (14, 6),
+    'font.family': 'Times New Roman',
+    'text.color': (.2, .2, .2),
+    'axes.labelcolor': (.2, .2, .2),
+    'axes.titlesize': 16,
+    'axes.labelsize': 14,
+    'legend.fontsize': 6,
+    'legend.borderaxespad': 0, #mpl default is None
+    'xtick.color': (.2, .2, .2),
+    'ytick.color': (.2, .2, .2)}
+mpl.on_import(lambda m: m.rcParams.update(_rcParams))
 
 #other more specific/dynamic global formatting variables
 _B_color = 'darkgreen'
@@ -416,39 +419,41 @@ def plot_xs(xs, **kw):
     #return
     return(fig, ax)
 
-def _plot_DAT_repeatables(ax_abs, ax_per, ax_mag, pan, field, unit, **kw):
+def _plot_DAT_repeatables(ax_abs, ax_per, ax_mag, comp, field, unit, **kw):
     """Handle plotting of DAT comparison features that don't require unique strings
     args:
         ax_abs - axis of absolute error plot
         ax_per - axis of percentage error plot
         ax_mag - axis of field magnitude plot
-        pan - pandas.Panel object containing results and errors
+        comp - dict of DataFrames containing results and errors, from
+                CrossSection.compare_DAT
         field - string, column label of field to be plotted (Bmax/Emax)"""
 
     #plot absolute error
-    h_abs = ax_abs.plot(pan['Absolute Difference'][field],
+    h_abs = ax_abs.plot(comp['Absolute Difference'][field],
             color=mpl.rcParams['axes.labelcolor'], zorder=-2)
     ax_abs.set_ylabel('Absolute Difference' + unit)
     #plot percentage error
-    h_per = ax_per.plot(pan['Percent Difference'][field],
+    h_per = ax_per.plot(comp['Percent Difference'][field],
             color='firebrick', zorder=-1)
     ax_per.set_ylabel('Percent Difference', color='firebrick')
     #set error axes legend
     ax_per.legend(h_abs + h_per, ['Absolute Difference','Percent Difference'])
     ax_per.get_legend().set_zorder(1)
     #plot full results profiles
-    kw['H'] += [ax_mag.plot(pan['FIELDS_DAT_results'][field],
+    kw['H'] += [ax_mag.plot(comp['FIELDS_DAT_results'][field],
                     color=_colormap[1])[0],
-                ax_mag.plot(pan['python_results'][field],
+                ax_mag.plot(comp['python_results'][field],
                     color=_colormap[0])[0]]
     kw['L'] += ['FIELDS', 'New Code']
     ax_mag.set_xlabel('Distance from ROW Center $(ft)$')
 
-def _plot_DAT_comparison(xs, pan, **kw):
+def _plot_DAT_comparison(xs, comp, **kw):
     """Generate 2 subplots showing the FIELDS results (from a .DAT file) compared to the results of this code and the error.
     args:
         xs - CrossSection object
-        pan - pandas.Panel object containing results and errors
+        comp - dict of DataFrames containing results and errors, from
+                CrossSection.compare_DAT
     kw:
         save - bool, toggle plot saving
         path - string, destination/filename for saved figure
@@ -462,8 +467,8 @@ def _plot_DAT_comparison(xs, pan, **kw):
     #Bmax
     #init handles and labels lists for legend
     kw['H'], kw['L'] = [], []
-    _plot_DAT_repeatables(ax_abs, ax_per, ax_mag, pan, 'Bmax', '$(mG)$', **kw)
-    _plot_wires(ax_mag, xs.hot, xs.gnd, pan['python_results']['Bmax'], **kw)
+    _plot_DAT_repeatables(ax_abs, ax_per, ax_mag, comp, 'Bmax', '$(mG)$', **kw)
+    _plot_wires(ax_mag, xs.hot, xs.gnd, comp['python_results']['Bmax'], **kw)
     _check_und_conds([xs], [ax_mag], **kw)
     ax_abs.set_title('Absolute and Percent Difference, Max Magnetic Field')
     ax_mag.set_ylabel('Bmax $(mG)$')
@@ -483,8 +488,8 @@ def _plot_DAT_comparison(xs, pan, **kw):
     #Emax
     #init handles and labels lists for legend
     kw['H'], kw['L'] = [], []
-    _plot_DAT_repeatables(ax_abs, ax_per, ax_mag, pan, 'Emax', '$(kV/m)$', **kw)
-    _plot_wires(ax_mag, xs.hot, xs.gnd, pan['python_results']['Emax'], **kw)
+    _plot_DAT_repeatables(ax_abs, ax_per, ax_mag, comp, 'Emax', '$(kV/m)$', **kw)
+    _plot_wires(ax_mag, xs.hot, xs.gnd, comp['python_results']['Emax'], **kw)
     _check_und_conds([xs], [ax_mag], **kw)
     ax_abs.set_title('Absolute and Percent Difference, Max Electric Field')
     ax_mag.set_ylabel('Emax $(kV/m)$')
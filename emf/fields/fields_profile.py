@@ -0,0 +1,227 @@
+"""The fields_profile module measures where the time and memory of emf.fields workflows go. The Profiler class records the wall time and memory use of named stages, and emf.fields.run() fills one in for its template loading, calculations, exports, and plots when it's passed the 'profile' keyword (profile=True or an existing Profiler).
+
+The module also keeps opt-in counters in the field calculation functions, tallying calls, sample points, conductors, cache hits and misses, and time spent. The counters are off until enable_stats() is called. stats() returns them as a DataFrame, reset_stats() zeroes them, and disable_stats() turns them off again."""
+
+from .. import os, time, inspect, functools, np, pd
+
+from ..emf_funks import _path_manage
+
+#tracemalloc measures the memory allocated during each stage but isn't
+#available before Python 3.4, in which case the peak resident memory of the
+#whole process is recorded instead (also unavailable on Windows)
+try:
+    import tracemalloc
+except(ImportError):
+    tracemalloc = None
+try:
+    import resource
+except(ImportError):
+    resource = None
+
+class Profiler(object):
+    """Opt-in recorder of wall time and memory use for the stages of a workflow, like the template loading, field calculations, exporting, and plotting performed by emf.fields.run(). Pass a Profiler to run() through the 'profile' keyword (or pass profile=True to have one created) and each stage is recorded, with field calculations and single CrossSection plots recorded separately for each sheet. Stages are timed with the Profiler.stage() context manager, which can also wrap any other code:
+
+        prof = Profiler()
+        with prof.stage('my stage', sheet='32P'):
+            ...
+
+    The records are available as a DataFrame through the 'frame' property and can be written to a csv with Profiler.export() for regression tracking.
+
+    Memory is measured with tracemalloc when it's available, as the peak memory allocated during each stage (bytes). Otherwise the peak resident memory of the whole process at the end of each stage is recorded, which only grows and is much coarser."""
+
+    def __init__(self, name='run'):
+        """
+        args:
+            name - string, used to name the exported csv file"""
+        self.name = name
+        self._records = []
+
+    def _get_frame(self):
+        return(pd.DataFrame(self._records,
+            columns=['stage', 'sheet', 'seconds', 'peak_bytes']))
+    frame = property(_get_frame, None, None, """DataFrame with a row for each recorded stage and columns 'stage', 'sheet' (None for stages not associated with a single sheet), 'seconds' (wall time), and 'peak_bytes' (see the Profiler class docstring)""")
+
+    def _get_totals(self):
+        df = self.frame
+        return(df.groupby('stage', sort=False).agg(
+            {'seconds': 'sum', 'peak_bytes': 'max'}))
+    totals = property(_get_totals, None, None, """DataFrame indexed by stage name with the total wall time and the largest memory peak of each stage, summing over sheets""")
+
+    def stage(self, name, sheet=None):
+        """Return a context manager that records the wall time and memory use of the code it wraps
+        args:
+            name - string, name of the stage
+            sheet - optional, sheet of the CrossSection the stage applies to"""
+        return(_Stage(self, name, sheet))
+
+    def reset(self):
+        """Discard all recorded stages"""
+        self._records = []
+
+    def export(self, **kw):
+        """Write the recorded stages to a csv file
+        kw:
+            path - string, destination/filename for saved file"""
+        fn = _path_manage(self.name + '-profile', 'csv', **kw)
+        self.frame.to_csv(fn, index=False)
+        print('Profiling results written to: %s' % fn)
+
+class _Stage(object):
+    """Context manager used by Profiler.stage()"""
+
+    def __init__(self, prof, name, sheet):
+        self._prof = prof
+        self._name = name
+        self._sheet = sheet
+
+    def __enter__(self):
+        self._stop_tracing = False
+        if(tracemalloc is not None):
+            if(not tracemalloc.is_tracing()):
+                tracemalloc.start()
+                self._stop_tracing = True
+            if(hasattr(tracemalloc, 'reset_peak')):
+                tracemalloc.reset_peak()
+            self._mem0 = tracemalloc.get_traced_memory()[0]
+        self._t0 = time.time()
+        return(self)
+
+    def __exit__(self, *args):
+        t = time.time() - self._t0
+        if(tracemalloc is not None):
+            peak = tracemalloc.get_traced_memory()[1] - self._mem0
+            if(self._stop_tracing):
+                tracemalloc.stop()
+        elif(resource is not None):
+            #ru_maxrss is in kilobytes on Linux and bytes on OS X
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if(not (os.uname()[0] == 'Darwin')):
+                peak *= 1024
+        else:
+            peak = None
+        self._prof._records.append((self._name, self._sheet, t, peak))
+
+class _NullStage(object):
+    """Context manager that does nothing, used when profiling is off"""
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        pass
+
+class _NullProfiler(object):
+    """Stand in for a Profiler when profiling is off"""
+
+    def stage(self, name, sheet=None):
+        return(_NullStage())
+
+#-------------------------------------------------------------------------------
+#COUNTERS FOR THE FIELD KERNELS
+
+#counters are off until enable_stats() is called
+_stats_on = False
+#counter names in the order they're reported and the counted quantities
+_stats_names = ['E_field', 'B_field', 'phasors_to_magnitudes',
+        '_calculate_fields', 'kernels']
+_stats_columns = ['calls', 'points', 'conductors', 'hits', 'misses',
+        'seconds']
+#counted quantities that don't apply to a counter, reported as NaN
+_stats_skipped = {'phasors_to_magnitudes': ['conductors']}
+_stats = dict()
+
+def enable_stats():
+    """Turn on the counters in the field calculation functions. See stats()."""
+    global _stats_on
+    _stats_on = True
+
+def disable_stats():
+    """Turn off the counters in the field calculation functions, leaving the counts in place. See stats()."""
+    global _stats_on
+    _stats_on = False
+
+def reset_stats():
+    """Set all the counters in the field calculation functions to zero. See stats()."""
+    for name in _stats_names:
+        _stats[name] = dict([(c, 0) for c in _stats_columns])
+        _stats[name]['seconds'] = 0.
+        for c in _stats_skipped.get(name, []):
+            _stats[name][c] = np.nan
+
+def stats():
+    """Return a DataFrame of counts accumulated in the field calculation functions since the counters were last reset, while they were enabled with enable_stats(). The rows are:
+        E_field - electric field evaluations, by emf.fields.E_field or by
+                  CrossSection calculations (which apply shared kernels
+                  instead of calling E_field)
+        B_field - magnetic field evaluations, by emf.fields.B_field or by
+                  CrossSection calculations
+        phasors_to_magnitudes - emf.fields.phasors_to_magnitudes calls,
+                                without a conductor count
+        _calculate_fields - CrossSection result calculations, where 'hits'
+                            and 'misses' count lookups in the on-disk result
+                            cache (see enable_cache)
+        kernels - evaluations of the geometry-dependent parts of
+                  CrossSection calculations, where 'hits' count kernels
+                  shared between CrossSections with identical geometry in
+                  a SectionBook
+    The columns are:
+        calls - number of calls/evaluations
+        points - total number of sample points processed
+        conductors - total number of conductors processed
+        hits - cache hits
+        misses - cache misses
+        seconds - cumulative wall time"""
+    return(pd.DataFrame([[_stats[n][c] for c in _stats_columns]
+        for n in _stats_names], index=_stats_names, columns=_stats_columns))
+
+def _counted(name, sizes):
+    """Decorator adding counters to a field calculation function
+    args:
+        name - string, counter name (in _stats_names)
+        sizes - function accepting a dict of the decorated function's
+                arguments by name, however they were passed, and returning
+                the number of sample points and the number of conductors
+                processed (None if conductors aren't counted)
+    returns:
+        decorator"""
+    def decorator(f):
+        @functools.wraps(f)
+        def counted(*args, **kw):
+            if(not _stats_on):
+                return(f(*args, **kw))
+            t0 = time.time()
+            r = f(*args, **kw)
+            t = time.time() - t0
+            points, conductors = sizes(inspect.getcallargs(f, *args, **kw))
+            _credit(name, t, points, conductors)
+            return(r)
+        return(counted)
+    return(decorator)
+
+def _credit(name, seconds, points, conductors):
+    """Count an evaluation, for code that does the work of a counted function without calling it
+    args:
+        name - string, counter name (in _stats_names)
+        seconds - float, wall time of the evaluation
+        points - int, number of sample points processed
+        conductors - int, number of conductors processed, or None"""
+    if(_stats_on):
+        s = _stats[name]
+        s['seconds'] += seconds
+        s['calls'] += 1
+        s['points'] += points
+        if(conductors is not None):
+            s['conductors'] += conductors
+
+def _tally(name, hit):
+    """Count a cache hit or miss
+    args:
+        name - string, counter name (in _stats_names)
+        hit - bool, True for a hit and False for a miss"""
+    if(_stats_on):
+        if(hit):
+            _stats[name]['hits'] += 1
+        else:
+            _stats[name]['misses'] += 1
+
+reset_stats()
@@ -11,6 +11,9 @@ emf.subcalc is currently similar to the original versions of emf.fields because
 
     - interpolate the grid (at points, along lines, or complete resampling)
 
+    - add the fields of separate SUBCALC runs from their phasors, with
+      scaling and phase rotation for different loading scenarios
+
 It would be nice to build the calculations into emf.subcalc and totally replace SUBCALC, but that hasn't been done yet.
 """
 
@@ -20,7 +23,8 @@ from subcalc_class import (Model,
 from subcalc_funks import (drop_footprint_template,
 						read_REF,
                         load_model,
-                        convert_REF)
+                        convert_REF,
+                        superpose)
 
 from subcalc_plots import (plot_contour,
                         plot_pcolormesh,
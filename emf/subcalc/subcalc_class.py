@@ -1,6 +1,7 @@
-from .. import np, pd, os, copy, _interpn
+from .. import np, pd, os, copy
 
 from ..emf_class import EMFError
+from ..emf_funks import _ExcelStream
 
 import subcalc_funks
 
@@ -11,7 +12,7 @@ class Model(object):
 
     Footprints of objects in the Model domain like buildings, the power lines, fences, etc. can also be stored in Model objects. Data for these objects must be saved in csv template files. The path of the footprint csv files can be passed to subcalc.load_model for automatic inclusion in a newly generated Model object or it can be passed to an existing Model with Model.load_footprints. The footprint data is stored in Footprint objects that have very little functionality and are mostly just organizational objects.
 
-    Several methods are available for interpolating new values from the grid of field results: Model.interp, Model.resample, and Model.cross_section.
+    Several methods are available for interpolating new values from the grid of field results: Model.interp, Model.resample, Model.cross_section, and Model.cross_sections. They interpolate bilinearly by default and bicubically when passed method='cubic'.
 
     Contour plots of the results can be automatically generated with subcalc.plot_contour(Model) and colormesh plots can be automatically generated with subcalc.plot_pcolormesh(Model)."""
 
@@ -25,12 +26,21 @@ class Model(object):
                 info - dict, optional, dictionary of model metadata
             or:
                 data - dict, dictionary with X, Y, and B grids, should be
-                            keyed by 'X','Y','Bmax','Bres','Bx','By','Bz'
+                            keyed by 'X','Y','Bmax','Bres','Bx','By','Bz',
+                            and optionally the phasor components
+                            'Bx_real','Bx_imag','By_real','By_imag',
+                            'Bz_real','Bz_imag'. 1D arrays of the grid's
+                            column and row coordinates can be passed with
+                            the keys 'x' and 'y' instead of 2D 'X' and 'Y'
+                            grids.
                 info - dict, optional, dictionary of model metadata
         kw:
             Bkey - str, selects which component of field results to use
                     or defines which component is passed as grid arrays
-                    ('Bmax', 'Bres', 'Bx', 'By', 'Bz')."""
+                    ('Bmax', 'Bres', 'Bx', 'By', 'Bz').
+            dtype - numpy data type to store the field grids in, like
+                    'float32' to halve their memory, default is to keep
+                    the type of the grids passed in"""
 
         largs = len(args)
         if(largs <= 2):
@@ -38,13 +48,14 @@ class Model(object):
             if(type(args[0]) is not dict):
                 raise(EMFError("""The first argument to Model() must be a dictionary of model result information when passing 1 or 2 arguments to initialize the Model, not %s""" % type(args[0])))
             #check keys
-            s = set(['X','Y','Bmax','Bres','Bx','By','Bz'])
+            s = set(['X','Y','x','y'] + subcalc_funks._REF_magnitudes
+                    + subcalc_funks._REF_phasors)
             if(any([(i not in s) for i in args[0].keys()])):
                 print args[0].keys()
                 raise(EMFError("""If passing a dictionary to initialize a Model object, the dict must have the following keys only:
                     %s""" % str(s)))
             #store data
-            self._grid = args[0]
+            self._set_grid(args[0])
             #deal with Bkey
             if('Bkey' in kw):
                 self.Bkey = kw['Bkey']
@@ -59,7 +70,7 @@ class Model(object):
                 self._info = None
         elif(largs <= 4):
             #check input types
-            mgs = """If passing three or four arguments to initialize a Model, the first three arguments must be 2D numpy arrays representing X, Y, and B grids respectively, each with the same shape."""
+            msg = """If passing three or four arguments to initialize a Model, the first three arguments must be 2D numpy arrays representing X, Y, and B grids respectively, each with the same shape."""
             for i in range(3):
                 if(type(args[i]) is not np.ndarray):
                     raise(EMFError(msg))
@@ -72,7 +83,7 @@ class Model(object):
                 self._Bkey = kw['Bkey']
             else:
                 self._Bkey = 'unknown'
-            self._grid = {'X': args[0], 'Y': args[1], self._Bkey: args[2]}
+            self._set_grid({'X': args[0], 'Y': args[1], self._Bkey: args[2]})
             #store the info dict if present
             if(largs == 4):
                 if(type(args[3]) is not dict):
@@ -81,6 +92,10 @@ class Model(object):
             else:
                 self._info = None
 
+        #convert the grids if another precision is called for
+        if('dtype' in kw):
+            self.dtype = kw['dtype']
+
         #other reference objects in the model, like substation boundaries,
         #stored in a list of Footprint objects
         self.footprint_df = None #DataFrame of Footprint information
@@ -89,26 +104,75 @@ class Model(object):
         #   where 0 degrees is the positive y axis and clockwise is increasing
         self._north_angle = None
 
+    def _set_grid(self, data):
+        """Store the 1D axes of the reference grid, its extents, and the component grids, from a dict with either 1D 'x' and 'y' axes or 2D 'X' and 'Y' grids. The axes and grids are stored as read-only views, because the interpolators built from them (see Model._interpolator) would go stale if they were edited in place. Arrays passed in are referenced, not copied, so they shouldn't be edited afterward either."""
+        data = dict(data)
+        if(('x' in data) and ('y' in data)):
+            x, y = data.pop('x'), data.pop('y')
+            data.pop('X', None)
+            data.pop('Y', None)
+        elif(('X' in data) and ('Y' in data)):
+            x, y = subcalc_funks._grid_axes(data.pop('X'), data.pop('Y'))
+        else:
+            raise(EMFError("""
+            The reference grid of a Model must be passed with 'X' and 'Y'
+            grids or with 'x' and 'y' axes."""))
+        self._x = subcalc_funks._read_only(np.asarray(x, dtype=float))
+        self._y = subcalc_funks._read_only(np.asarray(y, dtype=float))
+        shape = (len(self._y), len(self._x))
+        for k in data:
+            if(np.shape(data[k]) != shape):
+                raise(EMFError("""
+            The '%s' grid has shape %s, but the reference grid has %d rows
+            (y values) and %d columns (x values).""" % (k,
+                str(np.shape(data[k])), shape[0], shape[1])))
+            data[k] = subcalc_funks._read_only(data[k])
+        self._grid = data
+        #interpolators of the grids, built as they're needed
+        self._interpolators = dict()
+        #the extents are used in every bounds check, so they're stored
+        self._extents = (float(self._x.min()), float(self._x.max()),
+                float(self._y.min()), float(self._y.max()))
+
     #---------------------------------------------------------------------------
     #properties
     def _get_B(self):
         return(self._grid[self._Bkey])
-    B = property(_get_B, None, None, '2D grid of magnetic field results')
+    B = property(_get_B, None, None, """2D grid of magnetic field results, a read-only array. To change the results, build a new Model from new grids.""")
 
     def _get_Bkey(self):
         return(self._Bkey)
     def _set_Bkey(self, value):
-        if((not (value in self._grid)) or (value == 'X') or (value == 'Y')):
-            k = self._grid.keys()
-            k.remove('X')
-            k.remove('Y')
+        if(value not in self._grid):
             raise(EMFError("""
             Bkey must be set to one of the following elements:
-                %s""" % str(k)))
+                %s""" % str(self._grid.keys())))
         else:
             self._Bkey = value
     Bkey = property(_get_Bkey, _set_Bkey, None, 'Component of magnetic field accessed by the B property')
 
+    def _get_dtype(self):
+        return(self.B.dtype)
+    def _set_dtype(self, value):
+        value = np.dtype(value)
+        for k in self._grid:
+            self._grid[k] = subcalc_funks._read_only(
+                    np.asarray(self._grid[k], dtype=value))
+        #the interpolators reference the old grids
+        self._interpolators = dict()
+    dtype = property(_get_dtype, _set_dtype, None, """Numpy data type of the stored field grids. Setting it converts every grid, so setting it to 'float32' halves the memory used by the Model's results. The coordinates of the reference grid are always stored in double precision.""")
+
+    def _get_phasors(self):
+        try:
+            return(dict([(k, self._grid[k + '_real'] + 1j*self._grid[k + '_imag'])
+                for k in ['Bx', 'By', 'Bz']]))
+        except(KeyError):
+            raise(EMFError("""
+            The Model doesn't store phasor components. Load them from a REF
+            file with subcalc.load_model(..., components=['phasors']) or
+            include them in the 'components' list."""))
+    phasors = property(_get_phasors, None, None, """Dict of complex 2D grids of the phasors of the 'Bx', 'By', and 'Bz' field components, available if the phasor components were loaded. See subcalc.superpose for adding the fields of Models.""")
+
     def _get_info(self): return(self._info)
     info = property(_get_info, None, None, 'Dictionary of model metadata')
 
@@ -116,35 +180,36 @@ class Model(object):
     footprints = property(_get_footprints, None, None, 'List of Footprint objects')
 
     def _get_X(self):
-        return(self._grid['X'])
-    X = property(_get_X, None, None, '2D grid of reference grid x coordinates')
+        return(np.broadcast_to(self._x, (len(self._y), len(self._x))))
+    X = property(_get_X, None, None, """2D grid of reference grid x coordinates, a read-only view of the 1D x coordinates that takes no memory of its own""")
 
     def _get_Y(self):
-        return(self._grid['Y'])
-    Y = property(_get_Y, None, None, '2D grid of reference grid y coordinates')
+        return(np.broadcast_to(self._y[:,np.newaxis],
+                (len(self._y), len(self._x))))
+    Y = property(_get_Y, None, None, """2D grid of reference grid y coordinates, a read-only view of the 1D y coordinates that takes no memory of its own""")
 
     def _get_x(self):
-        return(self.X[0,:])
+        return(self._x)
     x = property(_get_x, None, None, 'Unique x values in model grid (column positions)')
 
     def _get_y(self):
-        return(self.Y[:,0])
+        return(self._y)
     y = property(_get_y, None, None, 'Unique y values in model grid (row positions)')
 
     def _get_xmax(self):
-        return(np.max(self.x))
+        return(self._extents[1])
     xmax = property(_get_xmax, None, None, 'Maximum horizontal coordinate in model')
 
     def _get_xmin(self):
-        return(np.min(self.x))
+        return(self._extents[0])
     xmin = property(_get_xmin, None, None, 'Minimum horizontal coordinate in model')
 
     def _get_ymax(self):
-        return(np.max(self.y))
+        return(self._extents[3])
     ymax = property(_get_ymax, None, None, 'Maximum vertical coordinate in model')
 
     def _get_ymin(self):
-        return(np.min(self.y))
+        return(self._extents[2])
     ymin = property(_get_ymin, None, None, 'Minimum vertical coordinate in model')
 
     def _get_north_angle(self):
@@ -231,67 +296,131 @@ class Model(object):
             p2 - iterable, an x-y pair
         kw:
             n - integer, number of points sampled (default 1000)
+            method - string, 'linear' (default) for bilinear interpolation
+                     or 'cubic' for bicubic interpolation, see Model.interp
         returns:
             x - array, x coordinates of interpolated values
             y - array, y coordinates of interpolated values
             B_interp - array, interpolated field values"""
+        x, y, B_interp = self.cross_sections([(p1, p2)], **kw)
+        return(x[0], y[0], B_interp[0])
+
+    def cross_sections(self, lines, **kw):
+        """Interpolate the field along many lines at once, each between two points, like a set of transects through the Model
+        args:
+            lines - iterable of point pairs, like [(p1, p2), (p3, p4)],
+                    where each point is an x-y pair
+        kw:
+            n - integer, number of points sampled along each line
+                (default 1000)
+            method - string, 'linear' (default) for bilinear interpolation
+                     or 'cubic' for bicubic interpolation, see Model.interp
+        returns:
+            x - 2D array, x coordinates of interpolated values, with a row
+                for each line
+            y - 2D array, y coordinates of interpolated values, with a row
+                for each line
+            B_interp - 2D array, interpolated field values, with a row for
+                       each line"""
         #check point lengths
-        if((len(p1) != 2) or (len(p2) != 2)):
+        lines = [(p1, p2) for p1, p2 in lines]
+        if(any([(len(p1) != 2) or (len(p2) != 2) for p1, p2 in lines])):
             raise(EMFError('Points must consist of two values (xy pairs).'))
         #check kw
         if('n' in kw):
             n = kw['n']
         else:
             n = 1000
-        #create x and y vectors
-        x, y = np.linspace(p1[0], p2[0], n), np.linspace(p1[1], p2[1], n)
-        B_interp = self.interp(x, y)
+        #create x and y coordinates for all the lines
+        p1 = np.array([p[0] for p in lines], dtype=float).reshape(-1, 2)
+        p2 = np.array([p[1] for p in lines], dtype=float).reshape(-1, 2)
+        s = np.linspace(0, 1, n)
+        x = p1[:,0,np.newaxis] + np.outer(p2[:,0] - p1[:,0], s)
+        y = p1[:,1,np.newaxis] + np.outer(p2[:,1] - p1[:,1], s)
+        #make the end points exact, like np.linspace
+        x[:,-1], y[:,-1] = p2[:,0], p2[:,1]
+        self._check_in_grid(x, y)
+        B_interp = self._interpolator(**kw)(x.ravel(), y.ravel()).reshape(
+                x.shape)
         return(x, y, B_interp)
 
-    def interp(self, x, y):
-        """Interpolate in the x and y directions to find an estimated B value at an x,y location within the model
+    def interp(self, x, y, **kw):
+        """Interpolate in the x and y directions to find estimated B values at x,y locations within the model. All the points are located in the grid and interpolated at once.
+
+        Bilinear interpolation can't exceed the grid values around a point, so it under-reports peaks between grid points, like those near conductors. Bicubic interpolation follows the curvature of the field instead and passes smoothly through the grid values. The coefficients of the cubic polynomial in each grid cell are computed the first time the method is used for a Bkey and kept, after which interpolating costs about the same as bilinear interpolation, but the coefficients take 16 times the memory of the grid.
         args:
             x - iterable or scalar, x coordinate(s) to interpolate at
             y - iterable or scalar, y coordinate(s) to interpolate at
+        kw:
+            method - string, 'linear' (default) for bilinear interpolation
+                     or 'cubic' for bicubic interpolation
         return:
             B_interp - array or float, the interpolated field value"""
         #make x,y iterable if scalars are passed in
         if(not (hasattr(x, '__len__') and hasattr(y, '__len__'))):
             scalar = True
-            x = np.array([x], dtype=float)
-            y = np.array([y], dtype=float)
         else:
             scalar = False
-        #check that all points are in the grid
-        if(not all([self.in_grid(x[i],y[i]) for i in range(len(x))])):
+        x = np.atleast_1d(np.asarray(x, dtype=float)).ravel()
+        y = np.atleast_1d(np.asarray(y, dtype=float)).ravel()
+        if(len(x) != len(y)):
             raise(EMFError("""
-            x,y coordinates must fall inside the reference grid:
-                range of x coordinates: %g to %g
-                range of y coordinates: %g to %g""" %
-                (self.xmin, self.xmax, self.ymin, self.ymax)))
+            The same number of x and y coordinates must be passed to
+            interpolate at, not %d and %d.""" % (len(x), len(y))))
+        #check that all points are in the grid
+        self._check_in_grid(x, y)
         #interpolate
-        B_interp = np.array([subcalc_funks._bilinear_interp(self, x[i], y[i])
-                                for i in range(len(x))])
+        B_interp = self._interpolator(**kw)(x, y)
         #return
         if(scalar):
             return(B_interp[0])
         else:
             return(B_interp)
 
+    def _check_in_grid(self, x, y):
+        """Raise an error if any x,y coordinates are outside the grid"""
+        if(not self.in_grid(x, y).all()):
+            raise(EMFError("""
+            x,y coordinates must fall inside the reference grid:
+                range of x coordinates: %g to %g
+                range of y coordinates: %g to %g""" %
+                (self.xmin, self.xmax, self.ymin, self.ymax)))
+
+    def _interpolator(self, **kw):
+        """Get the interpolator of the grid accessed by the B property, which is built once for each Bkey and interpolation method. The grids are read-only and the interpolators are discarded whenever the grids are replaced, like when the Model's dtype is changed, so they never go stale.
+        kw:
+            method - string, 'linear' (default) or 'cubic'"""
+        if('method' in kw):
+            method = kw['method']
+        else:
+            method = 'linear'
+        if(method not in _interpolator_classes):
+            raise(EMFError("""
+            The interpolation method must be one of:
+                %s
+            not: '%s'""" % (str(sorted(_interpolator_classes)), method)))
+        k = (self._Bkey, method)
+        f = self._interpolators.get(k)
+        if(f is None):
+            f = _interpolator_classes[method](self._x, self._y, self.B)
+            self._interpolators[k] = f
+        return(f)
+
     def in_grid(self, x, y):
-        """Check if an x,y coordinate pair is inside the Model grid
+        """Check if x,y coordinate pairs are inside the Model grid
         args:
-            x - float, x coordinate
-            y - float, y coordinate
+            x - float or array, x coordinate(s)
+            y - float or array, y coordinate(s)
         returns:
-            b - bool, True if x,y is in the grid, False if it's not"""
-        if((x > self.xmax) or
-            (x < self.xmin) or
-                (y > self.ymax) or
-                    (y < self.ymin)):
-            return(False)
-        else:
-            return(True)
+            b - bool, True if x,y is in the grid, False if it's not, or a
+                bool array if arrays are passed in"""
+        xmin, xmax, ymin, ymax = self._extents
+        #written so that nan coordinates aren't in the grid
+        b = ((np.asarray(x) >= xmin) & (np.asarray(x) <= xmax)
+                & (np.asarray(y) >= ymin) & (np.asarray(y) <= ymax))
+        if(np.ndim(b) == 0):
+            return(bool(b))
+        return(b)
 
     def resample(self, **kw):
         """Resample the model grid along a new number of x,y values, a new selection of x,y values, or a new number of total values
@@ -304,6 +433,8 @@ class Model(object):
                     - overrides x and y kw
                     - preserves approx ratio of number of x and y values
                     - rounds up to nearest possible whole number of points
+            method - string, 'linear' (default) for bilinear interpolation
+                     or 'cubic' for bicubic interpolation, see Model.interp
         returns:
             mod_resample - a new Model object containing the resampled grid"""
         #store grid x,y extents
@@ -334,19 +465,18 @@ class Model(object):
             else:
                 y = self.y
         #flip y coordinates so that Y prints intuitively
-        y = y[::-1]
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)[::-1]
         #resample the grid
         X, Y = np.meshgrid(x, y)
-        #some arrays have to be flipped to conform to conventions of _interpn
-        B_resample = _interpn((self.y[::-1], self.x),
-                                self.B[::-1,:],
-                                (Y[::-1,:], X))
+        self._check_in_grid(X, Y)
+        B_resample = self._interpolator(**kw).grid(x, y)
 
-        #return with re-flipped results
-        mod_resample = Model(X, Y, B_resample[::-1,:],
+        mod_resample = Model(X, Y, B_resample,
                 copy.deepcopy(self.info),
-                Bkey=self.Bkey)
-        mod_resample.load_footprints(self.footprint_df)
+                Bkey=self.Bkey, dtype=self.dtype)
+        if(self.footprint_df is not None):
+            mod_resample.load_footprints(self.footprint_df)
         return(mod_resample)
 
     def flatten(self):
@@ -356,10 +486,9 @@ class Model(object):
             y - 1D numpy array with y coordinates
             b - 1D numpy array with magnetic field values"""
         nrows, ncols = self.B.shape
-        n = nrows*ncols
-        x = np.reshape(self.X, n)
-        y = np.reshape(self.Y, n)
-        b = np.reshape(self.B, n)
+        x = np.tile(self.x, nrows)
+        y = np.repeat(self.y, ncols)
+        b = np.reshape(self.B, nrows*ncols)
         return(x, y, b)
 
     def export(self, **kw):
@@ -369,25 +498,126 @@ class Model(object):
         #get appropriate export filename
         fn = os.path.basename(self.info['REF_path'])
         fn = subcalc_funks._path_manage(fn, '.xlsx', **kw)
-        #create excel writing object
-        xl = pd.ExcelWriter(fn, engine='xlsxwriter')
+        #create excel writing object, which streams rows to the file
+        xl = _ExcelStream(fn)
         #write grid data
         for k in self._grid:
-            if((k != 'X') and (k != 'Y')):
-                pd.DataFrame(self._grid[k], columns=self.x, index=self.y
-                        ).to_excel(xl, sheet_name=k)
+            xl.write(pd.DataFrame(self._grid[k], columns=self.x,
+                    index=self.y), k)
         #write model information if present
         if(self.info is not None):
-            pd.DataFrame([self.info[k] for k in self.info], index=self.info.keys(),
-                    columns=['Parameter Value']).sort_index().to_excel(
-                            xl, sheet_name='info', index_label='Parameter Name')
+            xl.write(pd.DataFrame([self.info[k] for k in self.info],
+                    index=self.info.keys(), columns=['Parameter Value']
+                    ).sort_index(), 'info', index_label='Parameter Name')
         #write footprint DataFrame if present
         if(self.footprint_df is not None):
-            self.footprint_df.to_excel(xl, sheet_name='footprints', index=False)
+            xl.write(self.footprint_df, 'footprints', index=False)
         #save and print
-        xl.save()
+        xl.close()
+        print('model saved to: %s' % fn)
+
+    def save(self, **kw):
+        """Save the Model to a binary .npz file, which subcalc.load_model reads much faster than excel files. The grids are stored uncompressed so that they can be memory-mapped when the file is loaded, along with the info dict and footprints.
+        kw:
+            path - string, output destination/filename for the file"""
+        fn = os.path.basename(self.info['REF_path'])
+        fn = subcalc_funks._path_manage(fn, '.npz', **kw)
+        subcalc_funks._save_model(self, fn)
         print('model saved to: %s' % fn)
 
+class _GridInterpolator(object):
+    """Bilinear interpolator of a 2D grid of field values, with the cell lookups of each grid axis prepared once so that repeated interpolation doesn't rebuild anything. Models keep one for each Bkey (see Model._interpolator)."""
+
+    def __init__(self, x, y, B):
+        """
+        args:
+            x - 1D array, x coordinates of the grid columns
+            y - 1D array, y coordinates of the grid rows
+            B - 2D array, grid values, which are referenced, not copied"""
+        self.B = B
+        self._x, self._xstep = x, subcalc_funks._axis_step(x)
+        self._y, self._ystep = y, subcalc_funks._axis_step(y)
+
+    def __call__(self, x, y):
+        """Interpolate at x,y points inside the grid
+        args:
+            x - 1D array, x coordinates
+            y - 1D array, y coordinates
+        returns:
+            B_interp - 1D array, interpolated values"""
+        i, ty = subcalc_funks._cell_index(self._y, y, self._ystep)
+        j, tx = subcalc_funks._cell_index(self._x, x, self._xstep)
+        B = self.B
+        return((1 - ty)*((1 - tx)*B[i,j] + tx*B[i,j+1])
+                + ty*((1 - tx)*B[i+1,j] + tx*B[i+1,j+1]))
+
+    def grid(self, x, y):
+        """Interpolate over a new grid, locating its rows and columns once instead of at every point
+        args:
+            x - 1D array, x coordinates of the new grid's columns
+            y - 1D array, y coordinates of the new grid's rows
+        returns:
+            B_interp - 2D array, interpolated values with a row for each y
+                       coordinate and a column for each x coordinate"""
+        i, ty = subcalc_funks._cell_index(self._y, y, self._ystep)
+        j, tx = subcalc_funks._cell_index(self._x, x, self._xstep)
+        i, ty = i[:,np.newaxis], ty[:,np.newaxis]
+        B = self.B
+        return((1 - ty)*((1 - tx)*B[i,j] + tx*B[i,j+1])
+                + ty*((1 - tx)*B[i+1,j] + tx*B[i+1,j+1]))
+
+class _BicubicInterpolator(_GridInterpolator):
+    """Bicubic interpolator of a 2D grid of field values. The 16 coefficients of the cubic polynomial in each grid cell are computed once, from the grid values and their first and cross derivatives at the cell corners (estimated with central differences), so that the interpolated surface and its slopes are continuous between cells."""
+
+    #maps the values and derivatives at a cell's ends to the coefficients
+    #of a cubic polynomial along one axis
+    _M = np.array([[1., 0., 0., 0.],
+                   [0., 0., 1., 0.],
+                   [-3., 3., -2., -1.],
+                   [2., -2., 1., 1.]])
+
+    def __init__(self, x, y, B):
+        _GridInterpolator.__init__(self, x, y, B)
+        G = np.asarray(B, dtype=float)
+        #derivatives at the grid points, scaled to the size of each cell
+        Gy, Gx = np.gradient(G, y, x)
+        Gxy = np.gradient(Gy, x, axis=1)
+        hy = np.diff(y)[:,np.newaxis]
+        hx = np.diff(x)[np.newaxis,:]
+        #values and derivatives at the corners of each cell, with the first
+        #two rows/columns holding values and the last two derivatives
+        F = np.empty((len(y) - 1, len(x) - 1, 4, 4))
+        for a, (Ga, sa) in enumerate([(G, 1.), (Gy, hy)]):
+            for b, (Gab, sb) in enumerate([(Ga, 1.), (Gxy if a else Gx, hx)]):
+                F[:,:,2*a,2*b] = Gab[:-1,:-1]*sa*sb
+                F[:,:,2*a,2*b+1] = Gab[:-1,1:]*sa*sb
+                F[:,:,2*a+1,2*b] = Gab[1:,:-1]*sa*sb
+                F[:,:,2*a+1,2*b+1] = Gab[1:,1:]*sa*sb
+        #coefficients of the powers of the fractional position in each cell,
+        #with rows for y and columns for x, in the precision of the grid
+        dtype = B.dtype if(np.issubdtype(B.dtype, np.floating)) else float
+        self._C = np.matmul(np.matmul(self._M, F), self._M.T).astype(dtype)
+
+    def __call__(self, x, y):
+        i, ty = subcalc_funks._cell_index(self._y, y, self._ystep)
+        j, tx = subcalc_funks._cell_index(self._x, x, self._xstep)
+        return(np.einsum('na,nab,nb->n', self._powers(ty), self._C[i,j],
+            self._powers(tx)))
+
+    def grid(self, x, y):
+        i, ty = subcalc_funks._cell_index(self._y, y, self._ystep)
+        j, tx = subcalc_funks._cell_index(self._x, x, self._xstep)
+        return(np.einsum('pa,pqab,qb->pq', self._powers(ty),
+            self._C[i[:,np.newaxis],j], self._powers(tx)))
+
+    def _powers(self, t):
+        """Stack the powers 0 through 3 of fractional positions in cells"""
+        return(np.stack([np.ones_like(t), t, t*t, t*t*t], axis=-1))
+
+#interpolator classes for each interpolation method accepted by Models
+_interpolator_classes = {'linear': _GridInterpolator,
+        'cubic': _BicubicInterpolator}
+
 class Footprint(object):
 
     def __init__(self, name, x, y, power_line, of_concern, draw_as_loop, group):
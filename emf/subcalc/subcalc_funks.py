@@ -1,7 +1,9 @@
-from .. import os, np, pd, shutil
+from .. import (os, io, re, np, pd, copy, json, mmap, shutil, tempfile,
+        zipfile)
 
 from ..emf_funks import (_path_manage, _check_extension, _is_number, _is_int,
-                        _check_intable, _flatten, _sig_figs, _Levenshtein_group)
+                        _check_intable, _flatten, _sig_figs, _Levenshtein_group,
+                        _npz_load, _xlsx_contents)
 
 import subcalc_class
 
@@ -27,58 +29,121 @@ def drop_footprint_template(*args, **kw):
 def load_model(*args, **kw):
     """Read a .REF output file and load the data into a Model object
     args:
-        results_path - string, path to the output .REF file of field results or to
-                the excel file exported by a Model object
+        results_path - string, path to the output .REF file of field results,
+                to the binary .npz file saved by Model.save, or to the
+                excel file exported by a Model object
         footprint_path - string, optional, path to the csv file of
                          footprint data
     kw:
         Bkey - string, sets 'component' of magnetic field results that the
                returned Model object accesses by default
                      - can be 'Bx', 'By', 'Bz', 'Bmax', or 'Bres'
-                     - default is 'Bmax'
+                     - default is 'Bmax', or the first of the 'components'
+                       if 'Bmax' isn't among them
                      - all components are stored, none are lost
+        components - list of field components to load, default is all the
+                     magnitudes ('Bx', 'By', 'Bz', 'Bmax', and 'Bres').
+                     Records of other components in REF files are skipped
+                     without being parsed, so loading a single component is
+                     much faster. The phasor components 'Bx_real',
+                     'Bx_imag', 'By_real', 'By_imag', 'Bz_real', and
+                     'Bz_imag' can also be loaded from REF files, all at
+                     once with 'phasors', for use with Model.phasors and
+                     subcalc.superpose.
+        cache - bool, if False, REF files are always parsed and no cache
+                file is written, default is True. Parsed REF files are
+                cached in binary form in a '.emf_cache' directory next to
+                the REF file, and the cache is loaded instead until the REF
+                file's size or modification time changes.
+        mmap - bool, memory-map the grids of binary Models and cached REF
+               files instead of reading them, so that they're only read
+               from disk as they're used, default is True. Memory-mapped
+               grids are read-only.
+        dtype - numpy data type of the Model's field grids, like
+                'float32' to halve their memory, see Model.dtype. REF
+                files are always parsed and cached in double precision.
     returns
         mod - Model object containing results"""
 
+    #check for a components kwarg
+    if('components' in kw):
+        components = _check_components(kw['components'])
+    else:
+        components = None
+
     #check for a Bkey kwarg
     if('Bkey' in kw):
         Bkey = kw['Bkey']
-    else:
+    elif((components is None) or ('Bmax' in components)):
         Bkey = 'Bmax'
+    else:
+        Bkey = components[0]
+
+    use_mmap = ('mmap' not in kw) or kw['mmap']
 
     #check extensions
     try:
         fn = _check_extension(args[0], '.REF', '')
     except(subcalc_class.EMFError):
-        fn = _check_extension(args[0], '.xlsx', """
-        Can only load Models from .REF or .xlsx files""")
+        try:
+            fn = _check_extension(args[0], '.npz', '')
+        except(subcalc_class.EMFError):
+            fn = _check_extension(args[0], '.xlsx', """
+        Can only load Models from .REF, .npz, or .xlsx files""")
 
 
     if(fn[-3:] == 'REF'):
 
-        #pull data from the REF file
-        data, info = read_REF(args[0])
-        #get the gridded arrays
-        data = _meshgrid(data)
-        #initialize Model object
-        mod = subcalc_class.Model(data, info, Bkey=Bkey)
+        #look for a cached copy of the REF file
+        cache = ('cache' not in kw) or kw['cache']
+        mod = None
+        if(cache):
+            stamp = _REF_stamp(fn)
+            mod = _load_REF_cache(fn, stamp, components or _REF_magnitudes,
+                    Bkey, use_mmap)
+        if(mod is None):
+            #pull data from the REF file
+            if(components is None):
+                data, info = read_REF(fn)
+            else:
+                data, info = read_REF(fn, components=components)
+            #get the gridded arrays, with the row length in the header
+            if('Number X Grid Points' in info):
+                _check_REF_size(data, info, fn)
+                data = _meshgrid(data, int(info['Number X Grid Points']))
+            else:
+                data = _meshgrid(data)
+            #initialize Model object
+            mod = subcalc_class.Model(data, info, Bkey=Bkey)
+            if(cache):
+                _store_REF_cache(fn, stamp, mod)
         #check for footprint file path and load if present
         if(len(args) > 1):
             mod.load_footprints(args[1])
 
+    elif(fn[-3:] == 'npz'):
+        #use the saved Bkey unless another one is called for
+        if(('Bkey' not in kw) and (components is None)):
+            Bkey = None
+        mod = _load_model_npz(fn, components, Bkey, use_mmap)
+        #check for footprint file path if footprints weren't saved
+        if((mod.footprint_df is None) and (len(args) > 1)):
+            mod.load_footprints(args[1])
+
     elif(fn[-4:] == 'xlsx'):
-        #get a dict of all sheets in excel file
-        dfs = pd.read_excel(args[0], sheetname=None)
-        bkeys = dfs.keys()
-        if('info' in bkeys):
-            bkeys.remove('info')
-        if('footprints' in bkeys):
-            bkeys.remove('footprints')
+        #get a dict of the needed sheets in excel file
+        xl = pd.ExcelFile(args[0])
+        names = xl.sheet_names
+        bkeys = [k for k in names if(k not in ['info', 'footprints'])]
+        if(components is not None):
+            _check_stored(components, bkeys, args[0])
+            bkeys = components
+        dfs = dict([(k, xl.parse(k)) for k in names
+            if((k in bkeys) or (k in ['info', 'footprints']))])
         #slice out grid data
         x = [float(i) for i in dfs[bkeys[0]].columns]
         y = [float(i) for i in dfs[bkeys[0]].index]
-        X, Y = np.meshgrid(x, y)
-        data = {'X': X, 'Y': Y}
+        data = {'x': x, 'y': y}
         for k in bkeys:
             data[str(k)] = dfs[k].values
         #slice out info dictionary
@@ -97,11 +162,221 @@ def load_model(*args, **kw):
 
     else:
         raise(subcalc_class.EMFError("""
-        Models must be loaded from .REF file or excel files"""))
+        Models must be loaded from .REF, .npz, or excel files"""))
+
+    #convert the stored grids if another precision is called for
+    if('dtype' in kw):
+        mod.dtype = kw['dtype']
 
     #return
     return(mod)
 
+def _is_model_file(file_path):
+    """Check whether a file is one that load_model reads, without loading it, so that batch processing can skip other workbooks in a directory, like emf.fields templates and results. REF files are accepted by their extension, binary Models by their arrays, and excel files if they have the 'info' sheet and component sheets of workbooks exported by Model.export.
+    args:
+        file_path - string, path to the file
+    returns:
+        bool, True if the file can be loaded as a Model"""
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if(ext == '.ref'):
+            return(True)
+        elif(ext == '.npz'):
+            with zipfile.ZipFile(file_path) as z:
+                names = z.namelist()
+            return(all([(k + '.npy') in names for k in ['meta', 'x', 'y']]))
+        elif(ext == '.xlsx'):
+            sheets = _xlsx_contents(file_path)[0]
+            return(('info' in sheets) and any([(k in sheets)
+                for k in _REF_magnitudes + _REF_phasors]))
+    #unreadable files, like workbooks that are being written, aren't Models
+    except(IOError, OSError, KeyError, zipfile.BadZipfile):
+        pass
+    return(False)
+
+def _check_stored(components, stored, file_path):
+    """Raise an error if any requested components aren't stored in a Model file"""
+    missing = [c for c in components if(c not in stored)]
+    if(missing):
+        raise(subcalc_class.EMFError("""
+        The components:
+            %s
+        are not stored in the Model file:
+            %s""" % (str(missing), file_path)))
+
+#-------------------------------------------------------------------------------
+#BINARY MODEL FILES
+
+#bump this when the layout of saved Models changes
+_MODEL_VERSION = 1
+
+def _save_model(mod, file_path, source=None):
+    """Write a Model to an .npz file, see Model.save. The file contains:
+        meta - json (as bytes) with the Model's Bkey, components, info,
+               north_angle, and the stamp of the REF file it caches, if any
+               (see _REF_stamp)
+        x - 1D array of the grid's x coordinates (columns)
+        y - 1D array of the grid's y coordinates (rows)
+        a 2D grid for each component, under the component's name
+        footprints - the footprint table as csv text (as bytes), if the
+                     Model has footprints
+    args:
+        mod - Model object
+        file_path - string or open file, destination
+        source - dict, stamp of the cached REF file from _REF_stamp"""
+    components = list(mod._grid)
+    info = None
+    if(mod.info is not None):
+        info = dict([(str(k), _json_value(v)) for k, v in mod.info.items()])
+    meta = json.dumps({'version': _MODEL_VERSION, 'Bkey': mod.Bkey,
+        'components': components, 'info': info,
+        'north_angle': mod.north_angle, 'source': source})
+    arrays = dict([(k, np.asarray(mod._grid[k])) for k in components])
+    arrays['meta'] = np.frombuffer(meta.encode('utf-8'), dtype=np.uint8)
+    arrays['x'] = np.asarray(mod.x, dtype=float)
+    arrays['y'] = np.asarray(mod.y, dtype=float)
+    if(mod.footprint_df is not None):
+        arrays['footprints'] = np.frombuffer(
+                mod.footprint_df.to_csv(index=False).encode('utf-8'),
+                dtype=np.uint8)
+    np.savez(file_path, **arrays)
+
+def _json_value(v):
+    """Convert numpy scalars in Model info to plain Python values for json"""
+    if(isinstance(v, np.generic)):
+        return(v.item())
+    return(v)
+
+def _npz_meta(a):
+    """Decode the meta entry of arrays loaded from a Model file"""
+    return(json.loads(np.asarray(a['meta']).tostring().decode('utf-8')))
+
+def _load_model_npz(file_path, components, Bkey, use_mmap):
+    """Load a Model saved with Model.save
+    args:
+        file_path - string, path to the .npz file
+        components - list of components to load, or None for all of them
+        Bkey - string, Bkey of the Model, or None to use the saved Bkey
+        use_mmap - bool, memory-map the grids instead of reading them
+    returns:
+        mod - Model object"""
+    a = _npz_load(file_path, use_mmap)
+    meta = _npz_meta(a)
+    if(meta.get('version') != _MODEL_VERSION):
+        raise(subcalc_class.EMFError("""
+        The Model in:
+            "%s"
+        was saved in an unsupported format.""" % file_path))
+    if(components is None):
+        components = meta['components']
+    else:
+        _check_stored(components, meta['components'], file_path)
+    data = {'x': a['x'], 'y': a['y']}
+    for k in components:
+        data[str(k)] = a[k]
+    if((Bkey is None) or (Bkey not in data)):
+        Bkey = meta['Bkey'] if(meta['Bkey'] in data) else components[0]
+    mod = subcalc_class.Model(data, meta['info'], Bkey=Bkey)
+    if(meta['north_angle'] is not None):
+        mod.north_angle = meta['north_angle']
+    if('footprints' in a):
+        mod.load_footprints(pd.read_csv(io.BytesIO(
+            np.asarray(a['footprints']).tostring())))
+    return(mod)
+
+#-------------------------------------------------------------------------------
+#CACHED REF FILES
+
+def _REF_cache_path(file_path):
+    """Path of the cached Model of a REF file"""
+    d, fn = os.path.split(os.path.abspath(file_path))
+    return(os.path.join(d, '.emf_cache', fn + '.npz'))
+
+def _REF_stamp(file_path):
+    """Describe the state of a REF file before it's parsed, by its size and modification time. REF files are large enough that hashing them takes about as long as parsing them, so they aren't hashed."""
+    st = os.stat(file_path)
+    return({'size': st.st_size, 'mtime': st.st_mtime})
+
+def _load_REF_cache(file_path, stamp, components, Bkey, use_mmap):
+    """Load the cached Model of a REF file if the cache is valid and has all the requested components. The cache is valid if the REF file has the same size and modification time as when it was cached.
+    args:
+        file_path - string, path to the REF file
+        stamp - dict from _REF_stamp
+        components - list of components requested
+        Bkey - string, Bkey of the Model
+        use_mmap - bool, memory-map the cached grids
+    returns:
+        Model, or None if the REF file isn't cached or it changed"""
+    fn = _REF_cache_path(file_path)
+    if(not os.path.isfile(fn)):
+        return(None)
+    try:
+        with np.load(fn) as npz:
+            meta = _npz_meta(npz)
+        if((meta['version'] != _MODEL_VERSION) or (meta['source'] != stamp)
+                or any([c not in meta['components'] for c in components])):
+            return(None)
+        mod = _load_model_npz(fn, components, Bkey, use_mmap)
+    #a corrupt or outdated cache file is treated like a missing one
+    except(Exception):
+        return(None)
+    #refer to the REF file, wherever the cache was made from
+    mod.info['REF_path'] = file_path
+    return(mod)
+
+def _cached_REF_grids(file_path, stamp):
+    """Read the component grids in the cache of a REF file, if the cache is valid (see _load_REF_cache)
+    args:
+        file_path - string, path to the REF file
+        stamp - dict from _REF_stamp
+    returns:
+        grids - dict mapping cached components to grids, empty if the REF
+                file isn't cached or it changed"""
+    fn = _REF_cache_path(file_path)
+    if(not os.path.isfile(fn)):
+        return(dict())
+    try:
+        with np.load(fn) as npz:
+            meta = _npz_meta(npz)
+            if((meta['version'] != _MODEL_VERSION)
+                    or (meta['source'] != stamp)):
+                return(dict())
+            return(dict([(str(k), npz[k]) for k in meta['components']]))
+    except(Exception):
+        return(dict())
+
+def _store_REF_cache(file_path, stamp, mod):
+    """Cache the Model parsed from a REF file, along with any components already cached from the same version of the file, so that loading different components doesn't discard the ones cached before. Nothing is stored if the file changed while it was parsed or the cache directory isn't writable.
+    args:
+        file_path - string, path to the REF file
+        stamp - dict from _REF_stamp, taken before parsing
+        mod - Model parsed from the REF file"""
+    #merge the new components into the cached ones
+    data = _cached_REF_grids(file_path, stamp)
+    if(any([k not in mod._grid for k in data])):
+        data.update(mod._grid)
+        data['x'], data['y'] = mod.x, mod.y
+        mod = subcalc_class.Model(data, mod.info, Bkey=mod.Bkey)
+    try:
+        if(_REF_stamp(file_path) != stamp):
+            return
+        fn = _REF_cache_path(file_path)
+        d = os.path.dirname(fn)
+        if(not os.path.isdir(d)):
+            os.makedirs(d)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=d)
+    except(IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, 'wb') as ofile:
+            _save_model(mod, ofile, stamp)
+        if(os.path.isfile(fn)):
+            os.remove(fn)
+        os.rename(tmp, fn)
+    except(IOError, OSError):
+        if(os.path.isfile(tmp)):
+            os.remove(tmp)
+
 def convert_REF(*args, **kw):
     """Convert a .REF model file to an excel file storing the same data and save the excel file
     args:
@@ -113,12 +388,123 @@ def convert_REF(*args, **kw):
     #load and export the model
     load_model(*args, **kw).export(**kw)
 
-def read_REF(file_path):
-    """Reads a .REF output file generated by the SUBCALC program and pulls out information about the reference grid of the model with the Res and Max magnetic fields.
+def superpose(models, **kw):
+    """Add the magnetic fields of Models with identical reference grids, like the results of separate SUBCALC runs modeling different groups of lines, instead of modeling the combined case. The Models must store phasor components (see load_model's 'components' keyword). Each Model's phasors can be scaled and rotated before they're added, to represent different loading scenarios, and the magnitudes of the combined field are computed in bulk from the summed phasors.
+    args:
+        models - list of Model objects with phasor components
+    kw:
+        scales - list of floats, factors multiplying each Model's field,
+                 like the ratio of a scenario's load to the modeled load,
+                 default is 1 for all Models
+        phases - list of floats, angles in degrees added to the phase of
+                 each Model's field, default is 0 for all Models
+        Bkey - string, component accessed by the returned Model's B
+               property, default is 'Bmax'
+        name - string, name of the combined Model, used to name exported
+               files, default is 'superposition'
+    returns:
+        mod - Model object with the magnitudes and phasor components of
+              the combined field"""
+    #check the inputs
+    if(not models):
+        raise(subcalc_class.EMFError("""
+        At least one Model must be passed to superpose."""))
+    n = len(models)
+    scales = kw['scales'] if('scales' in kw) else [1.]*n
+    phases = kw['phases'] if('phases' in kw) else [0.]*n
+    if((len(scales) != n) or (len(phases) != n)):
+        raise(subcalc_class.EMFError("""
+        The 'scales' and 'phases' passed to superpose must have one entry
+        for each of the %d Models.""" % n))
+    m0 = models[0]
+    for m in models[1:]:
+        if((m.B.shape != m0.B.shape) or (not np.array_equal(m.x, m0.x))
+                or (not np.array_equal(m.y, m0.y))):
+            raise(subcalc_class.EMFError("""
+        Models can only be superposed if their reference grids are
+        identical."""))
+    #complex factors applying the scaling and phase rotation of each Model
+    factors = np.array(scales, dtype=float)*np.exp(
+            1j*np.radians(np.array(phases, dtype=float)))
+    #sum the phasors of each component
+    ph = dict()
+    for m, f in zip(models, factors):
+        for k, v in m.phasors.items():
+            if(k in ph):
+                ph[k] += f*v
+            else:
+                ph[k] = f*v
+    #build the combined Model
+    data = _phasor_magnitudes(ph['Bx'], ph['By'], ph['Bz'])
+    data['x'], data['y'] = m0.x, m0.y
+    info = copy.deepcopy(m0.info) if(m0.info is not None) else dict()
+    info['REF_path'] = kw['name'] if('name' in kw) else 'superposition'
+    mod = subcalc_class.Model(data, info,
+            Bkey=kw['Bkey'] if('Bkey' in kw) else 'Bmax')
+    for m in models:
+        if(m.footprint_df is not None):
+            mod.load_footprints(m.footprint_df)
+            break
+    return(mod)
+
+def _phasor_magnitudes(Bx, By, Bz):
+    """Compute the magnitudes stored in REF files from complex phasor grids of the field components, which are the amplitude of each component, the resultant ('Bres', the root of the summed squared amplitudes), and the maximum field at any time ('Bmax', the semi-major axis of the field ellipse)
+    args:
+        Bx - complex array, x component phasors
+        By - complex array, y component phasors
+        Bz - complex array, z component phasors
+    returns:
+        data - dict of arrays keyed by 'Bx', 'By', 'Bz', 'Bres', 'Bmax', and
+               the phasor components 'Bx_real', 'Bx_imag', etc."""
+    data = dict()
+    #squared lengths and dot product of the real and imaginary vectors
+    rr = np.zeros(Bx.shape)
+    ii = np.zeros(Bx.shape)
+    ri = np.zeros(Bx.shape)
+    for k, v in zip(['Bx', 'By', 'Bz'], [Bx, By, Bz]):
+        r, i = v.real, v.imag
+        data[k + '_real'], data[k + '_imag'] = r, i
+        data[k] = np.abs(v)
+        rr += r*r
+        ii += i*i
+        ri += r*i
+    data['Bres'] = np.sqrt(rr + ii)
+    #the largest squared magnitude of r*cos(t) - i*sin(t) over time
+    data['Bmax'] = np.sqrt(0.5*(rr + ii) + np.sqrt(0.25*(rr - ii)**2 + ri**2))
+    return(data)
+
+#REF records of each field component, each record being a line starting with
+#its name and a colon, and the components read by default
+_REF_components = {'Bx': 'X Mag', 'By': 'Y Mag', 'Bz': 'Z Mag',
+        'Bmax': 'Max', 'Bres': 'Res',
+        'Bx_real': 'X Real', 'Bx_imag': 'X Imag',
+        'By_real': 'Y Real', 'By_imag': 'Y Imag',
+        'Bz_real': 'Z Real', 'Bz_imag': 'Z Imag'}
+_REF_magnitudes = ['Bx', 'By', 'Bz', 'Bmax', 'Bres']
+_REF_phasors = ['Bx_real', 'Bx_imag', 'By_real', 'By_imag', 'Bz_real',
+        'Bz_imag']
+#Model grid keys of the lowercase keys returned by read_REF
+_REF_grid_keys = dict([(k.lower(), k) for k in _REF_magnitudes
+    + _REF_phasors])
+
+def _REF_line(records):
+    """Compile a pattern matching the lines of the given REF records, capturing the record name and the rest of the line (matched after a newline instead of with '^', which is much faster to scan)"""
+    return(re.compile(r'\n(%s):([^\n]*)' % '|'.join(records)))
+
+def read_REF(file_path, **kw):
+    """Reads a .REF output file generated by the SUBCALC program and pulls out information about the reference grid of the model with the Res and Max magnetic fields. The file is memory-mapped and scanned once for the needed records, which are converted to arrays in bulk. Records of components that aren't requested are skipped without converting their numbers.
     args:
         file_path - string, path to saved .REF output file
+    kw:
+        components - list of field components to read, from 'Bx', 'By',
+                     'Bz', 'Bmax', 'Bres', and the phasor components
+                     'Bx_real', 'Bx_imag', 'By_real', 'By_imag', 'Bz_real',
+                     and 'Bz_imag' ('phasors' includes all six). Default is
+                     all the magnitudes, 'Bx', 'By', 'Bz', 'Bmax', and
+                     'Bres'.
     returns:
-        data - dict, keys are 'x', 'y', 'Bmax', 'Bres', 'Bx', 'By', and 'Bz'
+        data - dict, keys are 'x', 'y', and the lowercase components, like
+               'bmax', 'bres', 'bx', 'by', and 'bz'
         info - dict, reference grid and other information"""
 
     #check the extension
@@ -128,94 +514,180 @@ def read_REF(file_path):
             "%s"
         does not have the correct extension.""" % file_path)
 
-    #allocate dictionaries
+    #records to read, with the coordinates
+    components = _check_components(kw.get('components', _REF_magnitudes))
+    keys = ['x', 'y'] + [c.lower() for c in components]
+    names = ['X Coord', 'Y Coord'] + [_REF_components[c] for c in components]
+
     info = {'REF_path': file_path} #dictionary storing reference grid information
-    keys = ['X Coord', 'Y Coord', 'X Mag', 'Y Mag', 'Z Mag', 'Max', 'Res']
-    return_keys = ['x', 'y', 'bx', 'by', 'bz', 'bmax', 'bres']
-    data = dict(zip(keys, [[] for i in range(len(keys))]))
-
-    #pull data out
-    with open(file_path, 'r') as ifile:
-        #store information about the grid
-        for i in range(24):
-            line = ifile.readline().strip()
-            if(':' in line):
-                idx = line.find(':')
-                line = [line[:idx], line[idx+1:]]
-                if(_is_number(line[1])):
-                    info[line[0]] = float(line[1])
-                else:
-                    info[line[0]] = line[1].strip()
-        #read through the rest of the data
-        for line in ifile:
-            for k in keys:
-                if(k == line[:len(k)]):
-                    L = line[line.index(':')+1:]
-                    data[k].append([float(i) for i in L.split()])
-
-    #flatten the lists in data
-    for k in data:
-        data[k] = np.array(_flatten(data[k]))
+    records = dict([(k, []) for k in names])
 
-    #switch the keys
-    data = dict(zip(return_keys, [data[k] for k in keys]))
+    with open(file_path, 'rb') as ifile:
+        try:
+            text = mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ)
+        except(ValueError):
+            raise(subcalc_class.EMFError("""
+        The REF file:
+            "%s"
+        is empty.""" % file_path))
+        try:
+            #find all the needed records in one scan
+            start = None
+            for m in _REF_line(names).finditer(text):
+                if(start is None):
+                    start = m.start() + 1
+                records[m.group(1)].append(m.group(2))
+            #store information about the grid, which precedes the records
+            for line in text[:start].splitlines():
+                line = line.strip()
+                if(':' in line):
+                    idx = line.find(':')
+                    line = [line[:idx], line[idx+1:]]
+                    if(_is_number(line[1])):
+                        info[line[0]] = float(line[1])
+                    else:
+                        info[line[0]] = line[1].strip()
+        finally:
+            text.close()
+
+    #convert each record's numbers all at once
+    data = dict()
+    for k, rk in zip(names, keys):
+        data[rk] = np.fromstring('\n'.join(records[k]), sep=' ')
 
     return(data, info)
 
-def _meshgrid(flat_data):
-    """Convert raw grid data read from a SubCalc output file (by subcalc_funks.read_REF) into meshed grids of X, Y coordinates and their corresponding B field values
+def _check_REF_size(data, info, file_path):
+    """Check that every record read from a REF file has the number of grid points given in its header, raising an error for incomplete files that can't be gridded"""
+    if('Number Y Grid Points' not in info):
+        return
+    n = int(info['Number X Grid Points'])*int(info['Number Y Grid Points'])
+    for k in data:
+        if(len(data[k]) != n):
+            raise(subcalc_class.EMFError("""
+        The REF file:
+            "%s"
+        should have %d grid points according to its header, but %d '%s' values were read. The file may be incomplete.""" % (file_path, n, len(data[k]), k)))
+
+def _check_components(components):
+    """Check a list of field components requested from a REF file, returning them without duplicates. The shorthand 'phasors' stands for all six phasor components."""
+    if(isinstance(components, basestring)):
+        components = [components]
+    expanded = []
+    for c in components:
+        if(c == 'phasors'):
+            expanded += _REF_phasors
+        else:
+            expanded.append(c)
+    components = expanded
+    bad = [c for c in components if(c not in _REF_components)]
+    if(bad or (not components)):
+        raise(subcalc_class.EMFError("""
+        Field components read from REF files must be among:
+            %s
+        not:
+            %s""" % (str(_REF_magnitudes + _REF_phasors), str(bad))))
+    unique = []
+    for c in components:
+        if(c not in unique):
+            unique.append(c)
+    return(unique)
+
+def _meshgrid(flat_data, ncols=None):
+    """Convert raw grid data read from a SubCalc output file (by subcalc_funks.read_REF) into the 1D axes of the reference grid and gridded B field values
     args:
-        flat_data - dict, keyed by 'x','y','bx','by','bz','bmax','bres'
+        flat_data - dict, keyed by 'x','y', and lowercase components like
+                    'bx','by','bz','bmax','bres'
+        ncols - int, optional, number of points in each row of the grid,
+                which is found from the y coordinates if not passed
     returns:
-        grid_data - dict with gridded arrays keyed by
-                'X','Y','Bx','By','Bz','Bmax','Bres'"""
+        grid_data - dict with the 1D axes keyed by 'x','y' and gridded
+                arrays keyed by the components, like
+                'Bx','By','Bz','Bmax','Bres'"""
 
-    #find the number of points in a row
-    x = flat_data['x']
+    #find the number of points in a row, where y first changes
     y = flat_data['y']
-    count = 0
-    v = y[count]
-    while(y[count+1] == y[count]):
-        count += 1
-    count += 1
+    if(ncols is None):
+        idx = np.flatnonzero(y != y[0])
+        ncols = idx[0] if len(idx) else len(y)
     #get ncols and nrows
-    L = len(x)
-    ncols = count
-    nrows = L/ncols
-    #map old to new keys
-    mapk = dict(zip(['x','y','bx','by','bz','bmax','bres'],
-                    ['X','Y','Bx','By','Bz','Bmax','Bres']))
-    #replace with 2D arrays
-    grid_data = dict(zip([mapk[k] for k in flat_data],
-                [np.reshape(flat_data[k], (nrows, ncols)) for k in flat_data]))
+    nrows = len(y)//ncols
+    #replace with 2D arrays, mapping old to new keys
+    grid_data = dict([(_REF_grid_keys[k], np.reshape(flat_data[k],
+        (nrows, ncols))) for k in flat_data if(k not in ['x', 'y'])])
+    #the grid is regular, so only the first row and column of coordinates
+    #are kept
+    grid_data['x'] = flat_data['x'][:ncols].copy()
+    grid_data['y'] = y[:nrows*ncols:ncols].copy()
 
     return(grid_data)
 
-def _bilinear_interp(mod, x, y):
-    """Use Model results to interpolate linearly in two dimensions for an estimate of any x,y coordinate inside the grid.
+def _grid_axes(X, Y):
+    """Find the 1D axes of 2D X and Y grids, like those made by np.meshgrid
     args:
-        mod - Model object
-        x - float, x coordinate to interpolate at
-        y - float, y coordinate to interpolate at
+        X - 2D array, x coordinates, constant down each column
+        Y - 2D array, y coordinates, constant along each row
     returns:
-        B_interp - float, interpolated field value"""
-    #first find the 4 point grid cell containing x,y
-    #   (the point is assumed to lie inside the grid)
-    _, xidx = _double_min(np.abs(mod.x - x))
-    _, yidx = _double_min(np.abs(mod.y - y))
-    #get coordinates and values
-    x1, x2 = mod.x[xidx]
-    y1, y2 = mod.y[yidx]
-    B11 = mod.B[yidx[0], xidx[0]]
-    B12 = mod.B[yidx[0], xidx[1]]
-    B21 = mod.B[yidx[1], xidx[0]]
-    B22 = mod.B[yidx[1], xidx[1]]
-    #interpolate
-    B_interp = (1.0/((x2 - x1)*(y2 - y1)))*(
-        B11*(x2 - x)*(y2 - y) + B21*(x - x1)*(y2 - y)
-        + B12*(x2 - x)*(y - y1) + B22*(x - x1)*(y - y1))
-
-    return(B_interp)
+        x - 1D array, x coordinates of the columns
+        y - 1D array, y coordinates of the rows"""
+    X, Y = np.asarray(X, dtype=float), np.asarray(Y, dtype=float)
+    if((X.ndim != 2) or (X.shape != Y.shape)):
+        raise(subcalc_class.EMFError("""
+        X and Y grids must be 2D arrays with the same shape."""))
+    x, y = X[0,:], Y[:,0]
+    if((not (X == x).all()) or (not (Y == y[:,np.newaxis]).all())):
+        raise(subcalc_class.EMFError("""
+        X and Y grids must form a regular grid, with x coordinates that
+        are the same in every row and y coordinates that are the same in
+        every column."""))
+    return(x.copy(), y.copy())
+
+def _read_only(a):
+    """Get a read-only view of an array, leaving the array itself writable"""
+    a = np.asarray(a).view()
+    a.setflags(write=False)
+    return(a)
+
+def _axis_step(axis):
+    """Find the spacing of an evenly spaced grid axis
+    args:
+        axis - 1D array, increasing or decreasing coordinates of a grid axis
+    returns:
+        step - float, the spacing between coordinates (negative for
+               decreasing axes), or None if the axis isn't evenly spaced"""
+    n = len(axis)
+    if(n < 2):
+        raise(subcalc_class.EMFError("""
+        Cannot interpolate on a grid with fewer than 2 points along an
+        axis."""))
+    step = (axis[-1] - axis[0])/(n - 1.)
+    if(np.allclose(np.diff(axis), step, rtol=1e-9, atol=0)):
+        return(step)
+    return(None)
+
+def _cell_index(axis, v, step):
+    """Find the cells of a grid axis containing coordinates, directly from the spacing of evenly spaced axes and by binary search otherwise
+    args:
+        axis - 1D array, increasing or decreasing coordinates of a grid axis
+        v - array, coordinates inside the axis' range
+        step - float or None, spacing of the axis from _axis_step
+    returns:
+        idx - int array, index of the first coordinate of each cell, so
+              that each coordinate lies between axis[idx] and axis[idx+1]
+        t - array, fractional position of each coordinate in its cell"""
+    n = len(axis)
+    if(step is not None):
+        #evenly spaced, the cell follows from the distance to the start
+        idx = np.floor((v - axis[0])/step).astype(int)
+    elif(axis[-1] > axis[0]):
+        idx = np.searchsorted(axis, v, side='right') - 1
+    else:
+        idx = n - 1 - np.searchsorted(axis[::-1], v, side='left')
+    #coordinates on the last grid line fall in the last cell
+    idx = np.clip(idx, 0, n - 2)
+    t = (v - axis[idx])/(axis[idx+1] - axis[idx])
+
+    return(idx, t)
 
 def _2Dmax(G):
     """Find the indices of the maximum value in a 2 dimensional array
@@ -234,31 +706,3 @@ def _2Dmax(G):
                 imax = i
                 jmax = j
     return(m, imax, jmax)
-
-def _double_min(v):
-    """Find the lowest two values in an array and their indices
-    args:
-        v - iterable
-    returns:
-        mins - array of minima, the first one being the smallest
-        idxs - array of indices of minima"""
-    if(len(v) < 2):
-        raise(subcalc_class.EMFError("""
-        Cannot find lowest two values in an array of length less than 2."""))
-    m = max(v) #store the max for initialization
-    mins = np.array([m, m], dtype=float)
-    idxs = np.zeros((2,), dtype=int)
-    for i in range(len(v)):
-        if(v[i] < mins[0]):
-            #swap first minimum to second
-            mins[1] = mins[0]
-            idxs[1] = idxs[0]
-            #store new first minimum
-            mins[0] = v[i]
-            idxs[0] = i
-        elif(v[i] < mins[1]):
-            #store new second minimum
-            mins[1] = v[i]
-            idxs[1] = i
-
-    return(mins, idxs)
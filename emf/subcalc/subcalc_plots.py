@@ -4,18 +4,21 @@ from ..emf_plots import _save_fig
 
 import subcalc_funks
 
-#rcparams for more static global formatting changes
-mpl.rcParams['figure.facecolor'] = 'white'
-mpl.rcParams['figure.figsize'] = (12, 6)
-mpl.rcParams['font.family'] = 'Times New Roman'
-mpl.rcParams['text.color'] = (.2, .2, .2)
-mpl.rcParams['axes.labelcolor'] = (.2, .2, .2)
-mpl.rcParams['axes.titlesize'] = 16
-mpl.rcParams['axes.labelsize'] = 14
-mpl.rcParams['legend.fontsize'] = 14
-mpl.rcParams['legend.borderaxespad'] = 0 #mpl default is None
-mpl.rcParams['xtick.color'] = (.2, .2, .2)
-mpl.rcParams['ytick.color'] = (.2, .2, .2)
+#rcparams for more static global formatting changes, applied when matplotlib
+#is first imported
+_rcParams = {
+    'figure.facecolor': 'white',
+    'figure.figsize': (12, 6),
+    'font.family': 'Times New Roman',
+    'text.color': (.2, .2, .2),
+    'axes.labelcolor': (.2, .2, .2),
+    'axes.titlesize': 16,
+    'axes.labelsize': 14,
+    'legend.fontsize': 14,
+    'legend.borderaxespad': 0, #mpl default is None
+    'xtick.color': (.2, .2, .2),
+    'ytick.color': (.2, .2, .2)}
+mpl.on_import(lambda m: m.rcParams.update(_rcParams))
 
 #other more specific/dynamic global formatting variables
 _max_fig_width = 18
@@ -0,0 +1,360 @@
+"""Accuracy and performance regression checks against FIELDS output files
+
+Loads every CrossSection in a template, pairs it with the FIELDS output (.DAT)
+of the same name in a directory (case insensitive), and compares all of the
+results in one vectorized pass, while recording how long each CrossSection
+takes to calculate. By default the pairs in working_files are checked:
+
+    python nopack/DAT_regression.py
+
+FIELDS prints results to the thousandths digit and in single precision, so
+each result should agree with the DAT to within half a unit in that digit
+plus a small relative allowance. The electric fields computed by FIELDS
+differ from those of emf.fields by a small, stable amount for some cross
+sections, so the largest error observed for each case and field is stored
+in a baseline file and errors may not grow beyond it. After a deliberate
+change to the calculations, refresh the baseline with --record.
+
+Because the DAT allowances are loose for some electric fields, every
+CrossSection's results are also checked point by point against golden
+results stored from the original emf.fields calculations, to a relative
+tolerance of 1e-9. This is what holds optimizations of the calculations to
+numerical equivalence. After a deliberate change to the calculations,
+refresh the golden results with --record-golden. The counters of the field
+calculations (emf.fields.stats) are also checked to count every CrossSection
+calculation and to work with keyword arguments. The script exits with a
+nonzero status if any case fails a check."""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import matplotlib
+matplotlib.use('Agg')
+
+#make the emf package importable when running from a checkout
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+
+import numpy as np
+
+import emf.fields as fld
+
+_template = os.path.join(_root, 'working_files', 'practice_xcs.xlsx')
+_DAT_dir = os.path.join(_root, 'working_files', 'compare_DAT')
+_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'DAT_regression_baseline.json')
+_golden = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'DAT_regression_golden.npz')
+
+#columns compared, in the order of read_DAT's output
+_columns = ['Bx', 'By', 'Bprod', 'Bmax', 'Ex', 'Ey', 'Eprod', 'Emax']
+#half a unit in the last digit printed by FIELDS
+_atol = 5e-4
+#single precision relative resolution, with some room
+_rtol = 2e-6
+#allowed growth of errors over the baseline, for floating point noise
+_slack = 1e-6
+#tolerances of the comparison to golden results, relative to the golden
+#values and absolute for values near zero
+_golden_rtol = 1e-9
+_golden_atol = 1e-12
+
+def load_pairs(template_path, DAT_dir):
+    """Load a template and match its CrossSections to DAT files
+    args:
+        template_path - string, path to template workbook
+        DAT_dir - string, directory of FIELDS output files
+    returns:
+        sb - SectionBook loaded from the template
+        pairs - list of (CrossSection, DataFrame of DAT results) tuples
+        unmatched - list of sheets without a DAT file"""
+    sb = fld.load_template(template_path, cache=False)
+    DATs = dict([(os.path.splitext(fn)[0].upper(), os.path.join(DAT_dir, fn))
+        for fn in os.listdir(DAT_dir) if(fn[-4:].upper() == '.DAT')])
+    pairs, unmatched = [], []
+    for xs in sb:
+        k = xs.sheet.upper()
+        if(k in DATs):
+            pairs.append((xs, fld.read_DAT(DATs[k])))
+        else:
+            unmatched.append(xs.sheet)
+    return(sb, pairs, unmatched)
+
+def time_fields(sb, xs, repeat):
+    """Time the calculation of a CrossSection's fields from scratch
+    args:
+        sb - SectionBook containing xs
+        xs - CrossSection
+        repeat - int, number of timed calculations
+    returns:
+        best - float, fastest wall time (seconds)"""
+    t = []
+    for i in range(repeat):
+        #drop results and the shared geometry kernels
+        sb._kernels.clear()
+        xs._fields = None
+        t0 = time.time()
+        xs.fields
+        t.append(time.time() - t0)
+    return(min(t))
+
+def compare(pairs):
+    """Compare CrossSection results to DAT results for all pairs at once, over the sample points they share (CrossSections also sample at their ROW edges, which may be missing in the DAT)
+    args:
+        pairs - list of (CrossSection, DataFrame) tuples from load_pairs
+    returns:
+        abs_err - 2D array, largest absolute error for each pair (rows)
+                  and field (columns)
+        excess - 2D array, largest ratio of absolute error to the rounding
+                 bound, _atol + _rtol*|DAT value|, for each pair and field
+        npts - 1D int array, number of compared points for each pair"""
+    calc, DAT, npts = [], [], []
+    for xs, df in pairs:
+        f = xs.fields
+        #match points by distance, printed to the hundredths in DATs
+        xf = np.round(f.index.values.astype(float), 2)
+        xd = np.round(df.index.values.astype(float), 2)
+        common = np.intersect1d(xf, xd)
+        calc.append(f[_columns].values[np.searchsorted(xf, common)])
+        DAT.append(df[_columns].values[np.searchsorted(xd, common)])
+        npts.append(len(common))
+    #stack everything and reduce by pair
+    calc, DAT = np.vstack(calc), np.vstack(DAT)
+    npts = np.array(npts, dtype=int)
+    starts = np.concatenate(([0], np.cumsum(npts)[:-1]))
+    err = np.abs(calc - DAT)
+    ratio = err/(_atol + _rtol*np.abs(DAT))
+    abs_err = np.maximum.reduceat(err, starts, axis=0)
+    excess = np.maximum.reduceat(ratio, starts, axis=0)
+    return(abs_err, excess, npts)
+
+def check(names, abs_err, excess, baseline):
+    """Find failing cases, where the error exceeds both the rounding bound and the baseline error
+    args:
+        names - list of case names (sheets)
+        abs_err - 2D array from compare
+        excess - 2D array from compare
+        baseline - dict mapping case names to dicts of baseline errors
+    returns:
+        failures - list of (case, column, error, allowed) tuples"""
+    failures = []
+    for i, n in enumerate(names):
+        base = baseline.get(n, {})
+        for j, c in enumerate(_columns):
+            if(excess[i,j] <= 1):
+                continue
+            allowed = max(base.get(c, 0.) + _slack, _atol)
+            if(abs_err[i,j] > allowed):
+                failures.append((n, c, abs_err[i,j], allowed))
+    return(failures)
+
+def golden_arrays(sb):
+    """Gather the results of every CrossSection in a SectionBook in the layout of the golden results file
+    args:
+        sb - SectionBook
+    returns:
+        arrays - dict mapping sheets to 2D arrays with columns for the
+                 sample distances and the fields in _columns"""
+    arrays = dict()
+    for xs in sb:
+        f = xs.fields
+        arrays[xs.sheet] = np.column_stack((f.index.values.astype(float),
+            f[_columns].values))
+    return(arrays)
+
+def check_golden(arrays, golden):
+    """Compare results to golden results point by point
+    args:
+        arrays - dict from golden_arrays
+        golden - dict of golden results in the same layout
+    returns:
+        golden_err - dict mapping sheets to the largest ratio of the
+                     difference from the golden results to the allowed
+                     difference, _golden_atol + _golden_rtol*|golden value|,
+                     or None if there are no golden results for the sheet
+        failures - list of (case, column, error, allowed) tuples, where the
+                   error is the largest absolute difference in the column
+                   and the allowed difference is at that point"""
+    golden_err, failures = dict(), []
+    for n in sorted(arrays):
+        if(n not in golden):
+            golden_err[n] = None
+            continue
+        a, g = arrays[n], golden[n]
+        if(a.shape != g.shape):
+            golden_err[n] = np.inf
+            failures.append((n, 'points', float(a.shape[0]),
+                float(g.shape[0])))
+            continue
+        err = np.abs(a - g)
+        allowed = _golden_atol + _golden_rtol*np.abs(g)
+        ratio = err/allowed
+        golden_err[n] = float(ratio.max())
+        for j, c in enumerate(['x'] + _columns):
+            if(ratio[:,j].max() > 1):
+                i = np.argmax(err[:,j])
+                failures.append((n, 'golden ' + c, err[i,j], allowed[i,j]))
+    return(golden_err, failures)
+
+def check_stats(sb):
+    """Check the counters of the field calculations (see emf.fields.stats). Every CrossSection calculation must be credited to the E_field and B_field counters, and every counted function must accept keyword arguments while counting and give the same results as when it's called positionally.
+    args:
+        sb - SectionBook
+    returns:
+        failures - list of (case, column, error, allowed) tuples, where the
+                   case is 'stats', the column names the counter or call,
+                   and the error and allowed values are the counted and
+                   expected numbers (or differences in results)"""
+    failures = []
+    fld.reset_stats()
+    fld.enable_stats()
+    try:
+        #recalculate every CrossSection with the counters on
+        for xs in sb:
+            xs._fields = None
+            xs.fields
+        npts = sum([len(xs.x_sample) for xs in sb])
+        st = fld.stats()
+        for name in ['E_field', 'B_field']:
+            for c, expected in [('calls', len(sb)), ('points', npts)]:
+                if(st.at[name, c] != expected):
+                    failures.append(('stats', '%s %s' % (name, c),
+                        st.at[name, c], expected))
+        #call the counted functions with keyword arguments
+        xs = sb.xss[0]
+        kw = dict(x_cond=xs.x, y_cond=xs.y, p_cond=xs.phase,
+                x=xs.x_sample, y=xs.y_sample)
+        E_kw = dict(kw, subconds=xs.subconds, d_cond=xs.d_cond,
+                d_bund=xs.d_bund, V_cond=xs.V)
+        calls = [
+            ('E_field', fld.E_field, [E_kw[k] for k in ['x_cond', 'y_cond',
+                'subconds', 'd_cond', 'd_bund', 'V_cond', 'p_cond', 'x',
+                'y']], E_kw),
+            ('B_field', fld.B_field, [xs.x, xs.y, xs.I, xs.phase,
+                xs.x_sample, xs.y_sample], dict(kw, I_cond=xs.I))]
+        Bx, By = fld.B_field(*calls[1][2])
+        calls.append(('phasors_to_magnitudes', fld.phasors_to_magnitudes,
+            [Bx, By], dict(Ph_x=Bx, Ph_y=By)))
+        for name, f, args, kwargs in calls:
+            n = fld.stats().at[name, 'calls']
+            try:
+                diff = max([np.abs(a - b).max()
+                    for a, b in zip(f(*args), f(**kwargs))])
+            except(Exception) as e:
+                print('%s failed with keyword arguments: %r' % (name, e))
+                diff = np.inf
+            if(diff != 0):
+                failures.append(('stats', '%s keywords' % name, diff, 0))
+            if(fld.stats().at[name, 'calls'] != n + 2):
+                failures.append(('stats', '%s keyword calls' % name,
+                    fld.stats().at[name, 'calls'] - n, 2))
+    finally:
+        fld.disable_stats()
+        fld.reset_stats()
+    return(failures)
+
+def run(template_path=_template, DAT_dir=_DAT_dir, baseline_path=_baseline,
+        repeat=3, record=False, golden_path=_golden, record_golden=False):
+    """Run the comparisons and timings
+    args:
+        template_path - string, path to template workbook
+        DAT_dir - string, directory of FIELDS output files
+        baseline_path - string, path of the baseline error file
+        repeat - int, number of timed calculations of each CrossSection
+        record - bool, overwrite the baseline with the current errors
+        golden_path - string, path of the golden results file
+        record_golden - bool, overwrite the golden results with the
+                        current results
+    returns:
+        report - dict with 'cases' and 'failures' entries"""
+    #make sure results are actually calculated
+    fld.disable_cache()
+    sb, pairs, unmatched = load_pairs(template_path, DAT_dir)
+    for sheet in unmatched:
+        print('no DAT file for sheet: %s' % sheet)
+    seconds = [time_fields(sb, xs, repeat) for xs, df in pairs]
+    names = [xs.sheet for xs, df in pairs]
+    abs_err, excess, npts = compare(pairs)
+    if(record):
+        baseline = dict([(n, dict(zip(_columns, abs_err[i].tolist())))
+            for i, n in enumerate(names)])
+        with open(baseline_path, 'w') as ofile:
+            json.dump(baseline, ofile, indent=2, sort_keys=True)
+        print('Baseline errors written to: %s' % baseline_path)
+    elif(os.path.isfile(baseline_path)):
+        with open(baseline_path, 'r') as ifile:
+            baseline = json.load(ifile)
+    else:
+        baseline = {}
+    failures = check(names, abs_err, excess, baseline)
+    #compare every CrossSection to the golden results
+    arrays = golden_arrays(sb)
+    if(record_golden):
+        np.savez(golden_path, **arrays)
+        print('Golden results written to: %s' % golden_path)
+    if(os.path.isfile(golden_path)):
+        with np.load(golden_path) as npz:
+            golden = dict([(k, npz[k]) for k in npz.files])
+    else:
+        golden = {}
+    golden_err, golden_failures = check_golden(arrays, golden)
+    for n in sorted(golden_err):
+        if(golden_err[n] is None):
+            print('no golden results for sheet: %s' % n)
+    failures += golden_failures
+    #check the calculation counters
+    failures += check_stats(sb)
+    failed = set([f[0] for f in failures])
+    cases = []
+    print('%-14s %6s %12s %12s %10s %10s  %s' % ('case', 'points',
+        'max B err', 'max E err', 'golden', 'seconds', 'status'))
+    for i, n in enumerate(names):
+        cases.append({'case': n, 'points': int(npts[i]),
+            'seconds': seconds[i],
+            'abs_err': dict(zip(_columns, abs_err[i].tolist())),
+            'golden_err': golden_err[n],
+            'passed': n not in failed})
+        print('%-14s %6d %12.6f %12.6f %10.3g %10.5f  %s' % (n, npts[i],
+            abs_err[i,:4].max(), abs_err[i,4:].max(),
+            golden_err[n] if(golden_err[n] is not None) else np.nan,
+            seconds[i], 'FAIL' if(n in failed) else 'ok'))
+    #sections without DAT files are only checked against golden results
+    for n in sorted(set(golden_err) - set(names)):
+        cases.append({'case': n, 'golden_err': golden_err[n],
+            'passed': n not in failed})
+    for n, c, e, a in failures:
+        print('%s %s: error %g exceeds allowed %g' % (n, c, e, a))
+    return({'cases': cases, 'failures': [list(f) for f in failures]})
+
+if(__name__ == '__main__'):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-t', '--template', default=_template,
+            help='path of the template workbook')
+    parser.add_argument('-d', '--DAT-dir', default=_DAT_dir,
+            help='directory of matching DAT files')
+    parser.add_argument('-b', '--baseline', default=_baseline,
+            help='path of the baseline error file')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+            help='number of timed calculations of each CrossSection')
+    parser.add_argument('-o', '--output',
+            help='path of a JSON file to write the report to')
+    parser.add_argument('--record', action='store_true',
+            help='overwrite the baseline with the current errors')
+    parser.add_argument('-g', '--golden', default=_golden,
+            help='path of the golden results file')
+    parser.add_argument('--record-golden', action='store_true',
+            help='overwrite the golden results with the current results')
+    a = parser.parse_args()
+
+    report = run(a.template, a.DAT_dir, a.baseline, a.repeat, a.record,
+            a.golden, a.record_golden)
+    if(a.output):
+        with open(a.output, 'w') as ofile:
+            json.dump(report, ofile, indent=2, sort_keys=True)
+        print('Regression report written to: %s' % a.output)
+    if(report['failures']):
+        sys.exit(1)
@@ -0,0 +1,541 @@
+"""Benchmarks for the hot paths in emf.fields and emf.subcalc
+
+Times the field calculation functions, phase optimization, height targeting,
+file readers, Model interpolation/resampling, and the plotting entry points
+across a range of problem sizes, using synthetic inputs generated on the fly
+and the samples in working_files. Results are written to a JSON file along
+with the git commit and library versions so that runs from different commits
+can be compared:
+
+    python nopack/benchmarks.py -o before.json
+    (checkout another commit)
+    python nopack/benchmarks.py -o after.json --compare before.json
+
+Use --quick for a fast pass at small sizes and --only to run a subset of the
+benchmarks by name (substring match). The time taken by 'import emf.fields'
+in a fresh interpreter is also measured, and the script exits with a nonzero
+status if it exceeds --import-budget or loads plotting or scipy modules."""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+#make the emf package importable when running from a checkout
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+
+import numpy as np
+import pandas as pd
+
+import emf.fields as fld
+import emf.subcalc as sc
+
+_working_files = os.path.join(_root, 'working_files')
+_template = os.path.join(_working_files, 'practice_xcs.xlsx')
+_DAT_dir = os.path.join(_working_files, 'compare_DAT')
+_REF_xlsx = os.path.join(_working_files, 'REF_GRID1.xlsx')
+_footprints = os.path.join(_working_files, 'footprints1.csv')
+
+#import emf.fields should load only what the calculations need, so these
+#must not be imported with it, and it must take less than _import_budget
+#seconds (matplotlib itself may be imported by pandas, but not pyplot)
+_import_forbidden = ['matplotlib.pyplot', 'scipy']
+_import_budget = 1.0
+
+#size parameters for full and quick runs
+_sizes = {
+    'full': {
+        'points': [201, 2001, 20001],
+        'circuits': [1, 2, 4],
+        'optimize_circuits': [1, 2, 3],
+        'sheets': [1, 4, None],
+        'DAT_rows': [601, 6001, 60001],
+        'REF_grid': [(51, 29), (201, 113), (501, 281)],
+        'interp_points': [100, 1000, 10000],
+        'resample_N': [1000, 10000, 100000]},
+    'quick': {
+        'points': [201, 2001],
+        'circuits': [1, 2],
+        'optimize_circuits': [1, 2],
+        'sheets': [1, None],
+        'DAT_rows': [601, 6001],
+        'REF_grid': [(51, 29), (101, 57)],
+        'interp_points': [100, 1000],
+        'resample_N': [1000, 10000]}}
+
+#-------------------------------------------------------------------------------
+#SYNTHETIC INPUTS
+
+def synthetic_xs(circuits, max_dist=300., step=1.):
+    """Build a CrossSection of side by side three-phase circuits with a pair of ground wires
+    args:
+        circuits - int, number of three-phase circuits
+        max_dist - float, CrossSection.max_dist
+        step - float, CrossSection.step
+    returns:
+        xs - CrossSection object"""
+    xs = fld.CrossSection('synthetic-%d' % circuits)
+    xs.max_dist = max_dist
+    xs.step = step
+    xs.sample_height = 3.28
+    for i in range(circuits):
+        x0 = 40.*(i - (circuits - 1)/2.)
+        for j, p in enumerate([0., 120., 240.]):
+            xs.add_conductor(fld.Conductor('c%d-%d' % (i, j),
+                [x0 + 12.*(j - 1), 60. + 5.*j, 2, 1.108, 18., 230., 600., p]))
+    for i, x in enumerate([-30., 30.]):
+        xs.add_conductor(fld.Conductor('g%d' % i,
+            [x, 90., 1, 0.5, 0.5, 0., 0., 0.]))
+    xs.lROW = -75.
+    xs.rROW = 75.
+    return(xs)
+
+def write_DAT(file_path, rows):
+    """Write a FIELDS output file (.DAT) with a given number of rows of smoothly varying results
+    args:
+        file_path - string, destination of the DAT file
+        rows - int, number of sample points"""
+    x = np.linspace(-(rows - 1)/2., (rows - 1)/2., rows)
+    B = 100./(1. + (x/50.)**2)
+    E = 2./(1. + (x/40.)**2)
+    with open(file_path, 'w') as ofile:
+        ofile.write('Synthetic Section\nbenchmark\nSYNTH.FLD\n\n')
+        ofile.write(' DIST    B Horz   B Vert   B PROD    B MAX   E Horz   E Vert   E PROD    E MAX\n')
+        ofile.write(' (Ft)     (mG)     (mG)     (mG)      (mG)   (kV/m)   (kV/m)   (kV/m)   (V/m)\n')
+        ofile.write(' ----    ------   ------   ------    -----   ------   ------   ------   ------\n')
+        for i in range(rows):
+            ofile.write('%7.2f %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f\n'
+                % (x[i], .4*B[i], .9*B[i], B[i], .99*B[i],
+                    .1*E[i], .99*E[i], E[i], E[i]))
+
+def write_REF(file_path, nx, ny, dx=5., dy=5.):
+    """Write a SUBCALC output file (.REF) for a complete nx by ny reference grid
+    args:
+        file_path - string, destination of the REF file
+        nx - int, number of grid points along x
+        ny - int, number of grid points along y
+        dx - float, x grid increment
+        dy - float, y grid increment"""
+    x = dx*np.arange(nx)
+    y = dy*np.arange(ny)
+    sep = '_'*104 + '\n'
+    def line(label, v):
+        return('%-9s' % (label + ':') + ' '.join(['%7.2f' % i for i in v]) + '\n')
+    with open(file_path, 'w') as ofile:
+        ofile.write('ASCII Representation of Magnetic Field Map\n')
+        ofile.write('='*104 + '\n')
+        ofile.write('File: SYNTH.REF\nCreated on: benchmark\n')
+        ofile.write('Program Name and Version: SUBCALC 2.0\n\n')
+        ofile.write('='*104 + '\n')
+        ofile.write('                    REFERENCE GRID DEFINITION\n')
+        ofile.write('='*104 + '\n')
+        ofile.write('Minimum X Coordinate: %8.3f\n' % x[0])
+        ofile.write('Minimum Y Coordinate: %8.3f\n' % y[0])
+        ofile.write('Maximum X Coordinate: %8.3f\n' % x[-1])
+        ofile.write('Maximum Y Coordinate: %8.3f\n' % y[-1])
+        ofile.write('Z Height:             %8.3f\n' % 3.28)
+        ofile.write('X Grid Increment:     %8.3f\n' % dx)
+        ofile.write('Y Grid Increment:     %8.3f\n' % dy)
+        ofile.write('Number X Grid Points: %8d\n' % nx)
+        ofile.write('Number Y Grid Points: %8d\n' % ny)
+        ofile.write('Total Grid Points:    %8d\n\n' % (nx*ny))
+        ofile.write('Distance Units: feet\nB-Field Units : mG\n\n')
+        ofile.write(sep + '\n')
+        #rows are written from the top of the grid down, like SUBCALC
+        for yv in y[::-1]:
+            r = np.hypot(x - x[-1]/2., yv - y[-1]/2.)
+            B = 500./(1. + (r/50.)**2)
+            ofile.write(line('Y Coord', yv*np.ones((nx,))))
+            ofile.write(line('X Coord', x) + '\n')
+            for c, f in zip('XYZ', [.5, .6, .3]):
+                ofile.write(line(c + ' Mag', f*B))
+                ofile.write(line(c + ' Phas', np.zeros((nx,))))
+                ofile.write(line(c + ' Real', f*B))
+                ofile.write(line(c + ' Imag', np.zeros((nx,))) + '\n')
+            ofile.write(line('Res', .84*B))
+            ofile.write(line('Max', B))
+            ofile.write(line('Min', .1*B))
+            ofile.write(line('Min/Max', .1*np.ones((nx,))))
+            ofile.write(sep + '\n')
+
+def synthetic_model(nx, ny):
+    """Build a Model directly from synthetic grids, with the footprints in working_files
+    args:
+        nx - int, number of grid points along x
+        ny - int, number of grid points along y
+    returns:
+        mod - Model object"""
+    #the grid spans the same area as REF_GRID1 so the footprints fit inside
+    #it, and rows run from the top of the grid down like grids from REF files
+    X, Y = np.meshgrid(np.linspace(0, 2500, nx), np.linspace(1400, 0, ny))
+    B = 500./(1. + (np.hypot(X - 1250., Y - 700.)/200.)**2)
+    data = {'X': X, 'Y': Y, 'Bmax': B, 'Bres': .84*B, 'Bx': .5*B,
+            'By': .6*B, 'Bz': .3*B}
+    mod = sc.Model(data, {})
+    mod.load_footprints(_footprints)
+    return(mod)
+
+#-------------------------------------------------------------------------------
+#TIMING
+
+def _timeit(f, repeat):
+    """Call f() repeat times
+    returns:
+        best - float, fastest wall time (seconds)
+        median - float, median wall time (seconds)"""
+    t = []
+    for i in range(repeat):
+        t0 = time.time()
+        f()
+        t.append(time.time() - t0)
+        plt.close('all')
+    return(min(t), float(np.median(t)))
+
+def _benchmarks(sizes, tmp):
+    """Generate the benchmarks as (name, param, setup) tuples, where setup() prepares the inputs and returns the function to time"""
+
+    #field calculation functions on their own
+    for n in sizes['points']:
+        def setup(n=n):
+            xs = synthetic_xs(2)
+            x = np.linspace(-300, 300, n)
+            y = 3.28*np.ones((n,))
+            args = (xs.x, xs.y, xs.subconds, xs.d_cond, xs.d_bund, xs.V,
+                    xs.phase, x, y)
+            return(lambda: fld.E_field(*args))
+        yield('E_field', 'points=%d' % n, setup)
+        def setup(n=n):
+            xs = synthetic_xs(2)
+            x = np.linspace(-300, 300, n)
+            y = 3.28*np.ones((n,))
+            args = (xs.x, xs.y, xs.I, xs.phase, x, y)
+            return(lambda: fld.B_field(*args))
+        yield('B_field', 'points=%d' % n, setup)
+        def setup(n=n):
+            Ph = np.exp(1j*np.linspace(0, 6, 2*n)).reshape(2, n)
+            return(lambda: fld.phasors_to_magnitudes(Ph[0], Ph[1]))
+        yield('phasors_to_magnitudes', 'points=%d' % n, setup)
+
+    #full CrossSection calculation, scaling with conductor count
+    for c in sizes['circuits']:
+        def setup(c=c):
+            xs = synthetic_xs(c)
+            def f():
+                xs._fields = None
+                xs.fields
+            return(f)
+        yield('CrossSection.fields', 'circuits=%d' % c, setup)
+
+    #phase optimization grows as 6^circuits
+    for c in sizes['optimize_circuits']:
+        def setup(c=c):
+            xs = synthetic_xs(c)
+            return(lambda: fld.optimize_phasing(xs, 'all'))
+        yield('optimize_phasing', 'circuits=%d' % c, setup)
+
+    for c in sizes['circuits']:
+        def setup(c=c):
+            xs = synthetic_xs(c)
+            tags = [t for t in xs.tags if t[0] == 'c']
+            #target half of the existing fields at the ROW edges
+            B = .5*xs.fields['Bmax'].loc[[xs.lROW, xs.rROW]].values
+            E = .5*xs.fields['Emax'].loc[[xs.lROW, xs.rROW]].values
+            return(lambda: fld.target_fields(xs, tags, B[0], B[1], E[0], E[1]))
+        yield('target_fields', 'circuits=%d' % c, setup)
+
+    #template loading
+    for s in sizes['sheets']:
+        def setup(s=s):
+            sheets = pd.ExcelFile(_template).sheet_names
+            if(s is not None):
+                sheets = sheets[:s]
+            return(lambda: fld.load_template(_template, sheets=sheets,
+                cache=False))
+        yield('load_template', 'sheets=%s' % ('all' if s is None else s),
+                setup)
+    #cached workbooks and text templates, from copies in the temporary
+    #directory so no cache files are left next to the real template
+    def setup():
+        fn = os.path.join(tmp, os.path.basename(_template))
+        shutil.copyfile(_template, fn)
+        fld.load_template(fn)
+        return(lambda: fld.load_template(fn))
+    yield('load_template', 'cached', setup)
+    for ext in ['json', 'csv']:
+        def setup(ext=ext):
+            sb = fld.load_template(_template, cache=False)
+            sb.template_export(path=tmp, file_type=ext)
+            fn = os.path.join(tmp, sb.name + '.' + ext)
+            return(lambda: fld.load_template(fn))
+        yield('load_template', ext, setup)
+
+    #DAT reading
+    for n in sizes['DAT_rows']:
+        def setup(n=n):
+            fn = os.path.join(tmp, 'SYNTH-%d.DAT' % n)
+            if(not os.path.isfile(fn)):
+                write_DAT(fn, n)
+            return(lambda: fld.read_DAT(fn))
+        yield('read_DAT', 'rows=%d' % n, setup)
+    def setup():
+        fns = [os.path.join(_DAT_dir, i) for i in sorted(os.listdir(_DAT_dir))
+                if(i[-4:] == '.DAT')]
+        return(lambda: [fld.read_DAT(fn) for fn in fns])
+    yield('read_DAT', 'compare_DAT', setup)
+    def setup():
+        sb = fld.load_template(_template, cache=False)
+        for xs in sb:
+            xs.fields
+        return(lambda: fld.compare_DATs(sb, _DAT_dir, truncate=True))
+    yield('compare_DATs', 'practice_xcs', setup)
+
+    #REF reading and model loading
+    for nx, ny in sizes['REF_grid']:
+        def setup(nx=nx, ny=ny):
+            fn = os.path.join(tmp, 'SYNTH-%dx%d.REF' % (nx, ny))
+            if(not os.path.isfile(fn)):
+                write_REF(fn, nx, ny)
+            return(lambda: sc.read_REF(fn))
+        yield('read_REF', 'grid=%dx%d' % (nx, ny), setup)
+        def setup(nx=nx, ny=ny):
+            fn = os.path.join(tmp, 'SYNTH-%dx%d.REF' % (nx, ny))
+            if(not os.path.isfile(fn)):
+                write_REF(fn, nx, ny)
+            return(lambda: sc.load_model(fn, cache=False))
+        yield('load_model', 'grid=%dx%d' % (nx, ny), setup)
+        def setup(nx=nx, ny=ny):
+            fn = os.path.join(tmp, 'SYNTH-%dx%d.REF' % (nx, ny))
+            if(not os.path.isfile(fn)):
+                write_REF(fn, nx, ny)
+            return(lambda: sc.load_model(fn, components=['Bmax'],
+                cache=False))
+        yield('load_model', 'grid=%dx%d Bmax only' % (nx, ny), setup)
+        def setup(nx=nx, ny=ny):
+            fn = os.path.join(tmp, 'SYNTH-%dx%d.REF' % (nx, ny))
+            if(not os.path.isfile(fn)):
+                write_REF(fn, nx, ny)
+            sc.load_model(fn)
+            return(lambda: sc.load_model(fn))
+        yield('load_model', 'grid=%dx%d cached' % (nx, ny), setup)
+        def setup(nx=nx, ny=ny):
+            fn = os.path.join(tmp, 'SYNTH-%dx%d.REF' % (nx, ny))
+            if(not os.path.isfile(fn)):
+                write_REF(fn, nx, ny)
+            sc.load_model(fn, cache=False).save(path=tmp)
+            fn = os.path.join(tmp, 'SYNTH-%dx%d.npz' % (nx, ny))
+            return(lambda: sc.load_model(fn))
+        yield('load_model', 'grid=%dx%d npz' % (nx, ny), setup)
+    def setup():
+        #the sample holds only the first 100 lines of a REF file, so it's
+        #only read, not gridded
+        fn = os.path.join(tmp, 'REF_GRID1_first_100_lines.REF')
+        shutil.copyfile(os.path.join(_working_files,
+            'REF_GRID1_first_100_lines.txt'), fn)
+        return(lambda: sc.read_REF(fn))
+    yield('read_REF', 'REF_GRID1 sample', setup)
+    def setup():
+        return(lambda: sc.load_model(_REF_xlsx, _footprints))
+    yield('load_model', 'REF_GRID1.xlsx', setup)
+
+    #Model interpolation and resampling
+    nx, ny = sizes['REF_grid'][-1]
+    for n in sizes['interp_points']:
+        def setup(n=n):
+            mod = synthetic_model(nx, ny)
+            x = np.linspace(mod.xmin, mod.xmax, n)
+            y = np.linspace(mod.ymin, mod.ymax, n)[::-1]
+            return(lambda: mod.interp(x, y))
+        yield('Model.interp', 'points=%d' % n, setup)
+        def setup(n=n):
+            mod = synthetic_model(nx, ny)
+            x = np.linspace(mod.xmin, mod.xmax, n)
+            y = np.linspace(mod.ymin, mod.ymax, n)[::-1]
+            #build the cubic coefficients before timing
+            mod.interp(x, y, method='cubic')
+            return(lambda: mod.interp(x, y, method='cubic'))
+        yield('Model.interp', 'points=%d cubic' % n, setup)
+    for N in sizes['resample_N']:
+        def setup(N=N):
+            mod = synthetic_model(nx, ny)
+            return(lambda: mod.resample(N=N))
+        yield('Model.resample', 'N=%d' % N, setup)
+    def setup():
+        mod = synthetic_model(nx, ny)
+        #transects fanning out from the center of the grid
+        a = np.linspace(0, np.pi, 100)
+        lines = [((1250., 700.), (1250. + 650.*np.cos(i), 700. + 650.*np.sin(i)))
+                for i in a]
+        return(lambda: mod.cross_sections(lines))
+    yield('Model.cross_sections', 'lines=100', setup)
+
+    #exporting
+    for ext in ['excel', 'csv']:
+        def setup(ext=ext):
+            sb = fld.load_template(_template, cache=False)
+            [xs.fields for xs in sb]
+            return(lambda: sb.results_export(path=tmp, file_type=ext))
+        yield('results_export', ext, setup)
+
+    #plotting
+    def setup():
+        xs = synthetic_xs(2)
+        xs.fields
+        return(lambda: fld.plot_max_fields(xs))
+    yield('plot_max_fields', 'circuits=2', setup)
+    def setup():
+        sb = fld.load_template(_template, cache=False)
+        [xs.fields for xs in sb]
+        return(lambda: fld.plot_groups(sb, return_figs=True))
+    yield('plot_groups', 'practice_xcs', setup)
+    def setup():
+        sb = fld.load_template(_template, cache=False)
+        [xs.fields for xs in sb]
+        return(lambda: fld.plot_groups_at_ROW(sb, return_figs=True))
+    yield('plot_groups_at_ROW', 'practice_xcs', setup)
+    for nx, ny in sizes['REF_grid']:
+        def setup(nx=nx, ny=ny):
+            mod = synthetic_model(nx, ny)
+            return(lambda: sc.plot_contour(mod))
+        yield('plot_contour', 'grid=%dx%d' % (nx, ny), setup)
+        def setup(nx=nx, ny=ny):
+            mod = synthetic_model(nx, ny)
+            return(lambda: sc.plot_pcolormesh(mod))
+        yield('plot_pcolormesh', 'grid=%dx%d' % (nx, ny), setup)
+
+def import_time(repeat):
+    """Time 'import emf.fields' in fresh interpreters
+    args:
+        repeat - int, number of interpreters to time the import in
+    returns:
+        best - float, fastest import time (seconds)
+        median - float, median import time (seconds)
+        loaded - list of modules in _import_forbidden that were imported"""
+    code = ';'.join(['import sys, time, json',
+        'sys.path.insert(0, %s)' % repr(_root),
+        't0 = time.time()',
+        'import emf.fields',
+        't = time.time() - t0',
+        'print(json.dumps([t, [m for m in %s if m in sys.modules]]))'
+            % repr(_import_forbidden)])
+    t, loaded = [], set()
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code])
+        ti, li = json.loads(out.decode('ascii').strip().split('\n')[-1])
+        t.append(ti)
+        loaded.update(li)
+    return(min(t), float(np.median(t)), sorted(loaded))
+
+def _git_commit():
+    try:
+        return(subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=_root).decode('ascii').strip())
+    except(Exception):
+        return(None)
+
+def run(repeat=3, quick=False, only=None):
+    """Run the benchmarks
+    args:
+        repeat - int, number of timed calls of each benchmark
+        quick - bool, use the small problem sizes
+        only - list of strings, run only benchmarks whose names contain
+                one of the strings
+    returns:
+        dict with 'meta' and 'results' entries, ready to dump to JSON"""
+    sizes = _sizes['quick' if quick else 'full']
+    tmp = tempfile.mkdtemp(prefix='emf-bench-')
+    results = []
+    if((not only) or any([o in 'import' for o in only])):
+        best, median, loaded = import_time(max(repeat, 3))
+        results.append({'name': 'import', 'param': 'emf.fields',
+            'best': best, 'median': median, 'repeat': max(repeat, 3),
+            'loaded': loaded})
+        print('%-24s %-18s best %10.5f s   median %10.5f s'
+                % ('import', 'emf.fields', best, median))
+    try:
+        for name, param, setup in _benchmarks(sizes, tmp):
+            if(only and not any([o in name for o in only])):
+                continue
+            #a failing benchmark is reported and skipped so that the others
+            #still run on commits where it doesn't apply
+            try:
+                f = setup()
+                #one untimed call to warm up caches and imports
+                f()
+                best, median = _timeit(f, repeat)
+            except(Exception) as e:
+                print('%-24s %-18s failed: %s' % (name, param, repr(e)))
+                continue
+            results.append({'name': name, 'param': param, 'best': best,
+                'median': median, 'repeat': repeat})
+            print('%-24s %-18s best %10.5f s   median %10.5f s'
+                    % (name, param, best, median))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    meta = {'commit': _git_commit(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__,
+            'platform': platform.platform(),
+            'quick': quick}
+    return({'meta': meta, 'results': results})
+
+def compare(new, old):
+    """Print the ratio of best times in new to those in old for benchmarks present in both
+    args:
+        new - dict returned by run() or loaded from JSON
+        old - dict returned by run() or loaded from JSON"""
+    old_best = dict([((r['name'], r['param']), r['best'])
+            for r in old['results']])
+    print('\ncompared to commit %s' % old['meta']['commit'])
+    print('%-24s %-18s %10s %10s %8s' % ('name', 'param', 'old (s)',
+            'new (s)', 'new/old'))
+    for r in new['results']:
+        k = (r['name'], r['param'])
+        if(k in old_best):
+            print('%-24s %-18s %10.5f %10.5f %8.3f' % (k[0], k[1],
+                old_best[k], r['best'], r['best']/max(old_best[k], 1e-12)))
+
+if(__name__ == '__main__'):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', default='benchmarks.json',
+            help='path of the JSON results file')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+            help='number of timed calls of each benchmark')
+    parser.add_argument('--quick', action='store_true',
+            help='run at small sizes only')
+    parser.add_argument('--only', nargs='+',
+            help='run only benchmarks whose names contain these strings')
+    parser.add_argument('--import-budget', type=float,
+            default=_import_budget,
+            help='maximum seconds allowed for import emf.fields')
+    parser.add_argument('--compare',
+            help='JSON results file from an earlier run to compare against')
+    a = parser.parse_args()
+
+    res = run(repeat=a.repeat, quick=a.quick, only=a.only)
+    with open(a.output, 'w') as ofile:
+        json.dump(res, ofile, indent=2, sort_keys=True)
+    print('Benchmark results written to: %s' % a.output)
+    if(a.compare):
+        with open(a.compare, 'r') as ifile:
+            compare(res, json.load(ifile))
+    #check the import budget
+    for r in res['results']:
+        if((r['name'] == 'import') and (r['loaded'] or
+                (r['best'] > a.import_budget))):
+            print('import emf.fields took %g s (budget %g s) and loaded: %s'
+                    % (r['best'], a.import_budget, ', '.join(r['loaded'])))
+            sys.exit(1)